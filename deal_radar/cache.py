@@ -0,0 +1,398 @@
+"""
+Two-tier cache backend for Deal Radar.
+
+TwoTierCache is Django's Redis cache backend with a bounded in-process LRU
+in front of it, so repeated reads of hot keys (category counts, per-user
+dashboard payloads and their generation tokens, backtest series) cost a
+dictionary lookup instead of a network round trip.
+
+How the tiers stay consistent:
+- Reads check the local tier first. A miss reads the value and its
+  remaining Redis TTL in one pipeline, and the value is kept locally for
+  no longer than that TTL (and at most LOCAL_TIMEOUT).
+- Every write (set, add, set_many, incr/decr, touch, delete, delete_many,
+  clear) goes to Redis and then publishes the written keys on a pub/sub
+  channel. Each web dyno and Celery worker process runs one listener thread
+  that drops those keys from its local tier. Django creates a cache client
+  per thread, so the listener and local tier are shared process-wide
+  (keyed by pid and channel) rather than owned by a client.
+- A write stores its value locally only if nothing was invalidated while
+  it went to Redis; a concurrent write elsewhere may have overtaken it.
+- The local tier is only used while the listener is subscribed. When the
+  connection drops the process falls back to plain Redis reads, and the
+  local tier is cleared again on reconnect, since messages may have been
+  missed in between.
+- LOCAL_TIMEOUT bounds how stale a local entry can get if an invalidation
+  is lost anyway (e.g. a half-open connection that never errors).
+
+Values are kept locally in their serialized form and unpickled on every
+hit, so callers never share (or mutate) one cached object.
+
+OPTIONS, besides those of the Redis backend:
+    LOCAL_MAX_ENTRIES     entries held in each process (default 10000)
+    LOCAL_MAX_BYTES       serialized bytes held in each process (default 32 MiB)
+    LOCAL_TIMEOUT         seconds an entry may live locally (default 60)
+    INVALIDATION_CHANNEL  pub/sub channel name (default 'cache-invalidation')
+"""
+
+from collections import OrderedDict
+import json
+import os
+import threading
+import time
+import uuid
+from django.core.cache.backends.redis import RedisCache, RedisCacheClient
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCAL_MAX_ENTRIES = 10000
+DEFAULT_LOCAL_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_LOCAL_TIMEOUT = 60
+DEFAULT_INVALIDATION_CHANNEL = 'cache-invalidation'
+# Values above this share of LOCAL_MAX_BYTES are only kept in Redis.
+MAX_VALUE_SHARE = 1 / 16
+RECONNECT_SECONDS = 1
+MAX_RECONNECT_SECONDS = 30
+
+class LocalTier:
+    """Thread-safe LRU of serialized values with per-entry expiry."""
+
+    def __init__(self, max_entries, max_bytes, timeout):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # Bumped by every invalidation, so a fill that read Redis before an
+        # invalidation arrived is not stored afterwards.
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def version(self):
+        return self._version
+
+    def get(self, key):
+        """The serialized value of key, or None when missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, size = entry
+            if expires_at <= time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, ttl, version=None):
+        """
+        Keep value for min(ttl, timeout) seconds (ttl None: timeout). With
+        version, only if nothing was invalidated since that version was read.
+        """
+        with self._lock:
+            if version is not None and version != self._version:
+                return
+            self._insert(key, value, ttl)
+
+    def store(self, items, ttl, version):
+        """
+        Keep values this process just wrote to Redis, read before the write
+        at version (None: not read). Fills that read the old values are
+        dropped; so are these values if anything was invalidated since
+        version, as another write may have overtaken this one.
+        """
+        with self._lock:
+            unchanged = version is not None and version == self._version
+            self._version += 1
+            for key in items:
+                self._pop(key)
+            if unchanged:
+                for key, value in items.items():
+                    self._insert(key, value, ttl)
+
+    def discard(self, keys):
+        with self._lock:
+            self._version += 1
+            for key in keys:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def _insert(self, key, value, ttl):
+        # Caller holds the lock.
+        size = len(value) if isinstance(value, (bytes, str)) else 8
+        ttl = self.timeout if ttl is None else min(ttl, self.timeout)
+        self._pop(key)
+        if ttl <= 0 or size > self.max_bytes * MAX_VALUE_SHARE:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._pop(next(iter(self._entries)))
+
+    def _pop(self, key):
+        # Caller holds the lock.
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+class InvalidationListener:
+    """
+    A process's pub/sub subscriber for one channel, and the LocalTier it
+    keeps consistent. Shared by every TwoTierCacheClient of the process;
+    see shared_listener.
+    """
+
+    def __init__(self, get_client, channel, local):
+        self.pid = os.getpid()
+        self.origin = uuid.uuid4().hex
+        self.channel = channel
+        self.local = local
+        # True while subscribed; the local tier is only used then.
+        self.listening = False
+        self._get_client = get_client
+        threading.Thread(target=self._listen, name=f'cache-invalidation-{channel}', daemon=True).start()
+
+    def _listen(self):
+        failures = 0
+        while True:
+            pubsub = None
+            try:
+                pubsub = self._get_client(write=True).pubsub()
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    if message['type'] == 'subscribe':
+                        # Anything published before this point may have been missed.
+                        self.local.clear()
+                        self.listening = True
+                        failures = 0
+                    elif message['type'] == 'message':
+                        self._apply(message['data'])
+            except Exception as e:
+                if not failures:
+                    logger.warning(f"Cache invalidation listener disconnected, using Redis only: {e}")
+                failures += 1
+            finally:
+                self.listening = False
+                self.local.clear()
+                if pubsub is not None:
+                    pubsub.close()
+            time.sleep(min(RECONNECT_SECONDS * 2 ** min(failures, 5), MAX_RECONNECT_SECONDS))
+
+    def _apply(self, data):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            logger.warning(f"Ignoring malformed cache invalidation message: {data!r}")
+            return
+        if message.get('origin') == self.origin:
+            # This process already updated its own tier.
+            return
+        if message.get('keys') is None:
+            self.local.clear()
+        else:
+            self.local.discard(message['keys'])
+
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+def _reset_listeners():
+    # A forked child (gunicorn and Celery prefork workers) inherits the
+    # parent's registry, and possibly its lock held, but no listener threads.
+    global _listeners_lock
+    _listeners.clear()
+    _listeners_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_listeners)
+
+def shared_listener(get_client, channel, max_entries, max_bytes, timeout):
+    """
+    The invalidation listener for channel in this process, started on first
+    use. get_client and the local tier limits are taken from the first caller.
+    """
+    key = (os.getpid(), channel)
+    listener = _listeners.get(key)
+    if listener is None:
+        with _listeners_lock:
+            listener = _listeners.get(key)
+            if listener is None:
+                local = LocalTier(max_entries, max_bytes, timeout)
+                listener = _listeners[key] = InvalidationListener(get_client, channel, local)
+    return listener
+
+class TwoTierCacheClient(RedisCacheClient):
+    """Redis cache client that serves reads from the process's LocalTier while subscribed."""
+
+    def __init__(self, servers, local_max_entries=DEFAULT_LOCAL_MAX_ENTRIES, local_max_bytes=DEFAULT_LOCAL_MAX_BYTES,
+                 local_timeout=DEFAULT_LOCAL_TIMEOUT, channel=DEFAULT_INVALIDATION_CHANNEL, **options):
+        super().__init__(servers, **options)
+        self._local_options = (local_max_entries, local_max_bytes, local_timeout)
+        self._channel = channel
+        self._listener = None
+
+    # ---- Local tier and invalidation ----
+
+    def _shared_listener(self):
+        listener = self._listener
+        if listener is None or listener.pid != os.getpid():
+            listener = self._listener = shared_listener(self.get_client, self._channel, *self._local_options)
+        return listener
+
+    def _local_tier(self):
+        """The local tier, or None while invalidations are not being received."""
+        listener = self._shared_listener()
+        return listener.local if listener.listening else None
+
+    def _publish(self, keys):
+        """Tell the other processes to drop keys (None: everything)."""
+        origin = self._shared_listener().origin
+        message = json.dumps({'origin': origin, 'keys': None if keys is None else list(keys)})
+        self.get_client(write=True).publish(self._channel, message)
+
+    def _ttl(self, pttl):
+        # PTTL is -1 for keys without expiry (-2 for missing ones).
+        return None if pttl == -1 else pttl / 1000
+
+    # ---- Reads ----
+
+    def get(self, key, default):
+        local = self._local_tier()
+        if local is None:
+            return super().get(key, default)
+        value = local.get(key)
+        if value is not None:
+            return self._serializer.loads(value)
+        version = local.version
+        pipeline = self.get_client(key).pipeline(transaction=False)
+        pipeline.get(key)
+        pipeline.pttl(key)
+        value, pttl = pipeline.execute()
+        if value is None:
+            return default
+        local.put(key, value, self._ttl(pttl), version)
+        return self._serializer.loads(value)
+
+    def get_many(self, keys):
+        local = self._local_tier()
+        if local is None:
+            return super().get_many(keys)
+        found = {}
+        missing = []
+        for key in keys:
+            value = local.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = self._serializer.loads(value)
+        if missing:
+            version = local.version
+            pipeline = self.get_client(None).pipeline(transaction=False)
+            pipeline.mget(missing)
+            for key in missing:
+                pipeline.pttl(key)
+            values, *pttls = pipeline.execute()
+            for key, value, pttl in zip(missing, values, pttls):
+                if value is not None:
+                    local.put(key, value, self._ttl(pttl), version)
+                    found[key] = self._serializer.loads(value)
+        return found
+
+    def has_key(self, key):
+        local = self._local_tier()
+        if local is not None and local.get(key) is not None:
+            return True
+        return super().has_key(key)
+
+    # ---- Writes: Redis first, then this process's tier, then everyone else's ----
+
+    def _version(self):
+        # Read before a write; see LocalTier.store.
+        local = self._local_tier()
+        return None if local is None else local.version
+
+    def _stored(self, data, timeout, version):
+        local = self._local_tier()
+        if local is not None:
+            local.store({key: self._serializer.dumps(value) for key, value in data.items()}, timeout, version)
+        self._publish(data)
+
+    def _dropped(self, keys):
+        local = self._local_tier()
+        if local is not None:
+            local.discard(keys)
+        self._publish(keys)
+
+    def add(self, key, value, timeout):
+        version = self._version()
+        added = super().add(key, value, timeout)
+        if added:
+            self._stored({key: value}, timeout, version)
+        return added
+
+    def set(self, key, value, timeout):
+        version = self._version()
+        super().set(key, value, timeout)
+        self._stored({key: value}, timeout, version)
+
+    def set_many(self, data, timeout):
+        version = self._version()
+        super().set_many(data, timeout)
+        self._stored(data, timeout, version)
+
+    def touch(self, key, timeout):
+        touched = super().touch(key, timeout)
+        # The local copy may now outlive the shortened Redis TTL.
+        self._dropped([key])
+        return touched
+
+    def incr(self, key, delta):
+        value = super().incr(key, delta)
+        self._dropped([key])
+        return value
+
+    def delete(self, key):
+        deleted = super().delete(key)
+        self._dropped([key])
+        return deleted
+
+    def delete_many(self, keys):
+        super().delete_many(keys)
+        self._dropped(keys)
+
+    def clear(self):
+        cleared = super().clear()
+        local = self._local_tier()
+        if local is not None:
+            local.clear()
+        self._publish(None)
+        return cleared
+
+class TwoTierCache(RedisCache):
+    """
+    Django cache backend: a per-process LRU in front of Redis, kept
+    consistent across processes by pub/sub invalidation. Configure it like
+    django.core.cache.backends.redis.RedisCache, with the extra OPTIONS
+    listed in the module docstring.
+    """
+
+    def __init__(self, server, params):
+        options = dict(params.get('OPTIONS', {}))
+        local_options = {
+            'local_max_entries': options.pop('LOCAL_MAX_ENTRIES', DEFAULT_LOCAL_MAX_ENTRIES),
+            'local_max_bytes': options.pop('LOCAL_MAX_BYTES', DEFAULT_LOCAL_MAX_BYTES),
+            'local_timeout': options.pop('LOCAL_TIMEOUT', DEFAULT_LOCAL_TIMEOUT),
+            'channel': options.pop('INVALIDATION_CHANNEL', DEFAULT_INVALIDATION_CHANNEL),
+        }
+        super().__init__(server, {**params, 'OPTIONS': options})
+        self._class = TwoTierCacheClient
+        self._options = {**options, **local_options}
@@ -34,6 +34,7 @@ Deployment Considerations:
 
 import os
 from celery import Celery
+from celery.schedules import crontab
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'deal_radar.settings')
@@ -57,6 +58,13 @@ app.autodiscover_tasks()
 #     'analytics.tasks.generate_report': {'queue': 'analytics'},
 # }
 
+# Notification delivery runs on one queue per channel so a slow provider only
+# backs up its own pool. The Procfile's worker consumes every queue; split
+# them across dynos as volume grows, e.g.:
+#   celery -A deal_radar worker -Q notifications_email -c 2
+#   celery -A deal_radar worker -Q notifications_whatsapp -c 1
+# Per-task send concurrency is NOTIFICATION_CHANNEL_CONCURRENCY in settings.
+
 # Task Configuration
 app.conf.update(
     # Task execution settings
@@ -84,13 +92,39 @@ app.conf.update(
         #     'schedule': crontab(minute=0, hour='*/2'),  # Every 2 hours
         # },
         # 'send-daily-digest': {
-        #     'task': 'notifications.tasks.send_daily_digest',
+        #     'task': 'products.tasks.send_daily_summaries',
         #     'schedule': crontab(hour=9, minute=0),  # Daily at 9 AM
         # },
+        # 'send-weekly-digest': {
+        #     'task': 'products.tasks.send_weekly_summaries',
+        #     'schedule': crontab(day_of_week='mon', hour=9, minute=0),  # Mondays at 9 AM
+        # },
         # 'cleanup-old-data': {
         #     'task': 'maintenance.tasks.cleanup_old_price_history',
         #     'schedule': crontab(hour=2, minute=0),  # Daily at 2 AM
         # },
+        # 'update-price-rollups': {
+        #     'task': 'products.tasks.update_price_rollups',
+        #     'schedule': crontab(minute='*/15'),  # Every 15 minutes
+        # },
+        # 'update-price-stats': {
+        #     'task': 'products.tasks.update_price_stats',
+        #     'schedule': crontab(minute='*/30'),  # Every 30 minutes
+        # },
+        # The outbox sweeps: events and notifications whose task could not be
+        # queued, notification retries, and jobs re-queued from the admin.
+        'process-price-change-events': {
+            'task': 'products.tasks.process_price_change_events',
+            'schedule': crontab(minute='*/5'),  # Every 5 minutes, sweeps pending events
+        },
+        'deliver-notifications': {
+            'task': 'products.tasks.deliver_notifications',
+            'schedule': crontab(minute='*'),  # Every minute, picks up due retries
+        },
+        # 'compact-price-history': {
+        #     'task': 'products.tasks.compact_old_price_history',
+        #     'schedule': crontab(hour=3, minute=0),  # Daily at 3 AM
+        # },
     },
 )
 
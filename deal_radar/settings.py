@@ -8,6 +8,7 @@
 
 import environ
 import os
+import ssl
 from decouple import config
 from dotenv import load_dotenv
 from pathlib import Path
@@ -161,17 +162,109 @@ DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='Deal Radar <noreply@d
 TWILIO_ACCOUNT_SID = config('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = config('TWILIO_AUTH_TOKEN')
 TWILIO_WHATSAPP_NUMBER = config('TWILIO_WHATSAPP_NUMBER')
+# Overrides https://api.twilio.com, e.g. to point at a local stand-in server for testing.
+TWILIO_API_BASE_URL = config('TWILIO_API_BASE_URL', default='')
+# Upper bound on WhatsApp sends per second per worker process (Twilio 429s also slow us down).
+WHATSAPP_MAX_MESSAGES_PER_SECOND = config('WHATSAPP_MAX_MESSAGES_PER_SECOND', default=50, cast=float)
+WHATSAPP_REQUEST_TIMEOUT_SECONDS = config('WHATSAPP_REQUEST_TIMEOUT_SECONDS', default=10, cast=float)
+
+# -------------------------------
+# Notification Delivery
+# -------------------------------
+# Notifications are queued as NotificationJob rows and delivered per channel by
+# Celery workers on the notifications_<channel> queues. Concurrency is the number
+# of messages one delivery task sends in parallel for that channel.
+NOTIFICATION_CHANNEL_CONCURRENCY = {
+    'email': config('NOTIFICATION_EMAIL_CONCURRENCY', default=4, cast=int),
+    'whatsapp': config('NOTIFICATION_WHATSAPP_CONCURRENCY', default=16, cast=int),
+}
+NOTIFICATION_MAX_ATTEMPTS = config('NOTIFICATION_MAX_ATTEMPTS', default=5, cast=int)
+NOTIFICATION_RETRY_BASE_SECONDS = config('NOTIFICATION_RETRY_BASE_SECONDS', default=60, cast=int)
+# Alerts triggered for one user within this window (from the first one) are sent as a
+# single message per channel. 0 (the default) sends each alert on its own right away;
+# users opt in to grouping with UserProfile.alert_coalesce_minutes.
+NOTIFICATION_COALESCE_SECONDS = {
+    'email': config('NOTIFICATION_EMAIL_COALESCE_SECONDS', default=0, cast=int),
+    'whatsapp': config('NOTIFICATION_WHATSAPP_COALESCE_SECONDS', default=0, cast=int),
+}
+# Price drops of at least this percentage are included in daily/weekly summaries.
+DIGEST_MIN_DROP_PERCENT = config('DIGEST_MIN_DROP_PERCENT', default=5, cast=float)
 
 # -------------------------------
 # Cache Configuration
 # -------------------------------
-# Used for session and price tracking caching
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
-        'LOCATION': 'cache_table',
+# Listing counts, per-user dashboard/profile payloads and backtest series.
+# With REDIS_URL set, each process keeps a bounded LRU of hot keys in front
+# of Redis, invalidated over pub/sub (see deal_radar/cache.py). Without it
+# the cache lives in the database table made by createcachetable, which
+# every process shares, so invalidations still reach them all.
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'deal_radar.cache.TwoTierCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'LOCAL_MAX_ENTRIES': config('CACHE_LOCAL_MAX_ENTRIES', default=10000, cast=int),
+                'LOCAL_MAX_BYTES': config('CACHE_LOCAL_MAX_BYTES', default=32 * 1024 * 1024, cast=int),
+                # Upper bound on staleness should an invalidation message be lost.
+                'LOCAL_TIMEOUT': config('CACHE_LOCAL_TIMEOUT_SECONDS', default=60, cast=int),
+            },
+        }
     }
-}
+    if REDIS_URL.startswith('rediss://'):
+        # Heroku Redis serves TLS with a self-signed certificate.
+        CACHES['default']['OPTIONS']['ssl_cert_reqs'] = None
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache_table',
+        }
+    }
+
+# -------------------------------
+# Celery Configuration
+# -------------------------------
+# Broker for background tasks; Heroku Redis unless set separately. Without
+# one (local development) notifications and price change processing run
+# inline after commit, and the periodic sweeps don't run.
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default=REDIS_URL)
+if CELERY_BROKER_URL:
+    CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default=CELERY_BROKER_URL)
+    if CELERY_BROKER_URL.startswith('rediss://'):
+        # Heroku Redis serves TLS with a self-signed certificate.
+        CELERY_BROKER_USE_SSL = {'ssl_cert_reqs': ssl.CERT_NONE}
+        CELERY_REDIS_BACKEND_USE_SSL = {'ssl_cert_reqs': ssl.CERT_NONE}
+# Tasks are queued from request handlers, so publishing to an unreachable
+# broker fails at once (no reconnect attempts), or after this many seconds
+# if the host doesn't answer; the outbox sweeps pick up what wasn't queued.
+CELERY_BROKER_CONNECTION_TIMEOUT = config('CELERY_BROKER_CONNECTION_TIMEOUT', default=2, cast=float)
+CELERY_BROKER_TRANSPORT_OPTIONS = {'max_retries': 0}
+
+# -------------------------------
+# Price History Configuration
+# -------------------------------
+# History rows are written only on price changes; a heartbeat row is written
+# when the price has been unchanged for this many hours.
+PRICE_HISTORY_HEARTBEAT_HOURS = config('PRICE_HISTORY_HEARTBEAT_HOURS', default=24, cast=int)
+# Raw history older than this is purged; hourly/daily rollups keep long-range charts.
+# Plans may extend this via STRIPE_PLANS[...]['history_retention_days'].
+PRICE_HISTORY_RAW_RETENTION_DAYS = config('PRICE_HISTORY_RAW_RETENTION_DAYS', default=30, cast=int)
+# Raw history older than this is packed into compressed per-product blocks.
+PRICE_HISTORY_COMPACT_AFTER_DAYS = config('PRICE_HISTORY_COMPACT_AFTER_DAYS', default=7, cast=int)
+# Retention purges delete in bounded primary-key chunks with a pause between them.
+PRICE_HISTORY_PURGE_BATCH_SIZE = config('PRICE_HISTORY_PURGE_BATCH_SIZE', default=2000, cast=int)
+PRICE_HISTORY_PURGE_PAUSE_SECONDS = config('PRICE_HISTORY_PURGE_PAUSE_SECONDS', default=0.5, cast=float)
+
+# -------------------------------
+# Search Configuration
+# -------------------------------
+# Entries (retailers, then newest products) held by each web process's
+# in-memory autocomplete index; roughly 200 bytes each.
+AUTOCOMPLETE_MAX_ENTRIES = config('AUTOCOMPLETE_MAX_ENTRIES', default=200000, cast=int)
+# How often a process pulls product edits made elsewhere into its index.
+AUTOCOMPLETE_SYNC_SECONDS = config('AUTOCOMPLETE_SYNC_SECONDS', default=30, cast=int)
 
 # -------------------------------
 # Session Configuration
@@ -292,6 +385,7 @@ STRIPE_PLANS = {
         "price": 0,
         "product_limit": 3,
         "channels": ["email"],
+        "history_retention_days": None,  # Uses PRICE_HISTORY_RAW_RETENTION_DAYS
     },
     "basic": {
         "name": "Basic",
@@ -299,6 +393,7 @@ STRIPE_PLANS = {
         "price": 2.99,
         "product_limit": 10,
         "channels": ["email", "sms"],
+        "history_retention_days": 90,
     },
     "premium": {
         "name": "Premium",
@@ -306,6 +401,7 @@ STRIPE_PLANS = {
         "price": 4.99,
         "product_limit": None,  # Unlimited
         "channels": ["email", "sms", "whatsapp"],
+        "history_retention_days": 365,
     },
 }
 
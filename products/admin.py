@@ -1,7 +1,10 @@
-# Django admin configuration for Product, TrackedProduct, PriceAlert, and UserProfile.
+# Django admin configuration for Product, PriceHistory, TrackedProduct, PriceAlert, NotificationJob, and UserProfile.
 
 from django.contrib import admin
-from .models import Product, TrackedProduct, PriceAlert, UserProfile
+from django.utils import timezone
+from .models import Product, PriceHistory, TrackedProduct, PriceAlert, UserProfile, NotificationJob
+from .history_utils import update_product_price
+from .dashboard_utils import bump_product_generations, bump_tracked_product_generations
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -31,6 +34,45 @@ class ProductAdmin(admin.ModelAdmin):
         }),
     )
 
+    def save_model(self, request, obj, form, change):
+        # Price edits go through update_product_price so they are recorded in the
+        # price history and emit a price change event for alert evaluation.
+        if change and 'current_price' in form.changed_data:
+            new_price = obj.current_price
+            obj.current_price = form.initial.get('current_price')
+            update_product_price(obj, new_price, source='admin')
+        else:
+            super().save_model(request, obj, form, change)
+        if change and set(form.changed_data) - {'current_price'}:
+            # Name, site, URL etc. show on the dashboards of everyone tracking it.
+            bump_product_generations([obj.pk])
+
+@admin.register(PriceHistory)
+class PriceHistoryAdmin(admin.ModelAdmin):
+    # Read-mostly admin interface for PriceHistory, one row per price change or heartbeat.
+    list_display = ['product', 'price', 'timestamp', 'source', 'is_heartbeat']
+    list_filter = ['source', 'is_heartbeat']
+    search_fields = ['product__name']
+    raw_id_fields = ['product']
+    date_hierarchy = 'timestamp'
+    list_select_related = ['product']
+
+@admin.register(NotificationJob)
+class NotificationJobAdmin(admin.ModelAdmin):
+    # Admin interface for the notification outbox; failed jobs can be inspected and retried.
+    list_display = ['channel', 'recipient', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['channel', 'status']
+    search_fields = ['recipient', 'subject']
+    raw_id_fields = ['user', 'alert']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
+    actions = ['retry_jobs']
+
+    @admin.action(description='Retry selected notifications now')
+    def retry_jobs(self, request, queryset):
+        queryset.exclude(status='sent').update(
+            status='pending', attempts=0, next_attempt_at=timezone.now(), locked_until=None,
+        )
+
 @admin.register(TrackedProduct)
 class TrackedProductAdmin(admin.ModelAdmin):
     # Admin interface for TrackedProduct model.
@@ -39,17 +81,24 @@ class TrackedProductAdmin(admin.ModelAdmin):
     search_fields = ['user__username', 'product__name']
     list_editable = ['is_active']    
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        bump_tracked_product_generations([obj.pk])
+
 @admin.register(PriceAlert)
 class PriceAlertAdmin(admin.ModelAdmin):
     # Admin interface for PriceAlert model, showing alert status and related info.
     list_display = (
         'tracked_product',
+        'rule',
         'target_price',
+        'drop_percent',
         'is_triggered',
         'is_enabled',
         'triggered_at',  # Use 'triggered_at' instead of 'created_at'
     )
     list_filter = (
+        'rule',
         'is_triggered',
         'is_enabled',
         'triggered_at',  # Use 'triggered_at' instead of 'created_at'
@@ -59,7 +108,7 @@ class PriceAlertAdmin(admin.ModelAdmin):
     
     fieldsets = (
         ('Alert Configuration', {
-            'fields': ('tracked_product', 'target_price', 'is_enabled')
+            'fields': ('tracked_product', 'rule', 'target_price', 'drop_percent', 'is_enabled')
         }),
         ('Status', {
             'fields': ('is_triggered', 'triggered_at')
@@ -71,6 +120,10 @@ class PriceAlertAdmin(admin.ModelAdmin):
             'tracked_product__user', 'tracked_product__product'
         )
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        bump_tracked_product_generations([obj.tracked_product_id])
+
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     # Admin interface for UserProfile model, showing notification and subscription info.
@@ -80,6 +133,7 @@ class UserProfileAdmin(admin.ModelAdmin):
         'whatsapp_notifications',
         'whatsapp_number',
         'notification_frequency',
+        'alert_coalesce_minutes',
         'created_at',
     )
     list_filter = (
@@ -0,0 +1,255 @@
+"""
+In-memory price alert index for Deal Radar.
+Keeps, per product, the target prices of enabled untriggered alerts in a
+sorted array so a price change finds every crossed alert with one bisect
+instead of a database scan. Percentage-drop and all-time-low alerts are kept
+alongside and checked in one vectorized pass against the product's stats. The database stays authoritative: candidates
+are always confirmed by mark_alerts_triggered's conditional UPDATE, so a
+stale entry can at worst cost a wasted ID in that UPDATE.
+
+Workers build the index at startup; the PriceAlert signals below keep it in
+sync with edits made in the same process, and sync() pulls edits made by
+other processes using PriceAlert.updated_at.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+import threading
+import numpy as np
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import PriceAlert
+from .series_utils import to_pence
+import logging
+
+logger = logging.getLogger(__name__)
+
+REBUILD_CHUNK_SIZE = 10000
+# Each sync re-reads this far behind the previous one: updated_at is set
+# before a transaction commits, so a row committed by a long transaction can
+# carry a time earlier than the last sync. Re-applying a row is harmless.
+SYNC_OVERLAP = timedelta(minutes=5)
+
+# Relative rule codes stored in ProductAlerts.rule_kinds.
+RULE_CODES = {'percent_drop': 1, 'all_time_low': 2}
+
+class ProductAlerts:
+    """
+    Alerts for one product: target alerts as parallel arrays sorted by target
+    pence, relative-rule alerts (percentage drop, all-time low) as parallel
+    arrays whose thresholds are computed from the product's stats per check.
+    """
+
+    __slots__ = ('targets', 'alert_ids', 'rule_ids', 'rule_kinds', 'rule_percents')
+
+    def __init__(self):
+        self.targets = array('q')
+        self.alert_ids = array('q')
+        self.rule_ids = array('q')
+        self.rule_kinds = array('b')
+        self.rule_percents = array('d')
+
+    def __len__(self):
+        return len(self.alert_ids) + len(self.rule_ids)
+
+    def add(self, alert_id, target):
+        i = bisect_right(self.targets, target)
+        self.targets.insert(i, target)
+        self.alert_ids.insert(i, alert_id)
+
+    def add_rule(self, alert_id, kind, percent):
+        self.rule_ids.append(alert_id)
+        self.rule_kinds.append(kind)
+        self.rule_percents.append(percent)
+
+    def remove(self, alert_id):
+        try:
+            i = self.alert_ids.index(alert_id)
+        except ValueError:
+            try:
+                i = self.rule_ids.index(alert_id)
+            except ValueError:
+                return False
+            del self.rule_ids[i]
+            del self.rule_kinds[i]
+            del self.rule_percents[i]
+            return True
+        del self.targets[i]
+        del self.alert_ids[i]
+        return True
+
+    def crossed(self, price, reference=None, low=None):
+        # Alerts fire when price <= target, i.e. every target from the first one >= price.
+        crossed = self.alert_ids[bisect_left(self.targets, price):].tolist()
+        if self.rule_ids:
+            # One vectorized pass over the relative rules; a missing stat (NaN) never fires.
+            kinds = np.frombuffer(self.rule_kinds, dtype=np.int8)
+            percents = np.frombuffer(self.rule_percents, dtype=np.float64)
+            reference = np.nan if reference is None else reference
+            low = np.nan if low is None else low
+            thresholds = np.where(
+                kinds == RULE_CODES['percent_drop'],
+                reference * (100 - percents) / 100,
+                low,
+            )
+            crossed.extend(np.frombuffer(self.rule_ids, dtype=np.int64)[price <= thresholds].tolist())
+        return crossed
+
+    def nbytes(self):
+        return (
+            (len(self.targets) + len(self.alert_ids) + len(self.rule_ids)) * self.targets.itemsize
+            + len(self.rule_kinds) * self.rule_kinds.itemsize
+            + len(self.rule_percents) * self.rule_percents.itemsize
+        )
+
+class AlertIndex:
+    """Per-product sorted alert thresholds for every enabled, untriggered alert."""
+
+    def __init__(self):
+        self._products = {}
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_built(self):
+        return self._synced_at is not None
+
+    def __len__(self):
+        return sum(len(entry) for entry in self._products.values())
+
+    def load(self, rows, rule_rows=()):
+        """
+        Replace the index contents from (alert_id, product_id, target_pence)
+        rows of target alerts and (alert_id, product_id, rule, drop_percent)
+        rows of relative-rule alerts. Target rows ordered by product and
+        target are appended without any insertion cost; unordered rows are
+        still placed correctly.
+        """
+        products = {}
+        for alert_id, product_id, target in rows:
+            entry = products.get(product_id)
+            if entry is None:
+                entry = products[product_id] = ProductAlerts()
+            if entry.targets and target < entry.targets[-1]:
+                entry.add(alert_id, target)
+            else:
+                entry.targets.append(target)
+                entry.alert_ids.append(alert_id)
+        for alert_id, product_id, rule, percent in rule_rows:
+            entry = products.get(product_id)
+            if entry is None:
+                entry = products[product_id] = ProductAlerts()
+            entry.add_rule(alert_id, RULE_CODES[rule], float(percent or 0))
+        with self._lock:
+            self._products = products
+
+    def rebuild(self):
+        """Load every enabled, untriggered alert from the database."""
+        started_at = timezone.now()
+        active = PriceAlert.objects.filter(is_enabled=True, is_triggered=False)
+        rows = (
+            active.filter(rule='target')
+            .order_by('tracked_product__product_id', 'target_price')
+            .values_list('pk', 'tracked_product__product_id', 'target_price')
+            .iterator(chunk_size=REBUILD_CHUNK_SIZE)
+        )
+        rule_rows = (
+            active.filter(rule__in=RULE_CODES)
+            .values_list('pk', 'tracked_product__product_id', 'rule', 'drop_percent')
+            .iterator(chunk_size=REBUILD_CHUNK_SIZE)
+        )
+        self.load(((pk, product_id, to_pence(target)) for pk, product_id, target in rows), rule_rows)
+        self._synced_at = started_at
+        logger.info(f"Built price alert index: {len(self)} alerts across {len(self._products)} products")
+
+    def upsert(self, alert_id, product_id, target_price, active, rule='target', drop_percent=None):
+        """Add, move or drop one alert; target_price is a Decimal price."""
+        with self._lock:
+            self._discard(alert_id, product_id)
+            if active:
+                entry = self._products.get(product_id)
+                if entry is None:
+                    entry = self._products[product_id] = ProductAlerts()
+                if rule in RULE_CODES:
+                    entry.add_rule(alert_id, RULE_CODES[rule], float(drop_percent or 0))
+                else:
+                    entry.add(alert_id, to_pence(target_price))
+
+    def discard(self, alert_ids, product_id):
+        with self._lock:
+            for alert_id in alert_ids:
+                self._discard(alert_id, product_id)
+
+    def _discard(self, alert_id, product_id):
+        entry = self._products.get(product_id)
+        if entry is not None and entry.remove(alert_id) and not entry:
+            del self._products[product_id]
+
+    def sync(self):
+        """
+        Apply alerts created or edited by other processes since the last
+        build or sync (less SYNC_OVERLAP). Deleted alerts are not seen here;
+        they remain as harmless candidates until the next rebuild.
+        """
+        if not self.is_built:
+            self.rebuild()
+            return 0
+        started_at = timezone.now()
+        changes = (
+            PriceAlert.objects.filter(updated_at__gte=self._synced_at - SYNC_OVERLAP)
+            .values_list(
+                'pk', 'tracked_product__product_id', 'target_price', 'is_enabled', 'is_triggered',
+                'rule', 'drop_percent',
+            )
+        )
+        count = 0
+        for pk, product_id, target, is_enabled, is_triggered, rule, drop_percent in changes:
+            # An alert moved to another product in the admin leaves a stale entry
+            # under the old product until the next rebuild; like deletions, harmless.
+            self.upsert(pk, product_id, target, is_enabled and not is_triggered, rule, drop_percent)
+            count += 1
+        self._synced_at = started_at
+        return count
+
+    def crossed(self, product_id, price, reference=None, low=None):
+        """
+        IDs of indexed alerts for product_id whose threshold is at or above
+        price. reference (30-day average) and low (the low before the current
+        price) are the product's stats for relative rules; None means that
+        rule can't fire.
+        """
+        entry = self._products.get(product_id)
+        if entry is None or price is None:
+            return []
+        return entry.crossed(
+            to_pence(price),
+            to_pence(reference) if reference is not None else None,
+            to_pence(low) if low is not None else None,
+        )
+
+    def memory_usage(self):
+        """Approximate bytes held by the threshold arrays."""
+        return sum(entry.nbytes() for entry in self._products.values())
+
+alert_index = AlertIndex()
+
+@receiver(post_save, sender=PriceAlert)
+def sync_alert_index_on_save(sender, instance, **kwargs):
+    # Covers create, enable/disable and reset in this process. Processes that
+    # never built the index skip the work (and the product lookup) entirely.
+    if alert_index.is_built:
+        alert_index.upsert(
+            instance.pk,
+            instance.tracked_product.product_id,
+            instance.target_price,
+            instance.is_enabled and not instance.is_triggered,
+            instance.rule,
+            instance.drop_percent,
+        )
+
+@receiver(post_delete, sender=PriceAlert)
+def sync_alert_index_on_delete(sender, instance, **kwargs):
+    if alert_index.is_built:
+        alert_index.discard([instance.pk], instance.tracked_product.product_id)
@@ -0,0 +1,166 @@
+"""
+Price alert evaluation utilities for Deal Radar.
+Finds triggerable alerts with set-based queries, marks them triggered with a
+single conditional UPDATE, and queues notifications (in the same transaction)
+only for the alerts that actually changed state. Every rule type (target price,
+percentage drop, all-time low) reduces to a threshold price, so one query or
+one in-memory pass per product covers them all. Workers with a built alert
+index find changed products' candidates in memory instead of querying for them.
+"""
+
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, F, Q, When
+from django.utils import timezone
+from .models import PriceAlert
+from .alert_index import alert_index
+from .notification_utils import queue_alert_notifications
+from .digest_utils import add_alert_digest_items
+from .dashboard_utils import bump_tracked_product_generations
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Keeps the IN (...) list of the conditional UPDATE within database parameter limits.
+TRIGGER_BATCH_SIZE = 500
+
+def alert_threshold():
+    """
+    Expression for the price at or below which each alert fires: its target
+    price, its percentage below the product's 30-day average, or the product's
+    low before its current price (see ProductPriceStats.reference_low), so an
+    unchanged price never fires. NULL (never fires) when the stats a rule
+    needs are missing.
+    """
+    stats = 'tracked_product__product__price_stats__'
+    return Case(
+        When(rule='target', then=F('target_price')),
+        When(rule='percent_drop', then=F(f'{stats}avg_30d') * (100 - F('drop_percent')) / 100),
+        When(
+            rule='all_time_low',
+            tracked_product__product__history_changed_at__gt=F(f'{stats}computed_at'),
+            then=F(f'{stats}all_time_low'),
+        ),
+        When(rule='all_time_low', then=F(f'{stats}prior_low')),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+def find_triggerable_alert_ids(product_ids=None, rules=None):
+    """
+    Return IDs of enabled, untriggered alerts whose product's current price is
+    at or below the alert's threshold, in one query covering every rule type.
+    All-time-low alerts only count prices that took effect after the alert
+    was last set or re-armed. Optionally limited to products and/or rules.
+    """
+    alerts = PriceAlert.objects.filter(
+        is_enabled=True,
+        is_triggered=False,
+        tracked_product__product__current_price__isnull=False,
+    )
+    if product_ids is not None:
+        alerts = alerts.filter(tracked_product__product_id__in=product_ids)
+    if rules is not None:
+        alerts = alerts.filter(rule__in=rules)
+    alerts = alerts.exclude(
+        Q(rule='all_time_low')
+        & (Q(tracked_product__product__history_changed_at__isnull=True)
+           | Q(tracked_product__product__history_changed_at__lte=F('updated_at')))
+    )
+    alerts = alerts.annotate(threshold=alert_threshold()).filter(
+        threshold__gte=F('tracked_product__product__current_price'),
+    )
+    return list(alerts.values_list('pk', flat=True))
+
+def mark_alerts_triggered(alert_ids, triggered_at=None):
+    """
+    Mark alerts triggered with a conditional UPDATE ... RETURNING.
+    Only rows that are still enabled and untriggered are changed, and only
+    their IDs are returned, so concurrent evaluators never both claim an alert.
+    The owners' cached dashboards are invalidated on commit.
+    """
+    if not alert_ids:
+        return []
+    triggered_at = triggered_at or timezone.now()
+    stamp = connection.ops.adapt_datetimefield_value(triggered_at)
+    qn = connection.ops.quote_name
+    table = qn(PriceAlert._meta.db_table)
+    changed = []
+    tracked_product_ids = set()
+    with connection.cursor() as cursor:
+        for i in range(0, len(alert_ids), TRIGGER_BATCH_SIZE):
+            chunk = list(alert_ids[i:i + TRIGGER_BATCH_SIZE])
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f"UPDATE {table} SET {qn('is_triggered')} = %s, {qn('triggered_at')} = %s, "
+                f"{qn('updated_at')} = %s "
+                f"WHERE {qn('id')} IN ({placeholders}) "
+                f"AND {qn('is_triggered')} = %s AND {qn('is_enabled')} = %s "
+                f"RETURNING {qn('id')}, {qn('tracked_product_id')}",
+                [True, stamp, stamp, *chunk, False, True],
+            )
+            rows = cursor.fetchall()
+            changed.extend(row[0] for row in rows)
+            tracked_product_ids.update(row[1] for row in rows)
+    if tracked_product_ids:
+        bump_tracked_product_generations(tracked_product_ids)
+    return changed
+
+def dispatch_alert_notifications(alert_ids):
+    """
+    Queue notifications for alerts that were just marked triggered, and add
+    them to pending daily/weekly digests. Called in the triggering
+    transaction, so jobs exist exactly when the trigger commits.
+    """
+    alerts = PriceAlert.objects.filter(pk__in=alert_ids).select_related(
+        'tracked_product__product__price_stats', 'tracked_product__user__userprofile'
+    )
+    queued = queue_alert_notifications([
+        (alert, alert.tracked_product.product.current_price) for alert in alerts
+    ])
+    add_alert_digest_items(alerts)
+    return queued
+
+def evaluate_price_alerts(product_ids=None, rules=None):
+    """
+    Set-based alert evaluation: find, trigger and notify in three steps whose
+    cost depends on the number of triggered alerts, not the total.
+    Returns the IDs of alerts that were triggered by this call.
+    """
+    candidate_ids = find_triggerable_alert_ids(product_ids, rules)
+    with transaction.atomic():
+        triggered_ids = mark_alerts_triggered(candidate_ids)
+        if triggered_ids:
+            dispatch_alert_notifications(triggered_ids)
+    if triggered_ids:
+        logger.info(f"Triggered {len(triggered_ids)} price alerts")
+    return triggered_ids
+
+def evaluate_changed_product_alerts(products):
+    """
+    Evaluate alerts for products whose price just changed, given as
+    {product_id: (price, reference_price, low)}, where the reference (30-day
+    average) and the low before the current price come from ProductPriceStats
+    and may be None.
+    With a built alert index each product's candidates, of every rule type,
+    come from one in-memory pass; otherwise one set-based query covers the
+    batch. All candidates are then triggered together. Returns triggered IDs.
+    """
+    if not products:
+        return []
+    if not alert_index.is_built:
+        return evaluate_price_alerts(product_ids=list(products))
+    alert_index.sync()
+    candidates = {product_id: alert_index.crossed(product_id, *values) for product_id, values in products.items()}
+    candidate_ids = [alert_id for ids in candidates.values() for alert_id in ids]
+    if not candidate_ids:
+        return []
+    with transaction.atomic():
+        triggered_ids = mark_alerts_triggered(candidate_ids)
+        if triggered_ids:
+            dispatch_alert_notifications(triggered_ids)
+    # Candidates that did not change were already triggered or disabled elsewhere.
+    for product_id, ids in candidates.items():
+        if ids:
+            alert_index.discard(ids, product_id)
+    if triggered_ids:
+        logger.info(f"Triggered {len(triggered_ids)} price alerts for {len(products)} changed products")
+    return triggered_ids
@@ -0,0 +1,290 @@
+"""
+Price analytics for Deal Radar.
+Computes per-product price statistics (30/90-day lows and averages, all-time
+low, volatility, deal score) in vectorized batches over history arrays and
+materializes them into ProductPriceStats, then ranks products into the
+DealRanking "top deals" index.
+"""
+
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from .models import Product, PriceHistory, PriceRollup, ProductPriceStats, DealRanking, JobCheckpoint
+from .series_utils import load_price_arrays_bulk, to_pence, to_epoch, from_epoch
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATS_CHECKPOINT = 'price_stats'
+STATS_MAX_AGE = timedelta(hours=24)
+STATS_CHUNK_SIZE = 500
+TOP_DEALS_PER_CATEGORY = 24
+
+STATS_FIELDS = [
+    'low_30d', 'low_90d', 'avg_30d', 'avg_90d', 'all_time_low', 'prior_low', 'pct_below_avg_30d',
+    'volatility_30d', 'deal_score', 'point_count_90d', 'computed_at',
+]
+
+def _to_price(pence):
+    # Converts a float/int pence value to a 2dp Decimal, or None for missing values.
+    if pence is None or not np.isfinite(pence):
+        return None
+    return (Decimal(int(round(pence))) / 100).quantize(Decimal('0.01'))
+
+def _window_stats(timestamps, prices, groups, durations, n_groups, window_start):
+    # Time-weighted mean/std, minimum and point count per group for points at or
+    # after window_start. Each price is weighted by how long it was current.
+    in_window = timestamps >= window_start
+    weights = durations * in_window
+    weight_sum = np.bincount(groups, weights=weights, minlength=n_groups)
+    price_sum = np.bincount(groups, weights=weights * prices, minlength=n_groups)
+    square_sum = np.bincount(groups, weights=weights * prices * prices, minlength=n_groups)
+    counts = np.bincount(groups, weights=in_window, minlength=n_groups).astype(np.int64)
+    lows = np.full(n_groups, np.inf)
+    np.minimum.at(lows, groups[in_window], prices[in_window])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = price_sum / weight_sum
+        stds = np.sqrt(np.maximum(square_sum / weight_sum - means * means, 0.0))
+    return means, stds, lows, counts
+
+def compute_price_stats(arrays, current_prices, now):
+    """
+    Compute statistics for many products in one vectorized pass.
+    arrays maps product_id -> (timestamps, prices) as returned by
+    load_price_arrays_bulk; current_prices maps product_id -> pence (or None).
+    Returns {product_id: dict of ProductPriceStats field values}.
+    """
+    product_ids = list(arrays)
+    n = len(product_ids)
+    now_epoch = to_epoch(now)
+    lengths = np.array([arrays[pid][0].size for pid in product_ids], dtype=np.int64)
+    groups = np.repeat(np.arange(n), lengths)
+    timestamps = np.concatenate([arrays[pid][0] for pid in product_ids] or [np.empty(0, np.int64)])
+    prices = np.concatenate([arrays[pid][1] for pid in product_ids] or [np.empty(0, np.int64)]).astype(np.float64)
+
+    # Each point is current until the next point of the same product (or now).
+    durations = np.empty(timestamps.size, dtype=np.float64)
+    if timestamps.size:
+        durations[:-1] = np.diff(timestamps)
+        ends = np.cumsum(lengths)[lengths > 0] - 1
+        durations[ends] = now_epoch - timestamps[ends]
+        np.maximum(durations, 1, out=durations)
+
+    mean_30, std_30, low_30, _ = _window_stats(
+        timestamps, prices, groups, durations, n, now_epoch - 30 * 86400
+    )
+    mean_90, _, low_90, count_90 = _window_stats(
+        timestamps, prices, groups, durations, n, now_epoch - 90 * 86400
+    )
+    last_prices = np.full(n, np.nan)
+    nonempty = lengths > 0
+    last_prices[nonempty] = prices[np.cumsum(lengths)[nonempty] - 1]
+    current = np.array([
+        current_prices.get(pid) if current_prices.get(pid) is not None else last_prices[i]
+        for i, pid in enumerate(product_ids)
+    ], dtype=np.float64)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pct_below = (mean_30 - current) / mean_30 * 100
+        volatility = std_30 / mean_30
+        deal_score = np.where(std_30 > 0, (mean_30 - current) / std_30, 0.0)
+
+    results = {}
+    for i, pid in enumerate(product_ids):
+        results[pid] = {
+            'low_30d': _to_price(low_30[i]),
+            'low_90d': _to_price(low_90[i]),
+            'avg_30d': _to_price(mean_30[i]),
+            'avg_90d': _to_price(mean_90[i]),
+            'pct_below_avg_30d': float(pct_below[i]) if np.isfinite(pct_below[i]) else None,
+            'volatility_30d': float(volatility[i]) if np.isfinite(volatility[i]) else None,
+            'deal_score': float(deal_score[i]) if np.isfinite(deal_score[i]) else 0.0,
+            'point_count_90d': int(count_90[i]),
+            'current_pence': float(current[i]),
+        }
+    return results
+
+def _products_needing_refresh(now, since_position):
+    # Products with new history since the last run, stale stats, or no stats yet.
+    changed = set(
+        PriceHistory.objects.filter(pk__gt=since_position)
+        .values_list('product_id', flat=True)
+        .distinct()
+    )
+    stale = set(
+        ProductPriceStats.objects.filter(computed_at__lt=now - STATS_MAX_AGE)
+        .values_list('product_id', flat=True)
+    )
+    missing = set(
+        Product.objects.filter(is_active=True, price_stats__isnull=True)
+        .values_list('pk', flat=True)
+    )
+    return sorted(changed | stale | missing)
+
+def _run_start(timestamps, prices, current, changed_at, now):
+    # When the current price took effect: the product's last history change, or
+    # else the first point after the last differing one in the window (None
+    # when the whole window is at the current price).
+    if changed_at is not None:
+        return changed_at
+    differing = np.flatnonzero(prices != current)
+    if not differing.size:
+        return None
+    after = differing[-1] + 1
+    return from_epoch(timestamps[after]) if after < timestamps.size else now
+
+def _refresh_chunk(product_ids, now):
+    # Loads one chunk of products' history and upserts their ProductPriceStats rows.
+    products = {
+        pid: (price, changed_at)
+        for pid, price, changed_at in Product.objects.filter(pk__in=product_ids, is_active=True)
+        .values_list('pk', 'current_price', 'history_changed_at')
+    }
+    if not products:
+        return 0
+    arrays = load_price_arrays_bulk(list(products), start=now - timedelta(days=90))
+    current = {pid: to_pence(price) if price is not None else None for pid, (price, _) in products.items()}
+    results = compute_price_stats(arrays, current, now)
+
+    # The low before the current price is kept incrementally: prices in the
+    # window before the current price took effect, plus the previous stats
+    # (all of them if the price changed since, else their prior low).
+    # First-time products seed it from daily rollups instead.
+    previous = {
+        pid: (prior_low, all_time_low, computed_at)
+        for pid, prior_low, all_time_low, computed_at in ProductPriceStats.objects.filter(product_id__in=products)
+        .values_list('product_id', 'prior_low', 'all_time_low', 'computed_at')
+    }
+    unseeded = [pid for pid in products if pid not in previous]
+    rollup_lows = {}
+    for pid, bucket_start, low in (
+        PriceRollup.objects.filter(product_id__in=unseeded, granularity='day')
+        .values_list('product_id', 'bucket_start', 'min_price') if unseeded else ()
+    ):
+        rollup_lows.setdefault(pid, []).append((bucket_start, low))
+
+    stats = []
+    for pid, values in results.items():
+        timestamps, prices = arrays[pid]
+        current_pence = values.pop('current_pence')
+        run_start = _run_start(timestamps, prices, current_pence, products[pid][1], now)
+        candidates = []
+        if run_start is not None:
+            before = timestamps < to_epoch(run_start)
+            if before.any():
+                candidates.append(_to_price(prices[before].min()))
+        if pid in previous:
+            prior_low, all_time_low, computed_at = previous[pid]
+            changed_since = run_start is not None and run_start > computed_at
+            candidates.append(all_time_low if changed_since else prior_low)
+        elif run_start is not None:
+            # Only whole days before the current price's day; the window covers the rest.
+            run_day = run_start.astimezone(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+            candidates.extend(low for bucket_start, low in rollup_lows.get(pid, ()) if bucket_start < run_day)
+        candidates = [c for c in candidates if c is not None]
+        prior_low = min(candidates) if candidates else None
+        lows = [c for c in (prior_low, values['low_90d'], _to_price(current_pence)) if c is not None]
+        stats.append(ProductPriceStats(
+            product_id=pid,
+            prior_low=prior_low,
+            all_time_low=min(lows) if lows else None,
+            computed_at=now,
+            **values,
+        ))
+    ProductPriceStats.objects.bulk_create(
+        stats, update_conflicts=True, unique_fields=['product'], update_fields=STATS_FIELDS,
+    )
+    return len(stats)
+
+def refresh_price_stats(chunk_size=STATS_CHUNK_SIZE):
+    """
+    Incrementally refresh ProductPriceStats.
+    Only products with new history since the last run, stats older than
+    STATS_MAX_AGE, or no stats yet are recomputed, chunk_size at a time.
+    Returns the number of products refreshed.
+    """
+    now = timezone.now()
+    checkpoint, _ = JobCheckpoint.objects.get_or_create(name=STATS_CHECKPOINT)
+    latest_pk = PriceHistory.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    product_ids = _products_needing_refresh(now, checkpoint.position)
+    refreshed = 0
+    for i in range(0, len(product_ids), chunk_size):
+        refreshed += _refresh_chunk(product_ids[i:i + chunk_size], now)
+    checkpoint.position = latest_pk
+    checkpoint.save(update_fields=['position', 'updated_at'])
+    logger.info(f"Refreshed price stats for {refreshed} products")
+    return refreshed
+
+def score_deals(pct_below, deal_scores, all_time_low, tracker_counts):
+    """
+    Composite deal score used for the top deals ranking: percent drop versus
+    the 30-day average, how unusual the drop is, an all-time-low bonus, and
+    a small boost for products many users are tracking. All inputs are arrays.
+    """
+    pct_below = np.nan_to_num(np.asarray(pct_below, dtype=np.float64))
+    deal_scores = np.nan_to_num(np.asarray(deal_scores, dtype=np.float64))
+    return (
+        np.clip(pct_below, 0, 90)
+        + 5 * np.clip(deal_scores, 0, 4)
+        + 15 * np.asarray(all_time_low, dtype=bool)
+        + 5 * np.log1p(np.asarray(tracker_counts, dtype=np.float64))
+    )
+
+def refresh_top_deals(limit=TOP_DEALS_PER_CATEGORY):
+    """
+    Rebuild the DealRanking index from ProductPriceStats: the top `limit`
+    products overall and per category. Only products priced below their
+    30-day average or at an all-time low are ranked.
+    Returns the number of ranking rows written.
+    """
+    now = timezone.now()
+    rows = list(
+        ProductPriceStats.objects.filter(product__is_active=True)
+        .annotate(tracker_count=Count('product__tracked_by', filter=Q(product__tracked_by__is_active=True)))
+        .values_list(
+            'product_id', 'product__category', 'product__current_price', 'prior_low', 'all_time_low',
+            'product__history_changed_at', 'computed_at', 'pct_below_avg_30d', 'deal_score', 'tracker_count',
+        )
+    )
+    if not rows:
+        DealRanking.objects.all().delete()
+        return 0
+    product_ids, categories, current, prior_lows, lows, changed, computed, pct_below, deal_scores, trackers = zip(*rows)
+    reference_lows = map(ProductPriceStats.reference_low, prior_lows, lows, changed, computed)
+    at_low = np.array([
+        price is not None and low is not None and price <= low
+        for price, low in zip(current, reference_lows)
+    ])
+    pct = np.array([p if p is not None else np.nan for p in pct_below], dtype=np.float64)
+    scores = score_deals(pct, deal_scores, at_low, trackers)
+    eligible = (np.nan_to_num(pct) > 0) | at_low
+    order = [i for i in np.argsort(-scores, kind='stable') if eligible[i]]
+
+    rankings = []
+    ranks = {}
+    for i in order:
+        for category in (DealRanking.OVERALL, categories[i]):
+            rank = ranks.get(category, 0) + 1
+            if rank > limit:
+                continue
+            ranks[category] = rank
+            rankings.append(DealRanking(
+                category=category, rank=rank, product_id=product_ids[i], score=float(scores[i]),
+                is_all_time_low=bool(at_low[i]), tracker_count=trackers[i], refreshed_at=now,
+            ))
+    with transaction.atomic():
+        DealRanking.objects.all().delete()
+        DealRanking.objects.bulk_create(rankings)
+    logger.info(f"Refreshed top deals: {len(rankings)} rankings across {len(ranks)} categories")
+    return len(rankings)
+
+def get_top_deals(category=DealRanking.OVERALL, limit=TOP_DEALS_PER_CATEGORY):
+    """Top deals for a category (or overall) in rank order, with product and stats loaded."""
+    return (
+        DealRanking.objects.filter(category=category)
+        .select_related('product__price_stats')
+        .order_by('rank')[:limit]
+    )
@@ -6,3 +6,15 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        # Connects the PriceAlert signals that keep the in-memory alert index in sync.
+        from . import alert_index  # noqa: F401
+        # Connects the Product signals that maintain the per-category counters.
+        from . import listing_utils  # noqa: F401
+        # Connects the Product signals that keep the full-text search index current.
+        from . import search_utils  # noqa: F401
+        # Connects the Product signals that keep the in-memory autocomplete index in sync.
+        from . import autocomplete_index  # noqa: F401
+        # Connects the UserProfile signal that invalidates cached profile pages.
+        from . import dashboard_utils  # noqa: F401
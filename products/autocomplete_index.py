@@ -0,0 +1,374 @@
+"""
+In-memory autocomplete index for Deal Radar.
+Suggests product names and retailer (site) names as the user types, from
+a trigram index held in each web process instead of a database query per
+keystroke. Every word is indexed as padded trigrams ("  s", " sa", "sam",
+...), and the last word of a query is matched as a prefix, so "sams gal"
+finds "Samsung Galaxy S24"; a query only needs SIMILARITY_THRESHOLD of its
+trigrams to match, so a typo ("samsnug") still finds it.
+
+Entry ids are assigned in rank order (retailers, then products newest
+first) and every posting list is sorted by id, so the best-ranked matches
+are always at the front of a posting and lookups can stop after
+a bounded number of them: exact matches are found by intersecting the
+postings chunk by chunk, and only when there are none does a
+typo-tolerant pass count shared trigrams over the best-ranked
+MAX_POSTING_CANDIDATES of each posting. The index holds at most
+AUTOCOMPLETE_MAX_ENTRIES entries. A build leaves BUILD_HEADROOM of them
+free for products added or renamed afterwards; once that is used up, the
+next sync rebuilds, dropping the oldest products instead of the new ones.
+
+Each process builds its index on first use rather than at import, so
+processes that never serve suggestions don't read the product table, and
+a failed build fails that request and is retried by the next. The
+Product signals below keep it in sync with edits made in the same
+process, and sync() (throttled to AUTOCOMPLETE_SYNC_SECONDS) pulls edits
+made by other processes using Product.updated_at. Deleted products are
+dropped in-process; elsewhere they remain suggestible until the next
+rebuild. Builds and syncs read the database without holding the lock
+suggest() needs: a build fills a new index and swaps its contents in.
+"""
+
+from array import array
+import re
+import threading
+import time
+import numpy as np
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Product
+import logging
+
+logger = logging.getLogger(__name__)
+
+REBUILD_CHUNK_SIZE = 10000
+MATCH_CHUNK_SIZE = 2048
+MAX_POSTING_CANDIDATES = 500
+SIMILARITY_THRESHOLD = 0.5
+MAX_QUERY_LENGTH = 100
+# Rebuild once this share of entries belongs to deleted or renamed products.
+MAX_DEAD_SHARE = 0.25
+# Share of the size cap a build leaves free for later additions.
+BUILD_HEADROOM = 0.05
+
+KIND_SITE = 0
+KIND_PRODUCT = 1
+
+def normalize(text):
+    """Lowercase words separated by single spaces."""
+    return ' '.join(re.findall(r'\w+', text.lower()))
+
+def word_trigrams(text, prefix=False):
+    """
+    Padded trigrams of each word in normalized text, one set per word. With
+    prefix=True the last word gets no end padding, so it matches any word
+    it starts.
+    """
+    words = text.split()
+    grams = []
+    for i, word in enumerate(words):
+        padded = f'  {word}' if prefix and i == len(words) - 1 else f'  {word} '
+        grams.append({padded[j:j + 3] for j in range(len(padded) - 2)})
+    return grams
+
+def trigrams(text, prefix=False):
+    """All padded trigrams of normalized text (see word_trigrams)."""
+    return set().union(*word_trigrams(text, prefix))
+
+def _contains(posting, values):
+    """Boolean mask of which sorted values occur in the sorted posting."""
+    positions = np.searchsorted(posting, values)
+    found = positions < len(posting)
+    found[found] = posting[positions[found]] == values[found]
+    return found
+
+class AutocompleteIndex:
+    """Trigram postings over product and retailer names, with a size cap."""
+
+    # Everything _reset() sets; load() swaps these in from a freshly built index.
+    _CONTENTS = (
+        '_texts', '_kinds', '_product_ids', '_alive', '_postings', '_by_product', '_sites',
+        '_dead', '_rebuild_due', 'truncated',
+    )
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or settings.AUTOCOMPLETE_MAX_ENTRIES
+        self._reset()
+        self._synced_at = None
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+        # Held by the one thread building or syncing, which reads the database
+        # without _lock.
+        self._sync_lock = threading.Lock()
+
+    def _reset(self):
+        self._texts = []
+        self._kinds = array('b')
+        self._product_ids = array('q')
+        self._alive = bytearray()
+        self._postings = {}
+        self._by_product = {}
+        self._sites = set()
+        self._dead = 0
+        self._rebuild_due = False
+        self.truncated = False
+
+    @property
+    def is_built(self):
+        return self._synced_at is not None
+
+    def __len__(self):
+        return len(self._texts) - self._dead
+
+    def _add(self, text, kind, product_id=0, limit=None):
+        # Caller holds the lock. Returns False once limit (default: the cap) is reached.
+        if len(self._texts) >= (limit or self.max_entries):
+            self.truncated = True
+            return False
+        entry_id = len(self._texts)
+        self._texts.append(text)
+        self._kinds.append(kind)
+        self._product_ids.append(product_id)
+        self._alive.append(1)
+        postings = self._postings
+        for gram in trigrams(normalize(text)):
+            posting = postings.get(gram)
+            if posting is None:
+                posting = postings[gram] = array('i')
+            posting.append(entry_id)
+        if kind == KIND_PRODUCT:
+            self._by_product[product_id] = entry_id
+        else:
+            self._sites.add(text)
+        return True
+
+    def load(self, sites, products):
+        """
+        Replace the index contents from site names and (product_id, name)
+        pairs, each in rank order, stopping BUILD_HEADROOM short of
+        max_entries. The new contents are built aside, so suggestions keep
+        using the old ones until they are swapped in.
+        """
+        limit = max(1, self.max_entries - int(self.max_entries * BUILD_HEADROOM))
+        fresh = AutocompleteIndex(self.max_entries)
+        fresh._fill(sites, products, limit)
+        with self._lock:
+            for name in self._CONTENTS:
+                setattr(self, name, getattr(fresh, name))
+
+    def _fill(self, sites, products, limit):
+        # Only called on a new index no other thread can see yet.
+        for site in sites:
+            if not self._add(site, KIND_SITE, limit=limit):
+                return
+        for product_id, name in products:
+            if not self._add(name, KIND_PRODUCT, product_id, limit):
+                return
+
+    def rebuild(self):
+        """
+        Load retailer names and the newest products from the database.
+        Callers other than sync() must not run it concurrently with one.
+        """
+        started_at = timezone.now()
+        sites = (
+            Product.objects.exclude(site_name='').order_by('site_name')
+            .values_list('site_name', flat=True).distinct()
+        )
+        products = (
+            Product.objects.order_by('-created_at', '-id')
+            .values_list('pk', 'name')[:self.max_entries]
+            .iterator(chunk_size=REBUILD_CHUNK_SIZE)
+        )
+        self.load(sites, products)
+        self._synced_at = started_at
+        self._checked_at = time.monotonic()
+        logger.info(
+            f"Built autocomplete index: {len(self)} entries, {self.memory_usage() / 1024 / 1024:.1f} MiB"
+            f"{' (truncated at the size cap)' if self.truncated else ''}"
+        )
+
+    def upsert_product(self, product_id, name, site_name=''):
+        """
+        Add a product, or replace its entry if the name changed. When the
+        index is full the next sync rebuilds it; a renamed product keeps its
+        old entry until then.
+        """
+        with self._lock:
+            entry_id = self._by_product.get(product_id)
+            if entry_id is None or self._texts[entry_id] != name:
+                if not self._add(name, KIND_PRODUCT, product_id):
+                    self._rebuild_due = True
+                elif entry_id is not None:
+                    self._kill(entry_id)
+            if site_name and site_name not in self._sites and not self._add(site_name, KIND_SITE):
+                self._rebuild_due = True
+
+    def discard_product(self, product_id):
+        with self._lock:
+            entry_id = self._by_product.get(product_id)
+            if entry_id is not None:
+                self._kill(entry_id)
+
+    def _kill(self, entry_id):
+        # Postings keep the id; lookups skip dead entries until the next rebuild.
+        self._alive[entry_id] = 0
+        self._dead += 1
+        product_id = self._product_ids[entry_id]
+        if self._by_product.get(product_id) == entry_id:
+            del self._by_product[product_id]
+
+    def _sync_due(self):
+        return not self.is_built or time.monotonic() - self._checked_at >= settings.AUTOCOMPLETE_SYNC_SECONDS
+
+    def sync(self):
+        """
+        Apply products created or edited by other processes since the last
+        build or sync, at most once per AUTOCOMPLETE_SYNC_SECONDS. Rebuilds
+        when the index was never built, MAX_DEAD_SHARE of it is dead, or it
+        filled up. While one thread syncs, others carry on with the current
+        contents; before the first build they wait for it.
+        """
+        if not self._sync_due():
+            return 0
+        if not self._sync_lock.acquire(blocking=not self.is_built):
+            return 0
+        try:
+            if not self._sync_due():
+                # Another thread synced while this one waited for the lock.
+                return 0
+            if not self.is_built or self._rebuild_due or self._dead > MAX_DEAD_SHARE * len(self._texts):
+                self.rebuild()
+                return 0
+            started_at = timezone.now()
+            changes = list(
+                Product.objects.filter(updated_at__gte=self._synced_at).values_list('pk', 'name', 'site_name')
+            )
+            with self._lock:
+                for pk, name, site_name in changes:
+                    self.upsert_product(pk, name, site_name)
+            self._synced_at = started_at
+            self._checked_at = time.monotonic()
+            return len(changes)
+        finally:
+            self._sync_lock.release()
+
+    def suggest(self, query, limit=8):
+        """
+        Up to limit suggestions for a partial query as (text, kind,
+        product_id) tuples, best first: closest trigram match, then entries
+        starting with the query, then rank.
+        """
+        query = normalize(query[:MAX_QUERY_LENGTH])
+        word_grams = word_trigrams(query, prefix=True)
+        grams = set().union(*word_grams)
+        if not grams:
+            return []
+        wanted = limit * 2
+        with self._lock:
+            found = {}
+            for gram in grams:
+                posting = self._postings.get(gram)
+                if posting:
+                    found[gram] = np.frombuffer(posting, dtype=np.int32)
+            postings = sorted(found.values(), key=len)
+            alive = np.frombuffer(self._alive, dtype=np.uint8)
+            candidates = np.empty(0, dtype=np.int32)
+            if len(found) == len(grams):
+                # Trigrams of one word have near-identical postings, so
+                # intersect with the rarest trigram of each word first.
+                firsts = sorted({min(word, key=lambda gram: len(found[gram])) for word in word_grams}, key=lambda gram: len(found[gram]))
+                ordered = [found[gram] for gram in firsts]
+                ordered += [posting for gram, posting in sorted(found.items(), key=lambda item: len(item[1])) if gram not in firsts]
+                candidates = self._match_all(ordered, alive, wanted)
+            similarity = np.ones(len(candidates))
+            if not len(candidates):
+                candidates, similarity = self._match_similar(postings, alive, len(grams))
+            # Best matches first, lower id (better rank) breaking ties; only the
+            # head is checked for a prefix match.
+            order = np.lexsort((candidates, -similarity))[:wanted]
+            scored = []
+            for i in order:
+                entry_id = int(candidates[i])
+                text = self._texts[entry_id]
+                prefix = normalize(text).startswith(query)
+                scored.append((-similarity[i] - prefix, entry_id, text))
+            scored.sort()
+            suggestions = []
+            seen = set()
+            for _, entry_id, text in scored:
+                if text.lower() in seen:
+                    continue
+                seen.add(text.lower())
+                suggestions.append((text, self._kinds[entry_id], self._product_ids[entry_id]))
+                if len(suggestions) == limit:
+                    break
+            return suggestions
+
+    def _match_all(self, postings, alive, wanted):
+        # Live entries containing every trigram, best-ranked first: walk the
+        # first posting in chunks, intersecting each with the others in
+        # order, until enough matches are found.
+        rarest, others = postings[0], postings[1:]
+        matches = []
+        found = 0
+        start, size = 0, MATCH_CHUNK_SIZE
+        while start < len(rarest):
+            chunk = rarest[start:start + size]
+            # Chunks double, so rare combinations take few passes.
+            start, size = start + size, size * 2
+            chunk = chunk[alive[chunk] == 1]
+            for posting in others:
+                if not len(chunk):
+                    break
+                chunk = chunk[_contains(posting, chunk)]
+            matches.append(chunk)
+            found += len(chunk)
+            if found >= wanted:
+                break
+        return np.concatenate(matches)[:wanted] if matches else np.empty(0, dtype=np.int32)
+
+    def _match_similar(self, postings, alive, gram_count):
+        # Live entries sharing at least SIMILARITY_THRESHOLD of the trigrams.
+        # Any such entry appears in at least one of the rarest
+        # len(postings) - needed + 1 postings; candidates are the best-ranked
+        # entries of those, then matches are counted across all postings.
+        needed = max(1, int(np.ceil(gram_count * SIMILARITY_THRESHOLD)))
+        if len(postings) < needed:
+            return np.empty(0, dtype=np.int32), np.empty(0)
+        candidates = np.unique(np.concatenate([
+            posting[:MAX_POSTING_CANDIDATES] for posting in postings[:len(postings) - needed + 1]
+        ]))
+        candidates = candidates[alive[candidates] == 1]
+        shared = np.zeros(len(candidates), dtype=np.int32)
+        for posting in postings:
+            shared += _contains(posting, candidates)
+        keep = shared >= needed
+        return candidates[keep], shared[keep] / gram_count
+
+    def memory_usage(self):
+        """Approximate bytes held by the postings and entry arrays."""
+        postings = sum(len(posting) * posting.itemsize for posting in self._postings.values())
+        texts = sum(len(text) for text in self._texts)
+        entries = len(self._texts) * (self._kinds.itemsize + self._product_ids.itemsize + 1 + 8)
+        return postings + texts + entries
+
+autocomplete_index = AutocompleteIndex()
+
+def get_autocomplete_index():
+    """The process-wide index, built on first use and kept in sync."""
+    autocomplete_index.sync()
+    return autocomplete_index
+
+@receiver(post_save, sender=Product)
+def sync_autocomplete_on_save(sender, instance, created, **kwargs):
+    # Processes that never built the index skip the work entirely.
+    if autocomplete_index.is_built and (created or instance.changed_fields(['name', 'site_name'])):
+        autocomplete_index.upsert_product(instance.pk, instance.name, instance.site_name)
+
+@receiver(post_delete, sender=Product)
+def sync_autocomplete_on_delete(sender, instance, **kwargs):
+    if autocomplete_index.is_built:
+        autocomplete_index.discard_product(instance.pk)
@@ -0,0 +1,108 @@
+"""
+Alert threshold backtesting for Deal Radar.
+Answers "how often would this alert have fired?" for a product and one or
+more threshold prices over the last BACKTEST_WINDOW: how many times the
+price dropped to or below each threshold, how long after the window start
+it first did, and how long it spent there in total. A product's history is
+loaded once per (product, history version, day) and cached as arrays;
+each backtest is then a few vectorized NumPy operations, fast enough to
+run inline when a user sets an alert.
+"""
+
+from collections import namedtuple
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .series_utils import load_price_arrays, to_epoch, to_pence
+import logging
+
+logger = logging.getLogger(__name__)
+
+BACKTEST_WINDOW = timedelta(days=90)
+BACKTEST_CACHE_TIMEOUT = 24 * 60 * 60
+
+# first_hit_after and time_below are timedeltas (first_hit_after is None if
+# never hit); share_below is the fraction of the covered period spent at or
+# below the threshold.
+BacktestResult = namedtuple('BacktestResult', ['threshold', 'hits', 'first_hit_after', 'time_below', 'share_below'])
+
+def history_version(product):
+    """Changes whenever a price change is written to the product's history."""
+    changed_at = product.history_changed_at
+    return int(changed_at.timestamp() * 1000000) if changed_at else 0
+
+def _load_series(product, day):
+    # History from BACKTEST_WINDOW before the start of `day` (plus a heartbeat
+    # interval, so the price current at the window start is included), cached
+    # until the product's history changes or the day ends.
+    key = f'backtest:{product.pk}:{history_version(product)}:{day.isoformat()}'
+    series = cache.get(key)
+    if series is None:
+        lead = timedelta(hours=settings.PRICE_HISTORY_HEARTBEAT_HOURS + 1)
+        start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc) - BACKTEST_WINDOW - lead
+        series = load_price_arrays(product.pk, start=start)
+        cache.set(key, series, BACKTEST_CACHE_TIMEOUT)
+    return series
+
+def compute_backtest(timestamps, prices, thresholds, window_start, window_end):
+    """
+    Backtest integer-pence thresholds against a price step series (each
+    price holds until the next point) clipped to [window_start, window_end],
+    all in epoch seconds. Returns (hits, first_hit_after, time_below,
+    covered) arrays, one entry per threshold; first_hit_after is -1 where
+    the threshold was never reached.
+    """
+    thresholds = np.asarray(thresholds, dtype=np.int64)
+    # Start from the last point at or before the window start.
+    first = max(int(np.searchsorted(timestamps, window_start, side='right')) - 1, 0)
+    timestamps, prices = timestamps[first:], prices[first:]
+    if not timestamps.size:
+        zeros = np.zeros(thresholds.size, dtype=np.int64)
+        return zeros, np.full(thresholds.size, -1, dtype=np.int64), zeros, 0
+    starts = np.maximum(timestamps, window_start)
+    durations = np.maximum(np.append(starts[1:], window_end) - starts, 0)
+
+    below = prices[np.newaxis, :] <= thresholds[:, np.newaxis]
+    # A hit is a point at or below the threshold whose predecessor was above it.
+    entered = below.copy()
+    entered[:, 1:] &= ~below[:, :-1]
+    hits = entered.sum(axis=1)
+    first_hit = np.where(below.any(axis=1), starts[below.argmax(axis=1)] - window_start, -1)
+    time_below = (below * durations).sum(axis=1)
+    return hits, first_hit, time_below, int(durations.sum())
+
+def backtest_thresholds(product, thresholds, now=None):
+    """
+    Backtest threshold prices (Decimals) against the product's history over
+    the last BACKTEST_WINDOW. Returns one BacktestResult per threshold.
+    """
+    now = now or timezone.now()
+    timestamps, prices = _load_series(product, now.astimezone(dt_timezone.utc).date())
+    window_end = to_epoch(now)
+    window_start = window_end - int(BACKTEST_WINDOW.total_seconds())
+    hits, first_hit, time_below, covered = compute_backtest(
+        timestamps, prices, [to_pence(t) for t in thresholds], window_start, window_end,
+    )
+    return [
+        BacktestResult(
+            threshold=threshold,
+            hits=int(hits[i]),
+            first_hit_after=timedelta(seconds=int(first_hit[i])) if first_hit[i] >= 0 else None,
+            time_below=timedelta(seconds=int(time_below[i])),
+            share_below=float(time_below[i]) / covered if covered else 0.0,
+        )
+        for i, threshold in enumerate(thresholds)
+    ]
+
+def describe_backtest(result):
+    """One sentence summarising a BacktestResult for the alert forms."""
+    days = BACKTEST_WINDOW.days
+    if not result.hits:
+        return f"The price hasn't been at or below £{result.threshold:.2f} in the past {days} days."
+    times = 'once' if result.hits == 1 else f'{result.hits} times'
+    return (
+        f"In the past {days} days the price dropped to £{result.threshold:.2f} or less {times}, "
+        f"first after {result.first_hit_after.days} days, and stayed there {result.share_below:.0%} of the time."
+    )
@@ -0,0 +1,81 @@
+"""
+Per-user page caching for Deal Radar.
+The dashboard and profile data of each user are cached together with the
+user's generation token, and a cached payload is only used while its token
+still matches the current one. Anything that changes what those pages show
+bumps the user's generation once its transaction commits:
+- tracking and alert edits in the views and the admin,
+- alerts being triggered (mark_alerts_triggered),
+- price changes of tracked products (record_price_change),
+- product detail edits (update_product_metadata, add_product, the admin),
+- any UserProfile save (receiver below; covers webhooks and the admin).
+A repeat visit is then a single get_many of the token and the payload.
+Tokens are time-based rather than counters, so a token lost from the cache
+is never re-issued with a value an old payload was stored under.
+"""
+
+import time
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import TrackedProduct, UserProfile
+import logging
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_TIMEOUT = 60 * 60
+
+def _generation_key(user_id):
+    return f'user_generation:{user_id}'
+
+def _new_generation():
+    return time.time_ns()
+
+def _bump(user_ids):
+    generation = _new_generation()
+    cache.set_many({_generation_key(user_id): generation for user_id in user_ids}, timeout=None)
+
+def bump_user_generations(user_ids):
+    """Invalidate the cached pages of user_ids when the current transaction commits."""
+    user_ids = set(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: _bump(user_ids))
+
+def bump_product_generations(product_ids):
+    """Invalidate the cached pages of every user tracking one of product_ids."""
+    bump_user_generations(
+        TrackedProduct.objects.filter(product_id__in=product_ids).values_list('user_id', flat=True).distinct()
+    )
+
+def bump_tracked_product_generations(tracked_product_ids):
+    """Invalidate the cached pages of the owners of tracked_product_ids."""
+    bump_user_generations(
+        TrackedProduct.objects.filter(pk__in=tracked_product_ids).values_list('user_id', flat=True).distinct()
+    )
+
+def cached_user_payload(user_id, name, build):
+    """
+    The user's cached payload called name, or build() stored under the
+    user's current generation if it is missing or out of date.
+    """
+    generation_key = _generation_key(user_id)
+    key = f'{name}:{user_id}'
+    cached = cache.get_many([generation_key, key])
+    generation = cached.get(generation_key)
+    if generation is None:
+        generation = _new_generation()
+        if not cache.add(generation_key, generation, timeout=None):
+            generation = cache.get(generation_key)
+    entry = cached.get(key)
+    if entry is not None and entry[0] == generation:
+        return entry[1]
+    # Built after reading the generation: a bump while building leaves this
+    # payload under the old generation, where the next visit ignores it.
+    payload = build()
+    cache.set(key, (generation, payload), USER_CACHE_TIMEOUT)
+    return payload
+
+@receiver(post_save, sender=UserProfile)
+def bump_generation_on_profile_save(sender, instance, **kwargs):
+    bump_user_generations([instance.user_id])
@@ -0,0 +1,203 @@
+"""
+Summary email generation for Deal Radar.
+Activity for users on daily or weekly summaries (triggered alerts, notable
+price drops on tracked products) is appended to PendingDigestItem as it
+happens. Summary runs walk the users in primary-key chunks, load each
+chunk's pending items and tracked products in bulk, render them, and
+queue the emails in the same transaction that deletes the flushed items
+and advances a checkpoint, so an interrupted run resumes where it stopped
+without duplicates and no run ever scans price history. Rendering stays
+in-process: runs happen inside Celery workers, where forking a pool would
+hand the broker, Redis and cache listener state to the children, and with
+loads batched rendering is not the bottleneck.
+"""
+
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+from .models import TrackedProduct, NotificationJob, JobCheckpoint, PendingDigestItem
+from .notification_utils import enqueue_notifications
+import logging
+
+logger = logging.getLogger(__name__)
+
+DIGEST_FREQUENCIES = ('daily', 'weekly')
+SUMMARY_CHUNK_SIZE = 500
+# Pending items older than this are dropped (e.g. the user switched to immediate alerts).
+PENDING_ITEM_MAX_AGE = timedelta(days=14)
+
+def add_alert_digest_items(alerts):
+    """
+    Append triggered alerts to the pending digests of users on daily or
+    weekly summaries. alerts should have tracked_product, its product and
+    user__userprofile loaded.
+    """
+    items = []
+    for alert in alerts:
+        tracked = alert.tracked_product
+        profile = tracked.user.userprofile
+        if profile.email_notifications and profile.notification_frequency in DIGEST_FREQUENCIES:
+            items.append(PendingDigestItem(
+                user_id=tracked.user_id, kind='alert', product_id=tracked.product_id, alert=alert,
+                target_price=alert.target_price, new_price=tracked.product.current_price,
+            ))
+    return PendingDigestItem.objects.bulk_create(items)
+
+def add_price_drop_digest_items(changes):
+    """
+    Append notable price drops to the pending digests of every daily/weekly
+    user tracking the product. changes maps product_id -> (old_price, new_price);
+    drops smaller than DIGEST_MIN_DROP_PERCENT are ignored.
+    """
+    threshold = settings.DIGEST_MIN_DROP_PERCENT
+    drops = {
+        product_id: (old, new) for product_id, (old, new) in changes.items()
+        if old and new is not None and new < old and (old - new) / old * 100 >= threshold
+    }
+    if not drops:
+        return []
+    trackers = TrackedProduct.objects.filter(
+        product_id__in=drops,
+        is_active=True,
+        user__userprofile__email_notifications=True,
+        user__userprofile__notification_frequency__in=DIGEST_FREQUENCIES,
+    ).values_list('user_id', 'product_id')
+    return PendingDigestItem.objects.bulk_create([
+        PendingDigestItem(
+            user_id=user_id, kind='price_drop', product_id=product_id,
+            old_price=drops[product_id][0], new_price=drops[product_id][1],
+        )
+        for user_id, product_id in trackers
+    ])
+
+def load_summary_data(user_ids):
+    """
+    Load pending digest items and active tracked products for many users in
+    two queries. Several drops of one product collapse into one (first old
+    price, last new price). Returns ({user_id: (alert_items, drop_items,
+    tracked_products)}, highest item id loaded).
+    """
+    data = {user_id: ([], {}, []) for user_id in user_ids}
+    max_item_id = 0
+    items = PendingDigestItem.objects.filter(user_id__in=user_ids).select_related('product', 'alert')
+    for item in items.order_by('user_id', 'id'):
+        max_item_id = max(max_item_id, item.pk)
+        alerts, drops, _ = data[item.user_id]
+        if item.kind == 'alert':
+            alerts.append(item)
+        elif item.product_id in drops:
+            drops[item.product_id].new_price = item.new_price
+        else:
+            drops[item.product_id] = item
+    tracked = (
+        TrackedProduct.objects.filter(user_id__in=user_ids, is_active=True)
+        .select_related('product__price_stats')
+        .order_by('user_id', '-added_at')
+    )
+    for entry in tracked:
+        data[entry.user_id][2].append(entry)
+    return {
+        user_id: (alerts, [d for d in drops.values() if d.new_price < d.old_price], tracked_products)
+        for user_id, (alerts, drops, tracked_products) in data.items()
+    }, max_item_id
+
+def summary_context(user, frequency, alert_items, drop_items, tracked_products, day):
+    return {
+        'user': user,
+        'frequency': frequency,
+        'triggered_alerts': alert_items,
+        'price_drops': drop_items,
+        'tracked_products': tracked_products,
+        'date': day,
+        'site_name': 'Deal Radar',
+        'site_url': settings.SITE_DOMAIN,
+    }
+
+def summary_subject(frequency, day):
+    if frequency == 'weekly':
+        return f'📊 Weekly Deal Radar Summary - Week of {day.strftime("%B %d, %Y")}'
+    return f'📊 Daily Deal Radar Summary - {day.strftime("%B %d, %Y")}'
+
+def queue_summaries(users, frequency, day):
+    """
+    Render and queue summaries for users, deleting the pending items they
+    include. A user's summary for a given day is queued at most once; items
+    of a user whose summary was already queued are kept for the next one.
+    Call inside a transaction. Returns the number queued.
+    """
+    user_ids = [user.pk for user in users]
+    data, max_item_id = load_summary_data(user_ids)
+    subject = summary_subject(frequency, day)
+    jobs = []
+    for user in users:
+        if not any(data[user.pk]):
+            continue
+        html = render_to_string('emails/daily_summary.html', summary_context(user, frequency, *data[user.pk], day))
+        jobs.append(NotificationJob(
+            user_id=user.pk, channel='email', recipient=user.email,
+            subject=subject, body=strip_tags(html), html_body=html,
+            idempotency_key=f'{frequency}_summary:{day.isoformat()}:{user.pk}',
+        ))
+    queued = enqueue_notifications(jobs)
+    PendingDigestItem.objects.filter(user_id__in=[job.user_id for job in queued], pk__lte=max_item_id).delete()
+    return len(queued)
+
+def _summary_recipients(frequency, after_pk):
+    return (
+        User.objects.filter(
+            pk__gt=after_pk,
+            userprofile__email_notifications=True,
+            userprofile__notification_frequency=frequency,
+        )
+        .exclude(email='')
+        .order_by('pk')
+    )
+
+def send_summaries(frequency, day, period_key, chunk_size=SUMMARY_CHUNK_SIZE, restart=False, progress=None):
+    """
+    Queue summary emails for every user on `frequency` summaries.
+    Progress is checkpointed per chunk under period_key, so re-running for
+    the same period only handles users not yet done; restart=True starts over.
+    progress, if given, is called with (users_done, users_total, queued) after each chunk.
+    Returns (users_processed, summaries_queued).
+    """
+    prefix = f'{frequency}_summary:'
+    name = f'{prefix}{period_key}'
+    JobCheckpoint.objects.filter(name__startswith=prefix).exclude(name=name).delete()
+    PendingDigestItem.objects.filter(created_at__lt=timezone.now() - PENDING_ITEM_MAX_AGE).delete()
+    checkpoint, _ = JobCheckpoint.objects.get_or_create(name=name)
+    if restart:
+        checkpoint.position = 0
+        checkpoint.save(update_fields=['position', 'updated_at'])
+
+    total = _summary_recipients(frequency, checkpoint.position).count()
+    processed = queued = 0
+    while True:
+        users = list(_summary_recipients(frequency, checkpoint.position)[:chunk_size])
+        if not users:
+            break
+        with transaction.atomic():
+            queued += queue_summaries(users, frequency, day)
+            checkpoint.position = users[-1].pk
+            checkpoint.save(update_fields=['position', 'updated_at'])
+        processed += len(users)
+        logger.info(f"{frequency.capitalize()} summaries: {processed}/{total} users processed, {queued} queued")
+        if progress:
+            progress(processed, total, queued)
+    return processed, queued
+
+def send_daily_summaries(day=None, **kwargs):
+    """Queue today's daily summaries; see send_summaries for options."""
+    day = day or timezone.localdate()
+    return send_summaries('daily', day, day.isoformat(), **kwargs)
+
+def send_weekly_summaries(day=None, **kwargs):
+    """Queue this week's weekly summaries; see send_summaries for options."""
+    day = day or timezone.localdate()
+    year, week, _ = day.isocalendar()
+    week_start = day - timedelta(days=day.weekday())
+    return send_summaries('weekly', week_start, f'{year}-W{week:02d}', **kwargs)
@@ -1,69 +1,24 @@
 """
 Email notification utilities for Deal Radar.
-Handles sending price alerts, welcome emails, and daily summaries.
+Handles welcome emails and daily summaries; price alert emails are built in
+notification_utils. Messages are rendered here and queued in the
+notification outbox; the email delivery workers send them in batches over
+reused SMTP sessions.
 """
 
-from django.core.mail import send_mail
-from django.conf import settings
+from django.db import transaction
 from django.template.loader import render_to_string
-from django.utils.html import strip_tags
 from django.utils import timezone
-from .models import UserProfile, PriceAlert, TrackedProduct
-from products.whatsapp_utils import send_whatsapp_alert
+from .models import UserProfile
+from .notification_utils import enqueue_email
+from .digest_utils import queue_summaries
 import logging
 
 logger = logging.getLogger(__name__)
 
-def send_price_alert_email(alert, old_price, new_price):
-    """
-    Send an email and WhatsApp notification for a triggered price alert.
-    """
-    user = alert.user
-    product = alert.tracked_product.product
-
-    try:
-        profile = user.userprofile
-    except Exception:
-        profile = None
-
-    # WhatsApp alert
-    if profile and getattr(profile, 'whatsapp_notifications', False) and profile.whatsapp_number:
-        message = (
-            f"Deal Radar Alert: '{product.name}' has dropped from £{old_price} to £{new_price}!\n"
-            f"Check it here: {product.url}"
-        )
-        send_whatsapp_alert(profile.whatsapp_number, message)
-
-    # Email alert (existing logic)
-    if profile and getattr(profile, 'email_notifications', True):
-        subject = f"Price Drop Alert: {product.name}"
-        context = {
-            'user': user,
-            'product': product,
-            'old_price': old_price,
-            'new_price': new_price,
-            'site_name': 'Deal Radar',
-        }
-        html_message = render_to_string('emails/price_alert.html', context)
-        plain_message = strip_tags(html_message)
-        try:
-            send_mail(
-                subject=subject,
-                message=plain_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[user.email],
-                html_message=html_message,
-                fail_silently=False,
-            )
-            return True
-        except Exception as e:
-            logger.error(f"Error sending price alert email: {e}")
-            return False
-    return True
-
 def send_welcome_email(user):
     """
-    Send a welcome email to a new user after registration.
+    Queue a welcome email to a new user after registration.
     """
     subject = '🎯 Welcome to Deal Radar!'
     
@@ -73,26 +28,20 @@ def send_welcome_email(user):
     }
     
     html_message = render_to_string('emails/welcome.html', context)
-    plain_message = strip_tags(html_message)
     
     try:
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
-        logger.info(f"Welcome email sent to {user.email}")
+        enqueue_email(user.email, subject, html_message, user=user, idempotency_key=f'welcome:{user.pk}')
+        logger.info(f"Welcome email queued for {user.email}")
         return True
     except Exception as e:
-        logger.error(f"Error sending welcome email: {e}")
+        logger.error(f"Error queueing welcome email: {e}")
         return False
 
 def send_daily_summary_email(user):
     """
-    Send a daily summary email of triggered alerts and tracked products.
+    Queue a daily summary email of pending activity and tracked products.
+    For sending to all opted-in users use digest_utils.send_daily_summaries,
+    which does the same in bulk.
     """
     try:
         profile = user.userprofile
@@ -102,48 +51,12 @@ def send_daily_summary_email(user):
     except UserProfile.DoesNotExist:
         return False
     
-    # Get today's triggered alerts
-    today = timezone.now().date()
-    triggered_today = PriceAlert.objects.filter(
-        tracked_product__user=user,
-        is_triggered=True,
-        triggered_at__date=today
-    ).select_related('tracked_product__product')
-    
-    # Get active tracked products
-    tracked_products = TrackedProduct.objects.filter(
-        user=user,
-        is_active=True
-    ).select_related('product')
-    
-    if not triggered_today.exists() and not tracked_products.exists():
-        return False
-    
-    subject = f'📊 Daily Deal Radar Summary - {today.strftime("%B %d, %Y")}'
-    
-    context = {
-        'user': user,
-        'triggered_alerts': triggered_today,
-        'tracked_products': tracked_products,
-        'date': today,
-        'site_name': 'Deal Radar',
-        'site_url': settings.SITE_DOMAIN,
-    }
-    
-    html_message = render_to_string('emails/daily_summary.html', context)
-    plain_message = strip_tags(html_message)
-    
     try:
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
-        logger.info(f"Daily summary email sent to {user.email}")
-        return True
+        with transaction.atomic():
+            queued = queue_summaries([user], 'daily', timezone.localdate())
     except Exception as e:
-        logger.error(f"Error sending daily summary: {e}")
-        return False
\ No newline at end of file
+        logger.error(f"Error queueing daily summary: {e}")
+        return False
+    if queued:
+        logger.info(f"Daily summary email queued for {user.email}")
+    return bool(queued)
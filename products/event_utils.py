@@ -0,0 +1,99 @@
+"""
+Price change events for Deal Radar.
+Every change to a product's current price writes a PriceChangeEvent in the
+same transaction (a transactional outbox). After commit a consumer task is
+queued; it evaluates alerts for just the products that changed and marks
+their events processed. A periodic sweep of unprocessed events covers
+queueing failures, and the full check_price_alerts scan is a safety net.
+"""
+
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Product, PriceChangeEvent, ProductPriceStats
+from .alert_utils import evaluate_changed_product_alerts
+from .digest_utils import add_price_drop_digest_items
+from .dashboard_utils import bump_product_generations
+import logging
+
+logger = logging.getLogger(__name__)
+
+EVENT_BATCH_SIZE = 500
+PROCESSED_EVENT_RETENTION = timedelta(days=7)
+
+def _enqueue_processing(product_id):
+    # Runs after commit. If the broker is unreachable the event stays pending
+    # and is picked up by the next sweep instead of failing the price update.
+    from .tasks import process_price_change_events
+    try:
+        if not settings.CELERY_BROKER_URL:
+            # No broker (local development): process the event right away.
+            process_price_change_events(product_id)
+            return
+        process_price_change_events.apply_async(args=[product_id], retry=False)
+    except Exception as e:
+        logger.warning(f"Could not queue price change processing for product {product_id}: {e}")
+
+def record_price_change(product, old_price, new_price, source='manual'):
+    """
+    Write a price change event for product. Must be called inside the
+    transaction that saves the new price; processing is queued on commit.
+    """
+    event = PriceChangeEvent.objects.create(
+        product=product, old_price=old_price, new_price=new_price, source=source,
+    )
+    transaction.on_commit(lambda: _enqueue_processing(product.pk))
+    # Tracking users' dashboards show the current price.
+    bump_product_generations([product.pk])
+    return event
+
+def process_price_change_events(product_id=None, batch_size=EVENT_BATCH_SIZE):
+    """
+    Evaluate alerts for products with unprocessed price change events (one
+    batch evaluation per batch of events, covering every alert rule), add
+    notable drops to pending daily/weekly digests, then mark the events
+    processed. Several events for one product collapse into one evaluation
+    against its current price (and one drop from first to last price).
+    Each batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED and handled
+    in the claiming transaction, so overlapping consumers never process the
+    same event (digest items are not idempotent), and a consumer that dies
+    mid-batch leaves its events pending.
+    Returns the number of alerts triggered.
+    """
+    pending = PriceChangeEvent.objects.filter(processed_at__isnull=True)
+    if product_id is not None:
+        pending = pending.filter(product_id=product_id)
+    triggered = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                pending.select_for_update(skip_locked=True).order_by('id')
+                .values_list('pk', 'product_id', 'old_price', 'new_price')[:batch_size]
+            )
+            if not events:
+                break
+            changes = {}
+            for _, pid, old_price, new_price in events:
+                changes[pid] = (changes[pid][0] if pid in changes else old_price, new_price)
+            products = {
+                pid: (price, reference, ProductPriceStats.reference_low(prior_low, low, changed_at, computed_at))
+                for pid, price, reference, prior_low, low, changed_at, computed_at
+                in Product.objects.filter(pk__in=changes).values_list(
+                    'pk', 'current_price', 'price_stats__avg_30d', 'price_stats__prior_low',
+                    'price_stats__all_time_low', 'history_changed_at', 'price_stats__computed_at',
+                )
+                if price is not None
+            }
+            triggered += len(evaluate_changed_product_alerts(products))
+            add_price_drop_digest_items(changes)
+            PriceChangeEvent.objects.filter(pk__in=[event[0] for event in events]).update(processed_at=timezone.now())
+        if len(events) < batch_size:
+            break
+    return triggered
+
+def purge_processed_events():
+    """Delete processed events older than PROCESSED_EVENT_RETENTION."""
+    cutoff = timezone.now() - PROCESSED_EVENT_RETENTION
+    deleted, _ = PriceChangeEvent.objects.filter(processed_at__lt=cutoff).delete()
+    return deleted
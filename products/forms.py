@@ -63,6 +63,7 @@ class UserProfileForm(forms.ModelForm):
             'whatsapp_notifications',
             'whatsapp_number',
             'notification_frequency',
+            'alert_coalesce_minutes',
         ]
         widgets = {
             'whatsapp_number': forms.TextInput(attrs={'placeholder': 'e.g. +447525121082'}),
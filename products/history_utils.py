@@ -0,0 +1,356 @@
+"""
+Price history utilities for Deal Radar.
+Handles writing product price updates together with their history rows and
+price change events, incremental hourly/daily rollups, downsampled price series for charts, and
+batched retention of raw history.
+"""
+
+from datetime import timedelta, timezone as dt_timezone
+import time
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import PriceHistory, PriceRollup, PriceSeriesBlock, JobCheckpoint, TrackedProduct
+from .event_utils import record_price_change
+from .series_utils import decode_block, encode_block, to_epoch, from_epoch
+import logging
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_CHECKPOINT = 'price_rollup'
+RETENTION_CHECKPOINT = 'price_history_retention'
+ROLLUP_GRANULARITIES = ('hour', 'day')
+# Rows newer than this are left for the next rollup run: a scrape transaction
+# that took a lower primary key may still be uncommitted, and the watermark
+# must not move past it.
+ROLLUP_SETTLE_SECONDS = 300
+
+# Ranges up to RAW_SERIES_MAX_SPAN read raw history, up to HOURLY_SERIES_MAX_SPAN
+# read hourly rollups, anything longer reads daily rollups.
+RAW_SERIES_MAX_SPAN = timedelta(days=2)
+HOURLY_SERIES_MAX_SPAN = timedelta(days=60)
+
+# Chart payload limits for the price history JSON endpoints.
+DEFAULT_CHART_POINTS = 200
+MAX_CHART_POINTS = 1000
+MAX_BATCH_PRODUCTS = 50
+
+def update_product_price(product, new_price, source='manual'):
+    """
+    Set a product's current price and record it in the price history.
+    History is only written when the price changes (or a heartbeat is due);
+    a change also emits a PriceChangeEvent that queues alert evaluation.
+    Returns the previous price.
+    """
+    old_price = product.current_price
+    now = timezone.now()
+    with transaction.atomic():
+        product.current_price = new_price
+        row = PriceHistory.record(product, new_price, source=source, timestamp=now)
+        if row is not None and not row.is_heartbeat:
+            product.history_changed_at = now
+        product.save()
+        if old_price != new_price:
+            record_price_change(product, old_price, new_price, source=source)
+    if old_price != new_price:
+        logger.info(f"Price changed for {product.name}: £{old_price} → £{new_price} ({source})")
+    return old_price
+
+def _bucket_start(timestamp, granularity):
+    # Truncates a timestamp to the start of its hourly or daily bucket (in UTC).
+    start = timestamp.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        start = start.replace(hour=0)
+    return start
+
+def _merge_point(agg, price, timestamp):
+    # Folds a single price point into an in-memory rollup aggregate.
+    if timestamp < agg['first_timestamp']:
+        agg['first_timestamp'] = timestamp
+        agg['open_price'] = price
+    if timestamp >= agg['last_timestamp']:
+        agg['last_timestamp'] = timestamp
+        agg['last_price'] = price
+    agg['min_price'] = min(agg['min_price'], price)
+    agg['max_price'] = max(agg['max_price'], price)
+    agg['price_sum'] += price
+    agg['point_count'] += 1
+
+def _save_rollups(buckets):
+    # Merges in-memory aggregates into existing PriceRollup rows (bulk update) or
+    # creates new ones (bulk create).
+    product_ids = {key[0] for key in buckets}
+    starts = [key[2] for key in buckets]
+    existing = {
+        (r.product_id, r.granularity, r.bucket_start): r
+        for r in PriceRollup.objects.filter(
+            product_id__in=product_ids,
+            bucket_start__gte=min(starts),
+            bucket_start__lte=max(starts),
+        )
+    }
+    to_create, to_update = [], []
+    for key, agg in buckets.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            product_id, granularity, bucket_start = key
+            to_create.append(PriceRollup(
+                product_id=product_id, granularity=granularity, bucket_start=bucket_start, **agg
+            ))
+            continue
+        if agg['first_timestamp'] < rollup.first_timestamp:
+            rollup.first_timestamp = agg['first_timestamp']
+            rollup.open_price = agg['open_price']
+        if agg['last_timestamp'] >= rollup.last_timestamp:
+            rollup.last_timestamp = agg['last_timestamp']
+            rollup.last_price = agg['last_price']
+        rollup.min_price = min(rollup.min_price, agg['min_price'])
+        rollup.max_price = max(rollup.max_price, agg['max_price'])
+        rollup.price_sum += agg['price_sum']
+        rollup.point_count += agg['point_count']
+        to_update.append(rollup)
+    PriceRollup.objects.bulk_create(to_create)
+    PriceRollup.objects.bulk_update(to_update, [
+        'open_price', 'min_price', 'max_price', 'last_price', 'price_sum',
+        'point_count', 'first_timestamp', 'last_timestamp',
+    ])
+
+def rollup_price_history(batch_size=5000):
+    """
+    Fold new PriceHistory rows into hourly and daily PriceRollup rows.
+    Only rows after the stored watermark are read, so each run costs
+    O(new rows). The watermark stops at the first row younger than
+    ROLLUP_SETTLE_SECONDS, so rows committed out of primary-key order by
+    concurrent scrapes are still folded. Returns the number of history rows
+    processed.
+    """
+    checkpoint, _ = JobCheckpoint.objects.get_or_create(name=ROLLUP_CHECKPOINT)
+    settled_before = timezone.now() - timedelta(seconds=ROLLUP_SETTLE_SECONDS)
+    processed = 0
+    while True:
+        rows = list(
+            PriceHistory.objects.filter(pk__gt=checkpoint.position)
+            .order_by('pk')
+            .values_list('pk', 'product_id', 'price', 'timestamp')[:batch_size]
+        )
+        unsettled = next((i for i, row in enumerate(rows) if row[3] >= settled_before), None)
+        if unsettled is not None:
+            rows = rows[:unsettled]
+        if not rows:
+            break
+        buckets = {}
+        for _, product_id, price, timestamp in rows:
+            for granularity in ROLLUP_GRANULARITIES:
+                key = (product_id, granularity, _bucket_start(timestamp, granularity))
+                agg = buckets.get(key)
+                if agg is None:
+                    buckets[key] = {
+                        'open_price': price, 'min_price': price, 'max_price': price,
+                        'last_price': price, 'price_sum': price, 'point_count': 1,
+                        'first_timestamp': timestamp, 'last_timestamp': timestamp,
+                    }
+                else:
+                    _merge_point(agg, price, timestamp)
+        with transaction.atomic():
+            _save_rollups(buckets)
+            checkpoint.position = rows[-1][0]
+            checkpoint.save(update_fields=['position', 'updated_at'])
+        processed += len(rows)
+        if unsettled is not None:
+            break
+    if processed:
+        logger.info(f"Rolled up {processed} price history rows (watermark {checkpoint.position})")
+    return processed
+
+def pick_granularity(start, end):
+    """Choose 'raw', 'hour' or 'day' for a requested time range."""
+    span = end - start
+    if span <= RAW_SERIES_MAX_SPAN:
+        return 'raw'
+    if span <= HOURLY_SERIES_MAX_SPAN:
+        return 'hour'
+    return 'day'
+
+def get_price_series_bulk(product_ids, start, end, granularity=None):
+    """
+    Return (granularity, {product_id: points}) for several products in one query.
+    Each point is a dict with timestamp, price (close), min_price and max_price.
+    The granularity is picked from the range length unless given explicitly.
+    """
+    granularity = granularity or pick_granularity(start, end)
+    series = {product_id: [] for product_id in product_ids}
+    if granularity == 'raw':
+        rows = (
+            PriceHistory.objects.filter(product_id__in=product_ids, timestamp__gte=start, timestamp__lte=end)
+            .order_by('product_id', 'timestamp')
+            .values_list('product_id', 'timestamp', 'price', 'price', 'price')
+        )
+    else:
+        rows = (
+            PriceRollup.objects.filter(
+                product_id__in=product_ids,
+                granularity=granularity,
+                bucket_start__gte=_bucket_start(start, granularity),
+                bucket_start__lte=end,
+            )
+            .order_by('product_id', 'bucket_start')
+            .values_list('product_id', 'bucket_start', 'last_price', 'min_price', 'max_price')
+        )
+    for product_id, ts, price, low, high in rows:
+        series[product_id].append({'timestamp': ts, 'price': price, 'min_price': low, 'max_price': high})
+    return granularity, series
+
+def get_price_series(product_id, start, end, granularity=None):
+    """Return (granularity, points) for a single product; see get_price_series_bulk."""
+    granularity, series = get_price_series_bulk([product_id], start, end, granularity)
+    return granularity, series[product_id]
+
+def lttb_indices(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Returns the indices of at most `threshold` points that preserve the visual
+    shape of the (x, y) series. Always keeps the first and last points.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = x.size
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    # threshold - 2 buckets between the fixed first and last points.
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    sizes = np.diff(edges)
+    mean_x = np.add.reduceat(x[:n - 1], edges[:-1]) / sizes
+    mean_y = np.add.reduceat(y[:n - 1], edges[:-1]) / sizes
+    # The "next bucket" average for the last bucket is the final point.
+    next_x = np.append(mean_x[1:], x[n - 1])
+    next_y = np.append(mean_y[1:], y[n - 1])
+
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - next_x[i]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (next_y[i] - y[a])
+        )
+        a = lo + int(area.argmax())
+        indices[i + 1] = a
+    return indices
+
+def downsample_points(points, max_points):
+    """Downsample series points (as returned by get_price_series) to at most max_points."""
+    if len(points) <= max_points:
+        return points
+    x = [p['timestamp'].timestamp() for p in points]
+    y = [float(p['price']) for p in points]
+    return [points[i] for i in lttb_indices(x, y, max_points)]
+
+def build_series_payload(product_id, granularity, points, max_points):
+    """Compact JSON-ready series: [[epoch_ms, price], ...] downsampled to max_points."""
+    points = downsample_points(points, max_points)
+    return {
+        'product_id': product_id,
+        'granularity': granularity,
+        'points': [[int(p['timestamp'].timestamp() * 1000), float(p['price'])] for p in points],
+    }
+
+def _extended_retention_cutoffs(now):
+    # Maps product_id -> cutoff for products tracked by a user whose plan keeps
+    # raw history longer than PRICE_HISTORY_RAW_RETENTION_DAYS.
+    default_days = settings.PRICE_HISTORY_RAW_RETENTION_DAYS
+    retention = {}
+    rows = (
+        TrackedProduct.objects.filter(is_active=True)
+        .values_list('product_id', 'user__userprofile__subscription_plan')
+        .distinct()
+    )
+    for product_id, plan in rows:
+        days = settings.STRIPE_PLANS.get(plan, {}).get('history_retention_days') or default_days
+        if days > retention.get(product_id, default_days):
+            retention[product_id] = days
+    return {product_id: now - timedelta(days=days) for product_id, days in retention.items()}
+
+def purge_price_history(batch_size=None, pause=None, max_batches=None):
+    """
+    Delete raw PriceHistory rows past their retention window in small batches.
+    Rollups are brought up to date first. Rows are scanned in primary-key order
+    in chunks of batch_size with a pause between chunks, and the position is
+    stored in a JobCheckpoint so an interrupted run resumes where it stopped.
+    Products tracked on plans with a longer history_retention_days keep their
+    rows for longer; compressed blocks are trimmed to the same cutoffs.
+    Returns the number of price points deleted.
+    """
+    batch_size = batch_size or settings.PRICE_HISTORY_PURGE_BATCH_SIZE
+    pause = settings.PRICE_HISTORY_PURGE_PAUSE_SECONDS if pause is None else pause
+    rollup_price_history()
+
+    now = timezone.now()
+    default_cutoff = now - timedelta(days=settings.PRICE_HISTORY_RAW_RETENTION_DAYS)
+    extended_cutoffs = _extended_retention_cutoffs(now)
+    checkpoint, _ = JobCheckpoint.objects.get_or_create(name=RETENTION_CHECKPOINT)
+
+    deleted = batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = list(
+            PriceHistory.objects.filter(pk__gt=checkpoint.position)
+            .order_by('pk')
+            .values_list('pk', 'product_id', 'timestamp')[:batch_size]
+        )
+        expired = [
+            pk for pk, product_id, timestamp in rows
+            if timestamp < extended_cutoffs.get(product_id, default_cutoff)
+        ]
+        if rows and expired:
+            # PriceHistory has no dependants or delete signals, so this is a single
+            # DELETE bounded to the chunk's primary-key range.
+            deleted += PriceHistory.objects.filter(
+                pk__gte=rows[0][0], pk__lte=rows[-1][0], pk__in=expired
+            ).delete()[0]
+        if not rows or all(timestamp >= default_cutoff for _, _, timestamp in rows):
+            # Reached current data: the next run starts again from the oldest row.
+            checkpoint.position = 0
+            checkpoint.save(update_fields=['position', 'updated_at'])
+            break
+        checkpoint.position = rows[-1][0]
+        checkpoint.save(update_fields=['position', 'updated_at'])
+        batches += 1
+        if pause:
+            time.sleep(pause)
+    deleted += _purge_series_blocks(default_cutoff, extended_cutoffs, batch_size)
+    logger.info(f"Purged {deleted} price history rows in {batches} batches")
+    return deleted
+
+def _purge_series_blocks(default_cutoff, extended_cutoffs, batch_size):
+    # Applies the same per-product cutoff as for raw rows to compressed blocks:
+    # blocks entirely past it are deleted, blocks straddling it are re-encoded
+    # without their expired points. Returns the number of price points removed.
+    blocks = PriceSeriesBlock.objects.filter(start_time__lt=default_cutoff).values_list(
+        'pk', 'product_id', 'start_time', 'end_time', 'point_count'
+    )
+    expired, straddling = [], {}
+    for pk, product_id, start_time, end_time, point_count in blocks:
+        cutoff = extended_cutoffs.get(product_id, default_cutoff)
+        if end_time < cutoff:
+            expired.append((pk, point_count))
+        elif start_time < cutoff:
+            straddling[pk] = cutoff
+    for i in range(0, len(expired), batch_size):
+        PriceSeriesBlock.objects.filter(pk__in=[pk for pk, _ in expired[i:i + batch_size]]).delete()
+    removed = sum(point_count for _, point_count in expired)
+
+    pks = list(straddling)
+    for i in range(0, len(pks), batch_size):
+        trimmed = []
+        for block in PriceSeriesBlock.objects.filter(pk__in=pks[i:i + batch_size]):
+            timestamps, prices = decode_block(block.data)
+            keep = timestamps >= to_epoch(straddling[block.pk])
+            removed += int(block.point_count - keep.sum())
+            timestamps, prices = timestamps[keep], prices[keep]
+            block.start_time = from_epoch(timestamps[0])
+            block.point_count = timestamps.size
+            block.data = encode_block(timestamps, prices)
+            trimmed.append(block)
+        PriceSeriesBlock.objects.bulk_update(trimmed, ['start_time', 'point_count', 'data'])
+    return removed
@@ -0,0 +1,143 @@
+"""
+Product listing utilities for Deal Radar.
+The home and category listings are paginated by keyset on (created_at, id),
+newest first: each page is one indexed range scan that starts after the
+last product of the previous page, so page cost stays flat however large
+the catalogue grows (OFFSET pagination gets slower with every page).
+Search results are ordered by relevance instead, and paged by position in
+the ranked id list returned by search_utils.
+Totals come from CategoryCount rows maintained by the Product signals below
+and cached, instead of COUNT(*) over the catalogue.
+"""
+
+import base64
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.dateparse import parse_datetime
+from .models import Product, CategoryCount
+PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+CATEGORY_COUNTS_CACHE_KEY = 'category_counts'
+CATEGORY_COUNTS_CACHE_TIMEOUT = 10 * 60
+
+def encode_cursor(product):
+    """Opaque cursor pointing just after product in the listing order."""
+    raw = f'{product.created_at.isoformat()}|{product.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Return (created_at, id) from a cursor; raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.rsplit('|', 1)
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor.') from e
+    if created_at is None:
+        raise ValueError('Invalid cursor.')
+    return created_at, pk
+
+def paginate_products(queryset, cursor=None, page_size=PAGE_SIZE):
+    """
+    One page of queryset, newest first, starting after cursor (None for the
+    first page). Returns (products, next_cursor); next_cursor is None on
+    the last page. Raises ValueError for a malformed cursor.
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    # Fetching one extra row tells whether another page follows, without a COUNT.
+    products = list(queryset[:page_size + 1])
+    if len(products) > page_size:
+        products = products[:page_size]
+        return products, encode_cursor(products[-1])
+    return products, None
+
+def encode_offset_cursor(offset):
+    """Opaque cursor for a position in a ranked result list."""
+    return base64.urlsafe_b64encode(f'@{offset}'.encode()).decode().rstrip('=')
+
+def decode_offset_cursor(cursor):
+    """Return the offset from an offset cursor; raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor.') from e
+    if not raw.startswith('@') or not raw[1:].isdigit():
+        raise ValueError('Invalid cursor.')
+    return int(raw[1:])
+
+def paginate_ranked(queryset, ranked_ids, cursor=None, page_size=PAGE_SIZE):
+    """
+    One page of ranked_ids (e.g. search results, most relevant first) loaded
+    from queryset, in rank order. Returns (products, next_cursor) like
+    paginate_products.
+    """
+    offset = decode_offset_cursor(cursor) if cursor else 0
+    page_ids = ranked_ids[offset:offset + page_size]
+    by_id = queryset.in_bulk(page_ids)
+    products = [by_id[pk] for pk in page_ids if pk in by_id]
+    if offset + page_size < len(ranked_ids):
+        return products, encode_offset_cursor(offset + page_size)
+    return products, None
+
+def get_category_counts():
+    """{category: product count} from the maintained counters, cached."""
+    counts = cache.get(CATEGORY_COUNTS_CACHE_KEY)
+    if counts is None:
+        counts = dict(CategoryCount.objects.filter(count__gt=0).values_list('category', 'count'))
+        cache.set(CATEGORY_COUNTS_CACHE_KEY, counts, CATEGORY_COUNTS_CACHE_TIMEOUT)
+    return counts
+
+def product_total(category=None):
+    """Number of products overall or in one category, without COUNT(*)."""
+    counts = get_category_counts()
+    if category is None:
+        return sum(counts.values())
+    return counts.get(category, 0)
+
+def _invalidate_counts():
+    cache.delete(CATEGORY_COUNTS_CACHE_KEY)
+
+def adjust_category_count(category, delta):
+    """Add delta to a category's counter (creating it if needed) with an atomic UPDATE."""
+    with transaction.atomic():
+        if not CategoryCount.objects.filter(category=category).update(count=F('count') + delta):
+            try:
+                with transaction.atomic():
+                    CategoryCount.objects.create(category=category, count=delta)
+            except IntegrityError:
+                # Created concurrently; apply the delta to that row instead.
+                CategoryCount.objects.filter(category=category).update(count=F('count') + delta)
+        transaction.on_commit(_invalidate_counts)
+
+def rebuild_category_counts():
+    """
+    Recount every category from the products table. The signals keep the
+    counters exact for ORM saves and deletes; this repairs drift from bulk
+    operations that bypass them.
+    """
+    counts = dict(Product.objects.values_list('category').annotate(n=Count('id')).values_list('category', 'n'))
+    with transaction.atomic():
+        CategoryCount.objects.exclude(category__in=list(counts)).delete()
+        for category, count in counts.items():
+            CategoryCount.objects.update_or_create(category=category, defaults={'count': count})
+        transaction.on_commit(_invalidate_counts)
+    return counts
+
+@receiver(post_save, sender=Product)
+def count_product_on_save(sender, instance, created, **kwargs):
+    if created:
+        adjust_category_count(instance.category, 1)
+    elif instance.changed_fields(['category']):
+        adjust_category_count(instance._loaded_fields['category'], -1)
+        adjust_category_count(instance.category, 1)
+
+@receiver(post_delete, sender=Product)
+def count_product_on_delete(sender, instance, **kwargs):
+    adjust_category_count(instance.category, -1)
@@ -0,0 +1,82 @@
+"""
+Management command to benchmark the in-memory price alert index.
+
+Builds an index of synthetic alerts (no database access), then measures
+build time, memory held by the threshold arrays, and the latency of
+price-change lookups and of single-alert updates.
+
+Usage:
+    python manage.py benchmark_alert_index
+    python manage.py benchmark_alert_index --alerts 1000000 --products 50000
+"""
+
+from django.core.management.base import BaseCommand
+from products.alert_index import AlertIndex
+import random
+import time
+
+class Command(BaseCommand):
+    help = 'Benchmark the in-memory price alert index with synthetic alerts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alerts', type=int, default=1000000, help='Number of synthetic alerts')
+        parser.add_argument('--products', type=int, default=50000, help='Number of distinct products')
+        parser.add_argument('--lookups', type=int, default=100000, help='Number of price-change lookups to time')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        n_alerts = options['alerts']
+        n_products = options['products']
+
+        # Products get a base price between £5 and £1000; targets sit 0-40% below it.
+        base_prices = [rng.randint(500, 100000) for _ in range(n_products)]
+        rows = []
+        for alert_id in range(1, n_alerts + 1):
+            product_id = rng.randrange(n_products)
+            rows.append((alert_id, product_id, int(base_prices[product_id] * rng.uniform(0.6, 1.0))))
+        rows.sort(key=lambda row: (row[1], row[2]))
+
+        index = AlertIndex()
+        started = time.perf_counter()
+        index.load(rows)
+        build_seconds = time.perf_counter() - started
+        del rows
+        self.stdout.write(
+            f'🏗️ Built index of {len(index)} alerts over {n_products} products in {build_seconds:.2f}s '
+            f'({index.memory_usage() / 1024 / 1024:.1f} MiB of threshold arrays)'
+        )
+
+        # Price-change lookups: a drop of up to 30% on a random product.
+        timings = []
+        crossed_total = 0
+        for _ in range(options['lookups']):
+            product_id = rng.randrange(n_products)
+            price = base_prices[product_id] * rng.uniform(0.7, 1.0) / 100
+            started = time.perf_counter()
+            crossed_total += len(index.crossed(product_id, price))
+            timings.append(time.perf_counter() - started)
+        self._report('Lookup', timings)
+        self.stdout.write(f'   {crossed_total / max(len(timings), 1):.1f} alerts crossed per lookup on average')
+
+        # Single-alert updates as done by the create/toggle/delete signals.
+        timings = []
+        for alert_id in range(n_alerts + 1, n_alerts + 1 + min(options['lookups'], 100000)):
+            product_id = rng.randrange(n_products)
+            target = base_prices[product_id] * rng.uniform(0.6, 1.0) / 100
+            started = time.perf_counter()
+            index.upsert(alert_id, product_id, target, True)
+            index.discard([alert_id], product_id)
+            timings.append(time.perf_counter() - started)
+        self._report('Insert+delete', timings)
+
+    def _report(self, label, timings):
+        timings.sort()
+        count = len(timings)
+        if not count:
+            return
+        p50 = timings[count // 2] * 1e6
+        p99 = timings[min(count - 1, int(count * 0.99))] * 1e6
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {label}: {count} ops, p50 {p50:.1f}µs, p99 {p99:.1f}µs, max {timings[-1] * 1e6:.1f}µs'
+        ))
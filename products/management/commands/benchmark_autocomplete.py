@@ -0,0 +1,97 @@
+"""
+Management command to benchmark the in-memory autocomplete index.
+
+Builds indexes of synthetic product names (no database access) at each
+requested size, then measures build time, memory held by the postings and
+entries, and the latency of suggestion lookups for partial queries (the
+last word cut short, as while typing), a share of them with a typo.
+
+Usage:
+    python manage.py benchmark_autocomplete
+    python manage.py benchmark_autocomplete --sizes 100000 1000000 --queries 20000
+"""
+
+from django.core.management.base import BaseCommand
+from products.autocomplete_index import AutocompleteIndex, BUILD_HEADROOM
+import math
+import random
+import time
+
+BRANDS = [
+    'Samsung', 'Apple', 'Sony', 'LG', 'Dyson', 'Nike', 'Adidas', 'Bosch', 'Philips', 'Lenovo',
+    'Dell', 'HP', 'Asus', 'Acer', 'Panasonic', 'Canon', 'Nikon', 'Garmin', 'Fitbit', 'Logitech',
+    'Razer', 'Corsair', 'Tefal', 'Breville', 'Ninja', 'Shark', 'Hoover', 'Braun', 'Oral-B', 'Lego',
+    'Puma', 'Reebok', 'Kenwood', 'Russell Hobbs', 'Morphy Richards', 'JBL', 'Bose', 'Sennheiser',
+]
+PRODUCTS = [
+    'Smartphone', 'Laptop', 'Headphones', 'Earbuds', 'Television', 'Monitor', 'Keyboard', 'Mouse',
+    'Vacuum Cleaner', 'Air Fryer', 'Kettle', 'Toaster', 'Blender', 'Coffee Machine', 'Running Shoes',
+    'Trainers', 'Hoodie', 'Smartwatch', 'Camera', 'Lens', 'Speaker', 'Soundbar', 'Tablet', 'Router',
+    'Electric Toothbrush', 'Hair Dryer', 'Drill', 'Microwave', 'Dishwasher', 'Washing Machine',
+]
+ADJECTIVES = ['Pro', 'Max', 'Ultra', 'Mini', 'Plus', 'Lite', 'Wireless', 'Portable', 'Smart', 'Compact']
+SITES = ['Amazon UK', 'eBay UK', 'Argos', 'Currys', 'John Lewis', 'Nike UK', 'Costco UK', 'Next UK']
+
+class Command(BaseCommand):
+    help = 'Benchmark the in-memory autocomplete index with synthetic product names'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000], help='Index sizes (product names)')
+        parser.add_argument('--queries', type=int, default=20000, help='Number of lookups to time per size')
+        parser.add_argument('--typo-share', type=float, default=0.2, help='Share of queries with a typo')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed')
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            rng = random.Random(options['seed'])
+            names = [self._name(rng) for _ in range(size)]
+
+            # Large enough that the build's headroom doesn't truncate it.
+            index = AutocompleteIndex(max_entries=math.ceil((size + len(SITES)) / (1 - BUILD_HEADROOM)) + 1)
+            started = time.perf_counter()
+            index.load(SITES, enumerate(names, start=1))
+            build_seconds = time.perf_counter() - started
+            self.stdout.write(
+                f'🏗️ Built index of {len(index)} entries in {build_seconds:.2f}s '
+                f'({index.memory_usage() / 1024 / 1024:.1f} MiB of postings and entries)'
+            )
+
+            timings = []
+            found = 0
+            for _ in range(options['queries']):
+                query = self._query(rng, rng.choice(names), options['typo_share'])
+                started = time.perf_counter()
+                found += bool(index.suggest(query))
+                timings.append(time.perf_counter() - started)
+            self._report(f'Suggest @ {size}', timings)
+            self.stdout.write(f'   {found / max(len(timings), 1):.1%} of queries returned suggestions')
+
+    def _name(self, rng):
+        words = [rng.choice(BRANDS), rng.choice(PRODUCTS)]
+        if rng.random() < 0.6:
+            words.insert(1, rng.choice(ADJECTIVES))
+        words.append(f'{rng.choice("ABCDEFGHKMSXZ")}{rng.randint(1, 9999)}')
+        return ' '.join(words)
+
+    def _query(self, rng, name, typo_share):
+        # The first one to three words of a name, the last cut short as while typing.
+        words = name.split()[:rng.randint(1, 3)]
+        last = words[-1]
+        words[-1] = last[:rng.randint(1, len(last))]
+        query = ' '.join(words)
+        if rng.random() < typo_share and len(query) > 3:
+            # Swap two neighbouring characters.
+            i = rng.randrange(len(query) - 1)
+            query = query[:i] + query[i + 1] + query[i] + query[i + 2:]
+        return query
+
+    def _report(self, label, timings):
+        timings.sort()
+        count = len(timings)
+        if not count:
+            return
+        p50 = timings[count // 2] * 1e6
+        p99 = timings[min(count - 1, int(count * 0.99))] * 1e6
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {label}: {count} ops, p50 {p50:.1f}µs, p99 {p99:.1f}µs, max {timings[-1] * 1e6:.1f}µs'
+        ))
@@ -0,0 +1,89 @@
+"""
+Management command to benchmark the pooled WhatsApp sender against a local
+stand-in for the Twilio Messages API (no real messages are sent).
+
+The stand-in answers POST .../Messages.json after a fixed latency and returns
+429 with Retry-After for a share of requests, so connection reuse, the rate
+limit and back-pressure handling can be observed together.
+
+Usage:
+    python manage.py benchmark_whatsapp_sender
+    python manage.py benchmark_whatsapp_sender --messages 5000 --rate 200 --throttle 0.05
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from products.whatsapp_utils import WhatsAppSender
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+def make_handler(latency, throttle):
+    class StandInHandler(BaseHTTPRequestHandler):
+        # Keep-alive lets the sender's connection pool be reused.
+        protocol_version = 'HTTP/1.1'
+        connections = set()
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            StandInHandler.connections.add(self.client_address)
+            time.sleep(latency)
+            if random.random() < throttle:
+                status, headers = 429, {'Retry-After': '0.2'}
+                body = {'code': 20429, 'message': 'Too Many Requests', 'status': 429}
+            else:
+                status, headers = 201, {}
+                body = {'sid': f'SM{uuid.uuid4().hex}', 'status': 'queued'}
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return StandInHandler
+
+class Command(BaseCommand):
+    help = 'Benchmark the pooled WhatsApp sender against a local Twilio stand-in server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000, help='Number of messages to send')
+        parser.add_argument('--rate', type=float, default=500, help='Max messages per second')
+        parser.add_argument('--concurrency', type=int, default=32, help='Concurrent sends')
+        parser.add_argument('--latency', type=float, default=0.05, help='Stand-in response latency (seconds)')
+        parser.add_argument('--throttle', type=float, default=0.02, help='Share of requests answered with 429')
+
+    def handle(self, *args, **options):
+        handler = make_handler(options['latency'], options['throttle'])
+        server = StandInServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_address[1]}'
+
+        try:
+            sender = WhatsAppSender(rate=options['rate'], concurrency=options['concurrency'], base_url=base_url)
+            messages = [(f'+4470000{i:05d}', f'Benchmark message {i}') for i in range(options['messages'])]
+            started = time.perf_counter()
+            results = sender.send_many(messages)
+            elapsed = time.perf_counter() - started
+        finally:
+            server.shutdown()
+
+        sent = sum(1 for r in results if r.ok)
+        retried = sum(1 for r in results if r.attempts > 1)
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {sent}/{len(results)} sent in {elapsed:.2f}s ({len(results) / elapsed:.0f} msg/s), '
+            f'{retried} retried after 429, {len(handler.connections)} connections used'
+        ))
+        for result in [r for r in results if not r.ok][:5]:
+            self.stdout.write(self.style.WARNING(f'⚠️ {result.to}: {result.status} {result.error}'))
@@ -1,9 +1,14 @@
 """
 Management command to check all active price alerts and send notifications if triggered.
 
-This command scans all enabled, non-triggered PriceAlert objects. If the current price
-of a tracked product is at or below the user's target price, it triggers the alert
-and sends an email notification.
+This command evaluates alerts set-based: one query finds every enabled, non-triggered
+PriceAlert whose product's current price is at or below its threshold (target price,
+percentage below the 30-day average, or all-time low), and one
+conditional UPDATE marks them triggered. Notifications are queued only for the alerts
+that actually changed state.
+
+Price changes are normally evaluated within seconds by the price change event
+consumer (see products/event_utils.py); this full scan is the safety net.
 
 Usage:
     python manage.py check_price_alerts
@@ -11,7 +16,7 @@ Usage:
 
 from django.core.management.base import BaseCommand
 from products.models import PriceAlert
-from django.utils import timezone
+from products.alert_utils import evaluate_price_alerts
 
 class Command(BaseCommand):
     help = 'Check price alerts and send email notifications'
@@ -19,35 +24,20 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         self.stdout.write('🔍 Checking price alerts...')
 
-        # Get all enabled, non-triggered alerts
-        active_alerts = PriceAlert.objects.filter(
-            is_enabled=True,
-            is_triggered=False
-        ).select_related('tracked_product__product', 'tracked_product__user')
-
-        triggered_count = 0
-        checked_count = 0
+        # Find, trigger and notify in one set-based pass
+        triggered_ids = evaluate_price_alerts()
+        triggered_count = len(triggered_ids)
 
-        # Check each alert for price drop condition
-        for alert in active_alerts:
-            checked_count += 1
+        # Report each triggered alert
+        triggered_alerts = PriceAlert.objects.filter(pk__in=triggered_ids).select_related('tracked_product__product')
+        for alert in triggered_alerts:
             product = alert.tracked_product.product
-            current_price = product.current_price
-            target_price = alert.target_price
-
-            # Trigger alert if current price is at or below target price
-            if current_price <= target_price:
-                # Calls alert.trigger_alert(), which sends notification and marks as triggered
-                if alert.trigger_alert(current_price):
-                    triggered_count += 1
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f'✅ Alert triggered: {product.name} '
-                            f'(£{current_price} <= £{target_price})'
-                        )
-                    )
-
-        self.stdout.write(f'📊 Checked {checked_count} alerts')
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'✅ Alert triggered: {product.name} '
+                    f'(£{product.current_price}, alert: {alert.condition})'
+                )
+            )
 
         if triggered_count > 0:
             self.stdout.write(
@@ -58,4 +48,4 @@ class Command(BaseCommand):
                 self.style.WARNING('⚠️ No price alerts triggered.')
             )
 
-        self.stdout.write('✅ Price alert check completed.')
\ No newline at end of file
+        self.stdout.write('✅ Price alert check completed.')
@@ -0,0 +1,26 @@
+"""
+Management command to deliver queued notifications (email and WhatsApp).
+
+Notifications are queued as NotificationJob rows and normally delivered by the
+Celery workers on the notifications_<channel> queues. This command runs the
+same per-channel delivery loop, e.g. from a scheduler or when no worker runs.
+
+Usage:
+    python manage.py deliver_notifications
+    python manage.py deliver_notifications --channel whatsapp
+"""
+
+from django.core.management.base import BaseCommand
+from products.notification_utils import CHANNELS, deliver_notifications
+
+class Command(BaseCommand):
+    help = 'Deliver queued email and WhatsApp notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--channel', choices=CHANNELS, help='Only deliver this channel')
+
+    def handle(self, *args, **options):
+        channels = [options['channel']] if options['channel'] else CHANNELS
+        for channel in channels:
+            sent, failed = deliver_notifications(channel)
+            self.stdout.write(self.style.SUCCESS(f'📨 {channel}: {sent} sent, {failed} failed'))
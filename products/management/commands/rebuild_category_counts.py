@@ -0,0 +1,23 @@
+"""
+Management command to recount products per category.
+
+The CategoryCount rows behind the listing totals are maintained by Product
+signals; this recomputes them from the products table, e.g. after bulk
+imports or raw SQL that bypassed the signals.
+
+Usage:
+    python manage.py rebuild_category_counts
+"""
+
+from django.core.management.base import BaseCommand
+from products.listing_utils import rebuild_category_counts
+
+
+class Command(BaseCommand):
+    help = 'Recount products per category for the listing totals'
+
+    def handle(self, *args, **options):
+        counts = rebuild_category_counts()
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt counts for {len(counts)} categories ({sum(counts.values())} products).')
+        )
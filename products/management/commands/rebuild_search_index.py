@@ -0,0 +1,21 @@
+"""
+Management command to rebuild the full-text product search index.
+
+The index is kept current by Product signals; this reindexes every product
+from the products table, e.g. after bulk imports or raw SQL that bypassed
+the signals.
+
+Usage:
+    python manage.py rebuild_search_index
+"""
+
+from django.core.management.base import BaseCommand
+from products.search_utils import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text product search index'
+
+    def handle(self, *args, **options):
+        rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS('Rebuilt the product search index.'))
@@ -3,51 +3,60 @@ Management command to send daily summary emails to users.
 
 This command finds all users who have opted in for daily email notifications
 and sends them a summary of their tracked products and recent price changes.
+Users are processed in chunks: each chunk's data is loaded in bulk, rendered
+and queued in the notification outbox, then the queued
+emails are delivered in batches over reused SMTP sessions.
+
+Summaries are built from each user's pending digest items (alerts and price
+drops recorded as they happened) plus their tracked products, and the items
+are cleared once queued. Progress is checkpointed per chunk, so re-running
+after an interruption continues with the users not yet done today.
 
 Usage:
     python manage.py send_daily_summaries
+    python manage.py send_daily_summaries --chunk-size 1000
+    python manage.py send_daily_summaries --restart
 """
 
 from django.core.management.base import BaseCommand
-from django.contrib.auth.models import User
-from products.email_utils import send_daily_summary_email
+from products.digest_utils import send_daily_summaries, SUMMARY_CHUNK_SIZE
+from products.notification_utils import deliver_notifications
 
 class Command(BaseCommand):
     help = 'Send daily summary emails to users'
+    frequency = 'daily'
+    send_summaries = staticmethod(send_daily_summaries)
 
-    def handle(self, *args, **options):
-        self.stdout.write('📧 Sending daily summary emails...')
-
-        # Get users who want daily summaries (based on profile settings)
-        users_daily = User.objects.filter(
-            userprofile__email_notifications=True,
-            userprofile__notification_frequency='daily'
-        )
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=SUMMARY_CHUNK_SIZE, help='Users per chunk')
+        parser.add_argument('--restart', action='store_true', help="Ignore this period's checkpoint and start over")
+        parser.add_argument('--no-deliver', action='store_true', help='Only queue; leave delivery to the email workers')
 
-        sent_count = 0
-        total_users = users_daily.count()
+    def handle(self, *args, **options):
+        self.stdout.write(f'📧 Sending {self.frequency} summary emails...')
 
-        # Send summary email to each user
-        for user in users_daily:
-            if send_daily_summary_email(user):
-                sent_count += 1
-                self.stdout.write(
-                    self.style.SUCCESS(f'✅ Daily summary sent to {user.email}')
-                )
-            else:
-                self.stdout.write(
-                    self.style.WARNING(f'⚠️ No data to send for {user.email}')
-                )
+        def progress(done, total, queued):
+            self.stdout.write(f'⏳ {done}/{total} users processed, {queued} summaries queued')
 
-        self.stdout.write(f'📊 Processed {total_users} users')
+        processed, queued = self.send_summaries(
+            chunk_size=options['chunk_size'],
+            restart=options['restart'],
+            progress=progress,
+        )
+        self.stdout.write(f'📊 Processed {processed} users')
 
-        if sent_count > 0:
+        if queued > 0:
             self.stdout.write(
-                self.style.SUCCESS(f'📧 {sent_count} daily summaries sent successfully!')
+                self.style.SUCCESS(f'📧 {queued} {self.frequency} summaries queued successfully!')
             )
         else:
             self.stdout.write(
-                self.style.WARNING('⚠️ No daily summaries sent (no data or all disabled).')
+                self.style.WARNING(f'⚠️ No {self.frequency} summaries queued (no data, all disabled, or already done).')
             )
 
-        self.stdout.write('✅ Daily summary emails completed.')
\ No newline at end of file
+        if not options['no_deliver']:
+            # Deliver everything queued on the email channel (summaries included)
+            delivered, failed = deliver_notifications('email')
+            self.stdout.write(f'📨 Delivered {delivered} emails, {failed} failed (failed ones are retried)')
+
+        self.stdout.write(f'✅ {self.frequency.capitalize()} summary emails completed.')
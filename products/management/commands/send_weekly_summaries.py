@@ -0,0 +1,19 @@
+"""
+Management command to send weekly summary emails to users.
+
+Works like send_daily_summaries for users whose notification frequency is
+'weekly': each summary flushes the alerts and price drops accumulated for the
+user since their last summary. Progress is checkpointed per ISO week.
+
+Usage:
+    python manage.py send_weekly_summaries
+    python manage.py send_weekly_summaries --chunk-size 1000
+"""
+
+from products.digest_utils import send_weekly_summaries
+from products.management.commands.send_daily_summaries import Command as DailySummariesCommand
+
+class Command(DailySummariesCommand):
+    help = 'Send weekly summary emails to users'
+    frequency = 'weekly'
+    send_summaries = staticmethod(send_weekly_summaries)
@@ -10,6 +10,7 @@ Usage:
 
 from django.core.management.base import BaseCommand
 from products.models import Product
+from products.history_utils import update_product_price
 import random
 from decimal import Decimal
 
@@ -43,11 +44,9 @@ class Command(BaseCommand):
                 # Round to 2 decimal places for currency
                 new_price = round(new_price, 2)
 
-                old_price = product.current_price
-                product.current_price = new_price
-                # Optionally update product.price as well if needed
-                # product.price = new_price
-                product.save()
+                # Saves the product, records the change in its price history and
+                # emits a price change event that queues alert evaluation
+                old_price = update_product_price(product, new_price, source='simulation')
 
                 updated_count += 1
 
@@ -69,7 +68,8 @@ class Command(BaseCommand):
 
         if updated_count > 0:
             self.stdout.write(
-                self.style.SUCCESS(f'💰 Price simulation completed! Run check_price_alerts next.')
+                self.style.SUCCESS(f'💰 Price simulation completed! Alerts are evaluated by the price change event worker '
+                                   f'(or run check_price_alerts).')
             )
         else:
             self.stdout.write(
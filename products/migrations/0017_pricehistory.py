@@ -0,0 +1,34 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:42
+
+# Migration to reinstate PriceHistory with change-only writes and a (product, timestamp) index.
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0016_remove_product_target_price_alter_product_category_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('source', models.CharField(default='manual', max_length=50)),
+                ('is_heartbeat', models.BooleanField(default=False)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Price History',
+                'verbose_name_plural': 'Price Histories',
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['product', 'timestamp'], name='pricehistory_product_ts_idx')],
+            },
+        ),
+    ]
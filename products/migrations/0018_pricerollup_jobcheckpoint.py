@@ -0,0 +1,46 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:43
+
+# Migration to add hourly/daily PriceRollup aggregates and JobCheckpoint watermarks for incremental jobs.
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0017_pricehistory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('position', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PriceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('open_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('max_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('last_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('price_sum', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('point_count', models.PositiveIntegerField(default=0)),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_rollups', to='products.product')),
+            ],
+            options={
+                'ordering': ['bucket_start'],
+                'unique_together': {('product', 'granularity', 'bucket_start')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:46
+
+# Migration to add PriceSeriesBlock for compressed, array-packed cold price history.
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0018_pricerollup_jobcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceSeriesBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('point_count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series_blocks', to='products.product')),
+            ],
+            options={
+                'ordering': ['start_time'],
+                'indexes': [models.Index(fields=['product', 'start_time'], name='seriesblock_product_start_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:47
+
+# Migration to add ProductPriceStats, the per-product materialized price analytics.
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0019_priceseriesblock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPriceStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='price_stats', serialize=False, to='products.product')),
+                ('low_30d', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('low_90d', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('avg_30d', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('avg_90d', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('all_time_low', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('pct_below_avg_30d', models.FloatField(blank=True, null=True)),
+                ('volatility_30d', models.FloatField(blank=True, null=True)),
+                ('deal_score', models.FloatField(default=0)),
+                ('point_count_90d', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Product Price Stats',
+                'verbose_name_plural': 'Product Price Stats',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:49
+
+# Migration to add DealRanking, the precomputed overall and per-category top deals index.
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0020_productpricestats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DealRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=255)),
+                ('rank', models.PositiveIntegerField()),
+                ('score', models.FloatField()),
+                ('is_all_time_low', models.BooleanField(default=False)),
+                ('tracker_count', models.PositiveIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deal_rankings', to='products.product')),
+            ],
+            options={
+                'ordering': ['category', 'rank'],
+                'unique_together': {('category', 'rank')},
+            },
+        ),
+    ]
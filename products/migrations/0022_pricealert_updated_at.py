@@ -0,0 +1,20 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:51
+
+# Migration to add PriceAlert.updated_at, used to sync in-memory alert indexes.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0021_dealranking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pricealert',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
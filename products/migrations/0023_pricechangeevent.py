@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:54
+
+# Migration to add PriceChangeEvent, the outbox of price changes consumed by alert evaluation.
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0022_pricealert_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceChangeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('new_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('source', models.CharField(default='manual', max_length=50)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_events', to='products.product')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
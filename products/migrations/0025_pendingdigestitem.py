@@ -0,0 +1,37 @@
+# Generated by Django 5.0.6 on 2026-10-19 18:04
+
+# Migration to add PendingDigestItem, the per-user store of activity for daily and weekly summaries.
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0024_notificationjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingDigestItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('alert', 'Alert triggered'), ('price_drop', 'Price drop')], max_length=20)),
+                ('target_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('old_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('new_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('alert', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='products.pricealert')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_digest_items', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['user', 'id'], name='digestitem_user_idx')],
+            },
+        ),
+    ]
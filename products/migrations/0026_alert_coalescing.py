@@ -0,0 +1,37 @@
+# Generated by Django 5.0.6 on 2026-10-19 18:08
+
+# Migration to add alert notification coalescing fields, and to store the 'instant'
+# frequency the settings page used to submit as the 'immediate' choice.
+
+from django.db import migrations, models
+
+
+def instant_to_immediate(apps, schema_editor):
+    UserProfile = apps.get_model('products', 'UserProfile')
+    UserProfile.objects.filter(notification_frequency='instant').update(notification_frequency='immediate')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0025_pendingdigestitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationjob',
+            name='coalesce_key',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='notificationjob',
+            name='payload',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='alert_coalesce_minutes',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(instant_to_immediate, migrations.RunPython.noop),
+    ]
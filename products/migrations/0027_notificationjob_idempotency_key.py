@@ -0,0 +1,20 @@
+# Generated by Django 5.0.6 on 2026-10-19 18:11
+
+# Migration to add NotificationJob.idempotency_key, which keeps the same event from being notified twice.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0026_alert_coalescing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationjob',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=150, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-19 18:14
+
+# Migration to add percentage-drop and all-time-low rules to PriceAlert (target_price becomes optional).
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0027_notificationjob_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pricealert',
+            name='drop_percent',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='pricealert',
+            name='rule',
+            field=models.CharField(choices=[('target', 'Target price'), ('percent_drop', 'Percentage drop'), ('all_time_low', 'All-time low')], default='target', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='pricealert',
+            name='target_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
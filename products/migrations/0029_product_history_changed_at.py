@@ -0,0 +1,20 @@
+# Generated by Django 5.0.6 on 2026-10-19 18:16
+
+# Migration to add Product.history_changed_at, the version key for cached history arrays.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0028_pricealert_rules'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='history_changed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
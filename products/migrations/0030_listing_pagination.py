@@ -0,0 +1,43 @@
+# Generated by Django 5.0.6 on 2026-10-19 18:20
+
+# Migration to add per-category product counters (populated from the existing
+# catalogue) and the (created_at, id) indexes behind keyset-paginated listings.
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_category_counts(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    CategoryCount = apps.get_model('products', 'CategoryCount')
+    counts = Product.objects.values_list('category').annotate(n=Count('id')).values_list('category', 'n')
+    CategoryCount.objects.bulk_create(
+        [CategoryCount(category=category, count=n) for category, n in counts]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0029_product_history_changed_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=255, unique=True)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-created_at', '-id'], name='product_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', '-created_at', '-id'], name='product_category_listing_idx'),
+        ),
+        migrations.RunPython(populate_category_counts, migrations.RunPython.noop),
+    ]
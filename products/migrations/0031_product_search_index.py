@@ -0,0 +1,51 @@
+# Generated by Django 5.0.6 on 2026-10-19 18:23
+
+# Migration to add the full-text product search index: a weighted tsvector
+# column with a GIN index on PostgreSQL, an FTS5 table on SQLite. Both are
+# populated from the existing catalogue; other databases are left unchanged.
+
+from django.db import migrations
+
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(category, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(site_name, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'C')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE products_product ADD COLUMN search_vector tsvector')
+        schema_editor.execute(f'UPDATE products_product SET search_vector = {PG_SEARCH_VECTOR}')
+        schema_editor.execute('CREATE INDEX product_search_idx ON products_product USING gin (search_vector)')
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE products_product_fts USING fts5("
+            "name, category, site_name, description, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO products_product_fts (rowid, name, category, site_name, description) "
+            "SELECT id, name, category, site_name, coalesce(description, '') FROM products_product"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS product_search_idx')
+        schema_editor.execute('ALTER TABLE products_product DROP COLUMN IF EXISTS search_vector')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS products_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0030_listing_pagination'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
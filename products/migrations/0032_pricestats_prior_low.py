@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-19 18:49
+
+# Migration to add ProductPriceStats.prior_low, the low before the current
+# price took effect. Existing stats rows are dropped so the next
+# refresh_price_stats run reseeds every product, prior low included.
+
+from django.db import migrations, models
+
+
+def clear_price_stats(apps, schema_editor):
+    ProductPriceStats = apps.get_model('products', 'ProductPriceStats')
+    ProductPriceStats.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0031_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productpricestats',
+            name='prior_low',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(clear_price_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.6 on 2026-10-19 18:52
+
+# Migration to record when a notification job was last claimed for sending,
+# so a job retried after its worker died can be checked for a completed send.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0032_pricestats_prior_low'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationjob',
+            name='send_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
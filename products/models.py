@@ -3,8 +3,10 @@ from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils import timezone
+from django.conf import settings
+from datetime import timedelta
+from decimal import Decimal
 import logging
-from .whatsapp_utils import send_whatsapp_alert
 from cloudinary.models import CloudinaryField
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
@@ -24,6 +26,8 @@ class Product(models.Model):
         ('automotive', '🚗 Automotive'),
         ('toys', '🧸 Toys & Games'),
     ]
+    # Text fields covered by the full-text search index (see search_utils).
+    SEARCH_FIELDS = ('name', 'category', 'site_name', 'description')
     
     name = models.CharField(max_length=255)
     url = models.URLField()
@@ -38,13 +42,37 @@ class Product(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='products', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # When a price change was last written to history; versions cached history arrays.
+    history_changed_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of the home and category listings, newest first.
+            models.Index(fields=['-created_at', '-id'], name='product_listing_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='product_category_listing_idx'),
+        ]
     
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so the category counters and the search index can tell
+        # whether a save changed any of these fields.
+        instance._remember_loaded_fields()
+        return instance
+
+    def changed_fields(self, fields):
+        """Which of fields (loaded from the database) differ from their loaded values."""
+        loaded = getattr(self, '_loaded_fields', {})
+        return {field for field in fields if field in loaded and field in self.__dict__ and self.__dict__[field] != loaded[field]}
+
+    def _remember_loaded_fields(self):
+        # Deferred fields are left out, so they never compare as changed.
+        self._loaded_fields = {field: self.__dict__[field] for field in self.SEARCH_FIELDS if field in self.__dict__}
+
     def save(self, *args, **kwargs):
         # Keep current_price and price in sync for consistency.
         if self.current_price and not self.price:
@@ -53,10 +81,334 @@ class Product(models.Model):
             self.current_price = self.price
         logger.debug(f"Saving product: {self.name} (Price: {self.price}, Current Price: {self.current_price})")
         super().save(*args, **kwargs)
+        # After the post_save receivers have compared against the old values.
+        self._remember_loaded_fields()
 
     def get_category_display_with_emoji(self):
         return dict(self.CATEGORY_CHOICES).get(self.category, self.category)
 
+class PriceHistory(models.Model):
+    """
+    Historical price points for a product.
+    A row is only written when the price changes, plus a periodic heartbeat row,
+    so the table grows with the number of price changes rather than scrapes.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='price_history')
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    timestamp = models.DateTimeField(default=timezone.now)
+    source = models.CharField(max_length=50, default='manual')
+    is_heartbeat = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['-timestamp']
+        verbose_name = 'Price History'
+        verbose_name_plural = 'Price Histories'
+        indexes = [
+            models.Index(fields=['product', 'timestamp'], name='pricehistory_product_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} - £{self.price} at {self.timestamp:%Y-%m-%d %H:%M}"
+
+    @classmethod
+    def record(cls, product, price, source='manual', timestamp=None):
+        # Writes a history row only if the price changed since the last row, or the
+        # last row is older than the heartbeat interval. Returns the new row or None.
+        if price is None:
+            return None
+        timestamp = timestamp or timezone.now()
+        last = (
+            cls.objects.filter(product=product)
+            .order_by('-timestamp')
+            .values('price', 'timestamp')
+            .first()
+        ) or cls._last_compacted(product)
+        heartbeat = timedelta(hours=settings.PRICE_HISTORY_HEARTBEAT_HOURS)
+        if last is None or last['price'] != price:
+            is_heartbeat = False
+        elif timestamp - last['timestamp'] >= heartbeat:
+            is_heartbeat = True
+        else:
+            logger.debug(f"Price unchanged for {product.name} (£{price}), no history row written.")
+            return None
+        return cls.objects.create(
+            product=product,
+            price=price,
+            timestamp=timestamp,
+            source=source[:50],
+            is_heartbeat=is_heartbeat,
+        )
+
+    @staticmethod
+    def _last_compacted(product):
+        # The last point of the newest compressed block, for products whose raw
+        # rows have all been compacted; otherwise a dormant product's next
+        # unchanged price would count as a change.
+        from .series_utils import decode_block, from_epoch
+        data = (
+            PriceSeriesBlock.objects.filter(product=product)
+            .order_by('-end_time')
+            .values_list('data', flat=True)
+            .first()
+        )
+        if data is None:
+            return None
+        timestamps, prices = decode_block(data)
+        return {'price': Decimal(int(prices[-1])) / 100, 'timestamp': from_epoch(timestamps[-1])}
+
+class PriceRollup(models.Model):
+    """
+    Hourly or daily OHLC-style price aggregates for a product.
+    Maintained incrementally from PriceHistory so long-range charts and
+    "lowest in N days" checks don't need to scan raw history.
+    """
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='price_rollups')
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    open_price = models.DecimalField(max_digits=10, decimal_places=2)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2)
+    last_price = models.DecimalField(max_digits=10, decimal_places=2)
+    price_sum = models.DecimalField(max_digits=16, decimal_places=2)
+    point_count = models.PositiveIntegerField(default=0)
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+
+    class Meta:
+        ordering = ['bucket_start']
+        unique_together = ['product', 'granularity', 'bucket_start']
+
+    def __str__(self):
+        return f"{self.product.name} {self.granularity} {self.bucket_start:%Y-%m-%d %H:%M}"
+
+    @property
+    def avg_price(self):
+        if not self.point_count:
+            return None
+        return (self.price_sum / self.point_count).quantize(self.last_price)
+
+class PriceSeriesBlock(models.Model):
+    """
+    Compressed block of cold price history for one product.
+    Timestamps (epoch seconds) and prices (integer pence) are delta-encoded and
+    packed into a zlib-compressed binary blob; see series_utils for the format.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='series_blocks')
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    point_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        ordering = ['start_time']
+        indexes = [
+            models.Index(fields=['product', 'start_time'], name='seriesblock_product_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name}: {self.point_count} points from {self.start_time:%Y-%m-%d}"
+
+class ProductPriceStats(models.Model):
+    """
+    Materialized price statistics for a product, refreshed in batch by
+    analytics_utils.refresh_price_stats so pages can show them without
+    touching price history.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='price_stats')
+    low_30d = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    low_90d = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    avg_30d = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    avg_90d = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    all_time_low = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Lowest price before the current price took effect; None if it never changed.
+    prior_low = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    pct_below_avg_30d = models.FloatField(null=True, blank=True)
+    volatility_30d = models.FloatField(null=True, blank=True)
+    deal_score = models.FloatField(default=0)
+    point_count_90d = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Product Price Stats"
+        verbose_name_plural = "Product Price Stats"
+
+    def __str__(self):
+        return f"Stats for {self.product.name}"
+
+    @staticmethod
+    def reference_low(prior_low, all_time_low, changed_at, computed_at):
+        """
+        The low a product's current price is judged against: prior_low, or
+        all_time_low if the price changed after the stats were computed
+        (everything they cover then predates the current price).
+        """
+        if changed_at is not None and computed_at is not None and changed_at > computed_at:
+            return all_time_low
+        return prior_low
+
+    def low_before_current(self):
+        return self.reference_low(self.prior_low, self.all_time_low, self.product.history_changed_at, self.computed_at)
+
+    @property
+    def is_all_time_low(self):
+        # An unchanged price is never flagged just for matching itself.
+        current = self.product.current_price
+        low = self.low_before_current()
+        return current is not None and low is not None and current <= low
+
+class DealRanking(models.Model):
+    """
+    Precomputed "top deals" ranking, kept overall (category 'all') and per
+    category. Rebuilt periodically by analytics_utils.refresh_top_deals so the
+    home and category pages read the top N with one indexed query.
+    """
+    OVERALL = 'all'
+
+    category = models.CharField(max_length=255)
+    rank = models.PositiveIntegerField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='deal_rankings')
+    score = models.FloatField()
+    is_all_time_low = models.BooleanField(default=False)
+    tracker_count = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['category', 'rank']
+        unique_together = ['category', 'rank']
+
+    def __str__(self):
+        return f"#{self.rank} in {self.category}: {self.product.name}"
+
+class CategoryCount(models.Model):
+    """
+    Number of products per category, kept up to date by the Product signals
+    in listing_utils so listings never run COUNT(*) over the catalogue.
+    """
+    category = models.CharField(max_length=255, unique=True)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.category}: {self.count}"
+
+class JobCheckpoint(models.Model):
+    """Progress marker for incremental background jobs (e.g. the last processed row id)."""
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+class PriceChangeEvent(models.Model):
+    """
+    Transactional outbox of product price changes.
+    Written in the same transaction as the price update; a consumer task
+    evaluates the product's alerts and marks the event processed.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='price_events')
+    old_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    new_price = models.DecimalField(max_digits=10, decimal_places=2)
+    source = models.CharField(max_length=50, default='manual')
+    created_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.product.name}: £{self.old_price} → £{self.new_price} ({self.source})"
+
+class NotificationJob(models.Model):
+    """
+    Outbox of outgoing notifications (one message on one channel).
+    Jobs are written in the same transaction as whatever caused them and
+    delivered by per-channel worker pools, with retry and backoff on failure.
+    """
+    CHANNEL_CHOICES = [
+        ('email', 'Email'),
+        ('whatsapp', 'WhatsApp'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='notification_jobs')
+    alert = models.ForeignKey('PriceAlert', on_delete=models.SET_NULL, null=True, blank=True, related_name='notification_jobs')
+    channel = models.CharField(max_length=20, choices=CHANNEL_CHOICES)
+    recipient = models.CharField(max_length=254)
+    subject = models.CharField(max_length=255, blank=True)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # While a job is being sent; a job stuck past this (worker died) is picked up again.
+    locked_until = models.DateTimeField(null=True, blank=True)
+    # When the job was last claimed for sending. A job picked up again after its
+    # lease expired may already have gone out at that attempt.
+    send_started_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    # Alert notifications triggered close together are merged into one open job
+    # per user and channel (see notification_utils); payload holds the merged alerts.
+    coalesce_key = models.CharField(max_length=100, blank=True, db_index=True)
+    payload = models.JSONField(default=list, blank=True)
+    # Identifies the event this message is for (e.g. one trigger of one alert on one
+    # channel); a key that was already queued is never queued, and so sent, again.
+    idempotency_key = models.CharField(max_length=150, unique=True, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['channel', 'status', 'next_attempt_at'], name='notifjob_channel_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_channel_display()} to {self.recipient} ({self.status})"
+
+class PendingDigestItem(models.Model):
+    """
+    Activity waiting for a user's next daily or weekly summary: a triggered
+    alert or a notable price drop on a tracked product. Appended as events
+    happen and deleted when the summary is queued, so summaries never scan
+    history.
+    """
+    KIND_CHOICES = [
+        ('alert', 'Alert triggered'),
+        ('price_drop', 'Price drop'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pending_digest_items')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    alert = models.ForeignKey('PriceAlert', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    target_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    old_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    new_price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['user', 'id'], name='digestitem_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for {self.user}: {self.product.name} £{self.new_price}"
+
+    @property
+    def drop_percent(self):
+        if not self.old_price:
+            return None
+        return float((self.old_price - self.new_price) / self.old_price * 100)
+
 class UserProfile(models.Model):
     """User profile for notification preferences and subscription info."""
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -72,6 +424,9 @@ class UserProfile(models.Model):
         ],
         default='immediate'
     )
+    # Minutes to wait for further alerts before sending one combined message;
+    # blank uses NOTIFICATION_COALESCE_SECONDS, 0 sends every alert on its own.
+    alert_coalesce_minutes = models.PositiveSmallIntegerField(null=True, blank=True)
     subscription_plan = models.CharField(
         max_length=20,
         choices=[('free', 'Free'), ('basic', 'Basic'), ('premium', 'Premium')],
@@ -123,41 +478,65 @@ class TrackedProduct(models.Model):
         return f"{self.user.username} tracking {self.product.name}"
 
 class PriceAlert(models.Model):
-    """Price alert for a tracked product at a user-specified target price."""
+    """
+    Price alert for a tracked product. Fires at or below a user-specified
+    target price, a percentage below the product's 30-day average, or at a
+    new all-time low; relative rules are judged against ProductPriceStats.
+    """
+    RULE_CHOICES = [
+        ('target', 'Target price'),
+        ('percent_drop', 'Percentage drop'),
+        ('all_time_low', 'All-time low'),
+    ]
+    # Rules whose threshold comes from the product's price stats.
+    RELATIVE_RULES = ('percent_drop', 'all_time_low')
     tracked_product = models.ForeignKey('TrackedProduct', on_delete=models.CASCADE)
-    target_price = models.DecimalField(max_digits=10, decimal_places=2)
+    rule = models.CharField(max_length=20, choices=RULE_CHOICES, default='target')
+    # Set for 'target' alerts only.
+    target_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Percent below the 30-day average price, for 'percent_drop' alerts.
+    drop_percent = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
     is_triggered = models.BooleanField(default=False)
     is_enabled = models.BooleanField(default=True)
     triggered_at = models.DateTimeField(null=True, blank=True)
+    # Lets in-memory alert indexes in other processes pick up changes incrementally.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         unique_together = ['tracked_product', 'target_price']
     
     def __str__(self):
-        return f"Alert: {self.tracked_product.product.name} - £{self.target_price}"
+        return f"Alert: {self.tracked_product.product.name} - {self.condition}"
+
+    @property
+    def condition(self):
+        """Short description of when the alert fires, for pages and messages."""
+        if self.rule == 'percent_drop':
+            return f"{self.drop_percent.normalize():f}% below 30-day average"
+        if self.rule == 'all_time_low':
+            return "All-time low"
+        return f"£{self.target_price}"
+
+    def threshold(self, stats):
+        # Price at or below which the alert fires; None if the stats it needs are missing.
+        if self.rule == 'target':
+            return self.target_price
+        if stats is None:
+            return None
+        if self.rule == 'percent_drop':
+            if stats.avg_30d is None or self.drop_percent is None:
+                return None
+            return stats.avg_30d * (100 - self.drop_percent) / 100
+        return stats.low_before_current()
 
     def check_price_drop(self):
-        # Returns True if the current price is at or below the target price.
-        current_price = self.tracked_product.product.current_price
-        logger.debug(f"Checking price drop for {self.tracked_product.product.name}: Current {current_price}, Target {self.target_price}")
-        return current_price <= self.target_price
-
-    def trigger_alert(self, current_price):
-        # Triggers the alert: marks as triggered, sends WhatsApp/email if enabled.
-        user_profile = self.tracked_product.user.userprofile
-        if not self.is_triggered and self.is_enabled:
-            self.is_triggered = True
-            self.triggered_at = timezone.now()
-            self.save()
-            # WhatsApp alert
-            if user_profile.whatsapp_notifications and user_profile.whatsapp_number:
-                message = (
-                    f"Deal Radar Alert!\n\n"
-                    f"The product '{self.tracked_product.product.name}' has dropped to £{current_price}.\n"
-                    f"Your target price was £{self.target_price}.\n"
-                    f"View: {self.tracked_product.product.url}"
-                )
-                send_whatsapp_alert(user_profile.whatsapp_number, message)
-            # (Optional) Email alert logic can go here as well
-            return True
-        return False
\ No newline at end of file
+        # Returns True if the current price is at or below the alert's threshold.
+        product = self.tracked_product.product
+        current_price = product.current_price
+        if self.rule == 'all_time_low' and (product.history_changed_at is None or product.history_changed_at <= self.updated_at):
+            # The price was already there when the alert was set or re-armed.
+            return False
+        stats = ProductPriceStats.objects.filter(product=product).first() if self.rule != 'target' else None
+        threshold = self.threshold(stats)
+        logger.debug(f"Checking price drop for {product.name}: Current {current_price}, Threshold {threshold} ({self.condition})")
+        return current_price is not None and threshold is not None and current_price <= threshold
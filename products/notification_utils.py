@@ -0,0 +1,428 @@
+"""
+Notification outbox for Deal Radar.
+Notifications are written as NotificationJob rows in the same transaction as
+the event that caused them (e.g. an alert being triggered) and delivered
+later by per-channel workers, so requests, scraping and alert evaluation
+never wait on SMTP or Twilio. Each channel sends with its own bounded
+concurrency: email batches go out over a few reused SMTP sessions, WhatsApp
+through the pooled Twilio sender. Failed jobs are retried with exponential
+backoff up to NOTIFICATION_MAX_ATTEMPTS. Alert notifications are coalesced:
+alerts triggered for a user within a short window go out as one message per
+channel. Jobs carry an idempotency key for the event they report, so the
+same alert trigger or summary is never queued twice, and it is checked
+again at delivery: a job whose worker died mid-send is retried with the
+same Message-ID (email) or only after Twilio shows no copy (WhatsApp).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+import hashlib
+import smtplib
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.utils import DNS_NAME
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+from .models import NotificationJob
+from .whatsapp_utils import get_whatsapp_sender
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHANNELS = [channel for channel, _ in NotificationJob.CHANNEL_CHOICES]
+DELIVERY_BATCH_SIZE = 200
+# How long a claimed job may stay in 'sending' before another worker retries it.
+CLAIM_LEASE = timedelta(minutes=5)
+# Alert notifications for users on daily/weekly summaries are held for the whole period.
+FREQUENCY_COALESCE_WINDOWS = {'daily': timedelta(days=1), 'weekly': timedelta(days=7)}
+
+def delivery_queue(channel):
+    """Celery queue consumed by the delivery worker pool for a channel."""
+    return f'notifications_{channel}'
+
+def _enqueue_delivery(channel, countdown=None):
+    # Runs after commit. If the broker is unreachable the jobs stay pending and
+    # are picked up by the next delivery sweep; publishing isn't retried, so a
+    # request never waits on the broker.
+    from .tasks import deliver_notifications
+    try:
+        if not settings.CELERY_BROKER_URL:
+            # No broker (local development): deliver the due jobs right away.
+            deliver_notifications(channel)
+            return
+        deliver_notifications.apply_async(
+            args=[channel], queue=delivery_queue(channel), countdown=countdown, retry=False,
+        )
+    except Exception as e:
+        logger.warning(f"Could not queue {channel} notification delivery: {e}")
+
+def _alert_reason(alert):
+    if alert.rule == 'target':
+        return f"Your target price was £{alert.target_price}."
+    return f"Your alert: {alert.condition}."
+
+def alert_idempotency_key(alert, channel):
+    """
+    Key for the notification of one trigger of an alert on a channel. A
+    re-armed alert that triggers again gets a new triggered_at, so a new key.
+    """
+    if alert.triggered_at is None:
+        return None
+    return f'alert:{alert.pk}:{int(alert.triggered_at.timestamp() * 1000000)}:{channel}'
+
+def _unqueued(jobs):
+    # Drops jobs whose idempotency key is already queued (or repeated in jobs).
+    # A concurrent insert of the same key fails on the unique constraint and
+    # rolls back the losing transaction instead of sending twice.
+    keys = [job.idempotency_key for job in jobs if job.idempotency_key]
+    if not keys:
+        return jobs
+    seen = set(NotificationJob.objects.filter(idempotency_key__in=keys).values_list('idempotency_key', flat=True))
+    fresh = []
+    for job in jobs:
+        if job.idempotency_key:
+            if job.idempotency_key in seen:
+                logger.info(f"Skipping already queued notification {job.idempotency_key}")
+                continue
+            seen.add(job.idempotency_key)
+        fresh.append(job)
+    return fresh
+
+def enqueue_notifications(jobs):
+    """
+    Save unsaved NotificationJob instances and queue one delivery task per
+    channel once the surrounding transaction commits. Jobs whose
+    idempotency key was already queued are skipped.
+    """
+    jobs = _unqueued(jobs)
+    if not jobs:
+        return []
+    jobs = NotificationJob.objects.bulk_create(jobs)
+    for channel in {job.channel for job in jobs}:
+        transaction.on_commit(lambda channel=channel: _enqueue_delivery(channel))
+    return jobs
+
+def build_alert_notifications(alert, current_price):
+    """Unsaved WhatsApp/email NotificationJobs for a triggered alert, per the user's preferences."""
+    tracked = alert.tracked_product
+    user = tracked.user
+    product = tracked.product
+    profile = user.userprofile
+    jobs = []
+    if profile.whatsapp_notifications and profile.whatsapp_number:
+        message = (
+            f"Deal Radar Alert!\n\n"
+            f"The product '{product.name}' has dropped to £{current_price}.\n"
+            f"{_alert_reason(alert)}\n"
+            f"View: {product.url}"
+        )
+        jobs.append(NotificationJob(
+            user=user, alert=alert, channel='whatsapp', recipient=profile.whatsapp_number, body=message,
+            idempotency_key=alert_idempotency_key(alert, 'whatsapp'),
+        ))
+    # Daily/weekly users get their triggered alerts by email in the summary instead.
+    if profile.email_notifications and profile.notification_frequency == 'immediate' and user.email:
+        old_price = product.price if product.price and product.price > current_price else None
+        was = old_price or alert.target_price or current_price
+        context = {
+            'user': user,
+            'product': product,
+            'old_price': was,
+            'new_price': current_price,
+            'savings': was - current_price,
+            'site_name': 'Deal Radar',
+            'site_domain': settings.SITE_DOMAIN,
+        }
+        html_message = render_to_string('emails/price_alert.html', context)
+        jobs.append(NotificationJob(
+            user=user, alert=alert, channel='email', recipient=user.email,
+            subject=f"Price Drop Alert: {product.name}",
+            body=strip_tags(html_message), html_body=html_message,
+            idempotency_key=alert_idempotency_key(alert, 'email'),
+        ))
+    return jobs
+
+def enqueue_email(recipient, subject, html_message, user=None, alert=None, idempotency_key=None):
+    """
+    Queue one HTML email (with a plain-text part derived from it) for
+    delivery. Returns the job, or None if idempotency_key was already queued.
+    """
+    jobs = enqueue_notifications([NotificationJob(
+        user=user, alert=alert, channel='email', recipient=recipient,
+        subject=subject, body=strip_tags(html_message), html_body=html_message,
+        idempotency_key=idempotency_key,
+    )])
+    return jobs[0] if jobs else None
+
+def coalesce_window(profile, channel):
+    """
+    How long alert notifications for a user and channel are held so that
+    alerts triggered meanwhile go out in the same message. Users on daily or
+    weekly summaries get at most one WhatsApp alert message per period.
+    """
+    if profile.notification_frequency in FREQUENCY_COALESCE_WINDOWS:
+        return FREQUENCY_COALESCE_WINDOWS[profile.notification_frequency]
+    if profile.alert_coalesce_minutes is not None:
+        return timedelta(minutes=profile.alert_coalesce_minutes)
+    return timedelta(seconds=settings.NOTIFICATION_COALESCE_SECONDS.get(channel, 0))
+
+def _alert_item(alert, current_price):
+    product = alert.tracked_product.product
+    old_price = product.price if product.price and product.price > current_price else None
+    return {
+        'alert_id': alert.pk,
+        'key': alert_idempotency_key(alert, 'alert'),
+        'product_id': product.pk,
+        'name': product.name,
+        'url': product.url,
+        'price': str(current_price),
+        'target_price': str(alert.target_price) if alert.target_price is not None else None,
+        'condition': alert.condition,
+        'old_price': str(old_price) if old_price is not None else None,
+    }
+
+def _render_combined(job, user):
+    # Rewrites an open job's message to cover every alert in its payload.
+    items = []
+    for item in job.payload:
+        price = Decimal(item['price'])
+        was = Decimal(item['old_price'] or item['target_price'] or item['price'])
+        items.append({**item, 'was': was, 'savings': was - price})
+    if job.channel == 'whatsapp':
+        lines = [f"Deal Radar Alert! {len(items)} of your price alerts were triggered:", ""]
+        for item in items:
+            condition = item.get('condition') or f"£{item['target_price']}"
+            lines.append(f"• {item['name']}: £{item['price']} (your alert: {condition})")
+            lines.append(f"  {item['url']}")
+        job.body = "\n".join(lines)
+        return
+    html_message = render_to_string('emails/price_alert_batch.html', {
+        'user': user,
+        'items': items,
+        'site_name': 'Deal Radar',
+        'site_domain': settings.SITE_DOMAIN,
+    })
+    job.subject = f"Price Drop Alerts: {len(items)} of your alerts were triggered"
+    job.body = strip_tags(html_message)
+    job.html_body = html_message
+
+def _coalesce(job, item, window, now):
+    # Adds item to the user's open job for the channel, or holds job open for
+    # window. Locking the open job keeps a delivery worker from claiming it
+    # mid-update (claims skip locked rows); once claimed it is no longer open.
+    key = f'alerts:{job.user_id}:{job.channel}'
+    open_job = (
+        NotificationJob.objects.select_for_update()
+        .filter(coalesce_key=key, recipient=job.recipient, status='pending', attempts=0, next_attempt_at__gt=now)
+        .order_by('id')
+        .first()
+    )
+    if open_job is not None:
+        if item['key'] and any(queued.get('key') == item['key'] for queued in open_job.payload):
+            return open_job
+        open_job.payload.append(item)
+        _render_combined(open_job, job.user)
+        open_job.save(update_fields=['payload', 'subject', 'body', 'html_body'])
+        return open_job
+    job.coalesce_key = key
+    job.payload = [item]
+    job.next_attempt_at = now + window
+    job.save()
+    countdown = window.total_seconds()
+    transaction.on_commit(lambda channel=job.channel: _enqueue_delivery(channel, countdown))
+    return job
+
+def queue_alert_notifications(triggered):
+    """
+    Queue notifications for triggered alerts, given as (alert, current_price)
+    pairs with tracked_product, its product (and price_stats, which the
+    email shows) and user__userprofile loaded.
+    Per channel, each alert joins the user's open notification if one is
+    still within its coalescing window, otherwise it opens a new one that is
+    sent when the window ends (straight away if the window is 0).
+    Call inside the transaction that triggers the alerts.
+    Returns the number of notifications queued or extended.
+    """
+    now = timezone.now()
+    built = []
+    for alert, current_price in triggered:
+        try:
+            built.extend((alert, current_price, job) for job in build_alert_notifications(alert, current_price))
+        except Exception as e:
+            logger.error(f"Error building notifications for alert {alert.pk}: {e}")
+    fresh = {id(job) for job in _unqueued([job for _, _, job in built])}
+    immediate = []
+    coalesced = 0
+    for alert, current_price, job in built:
+        if id(job) not in fresh:
+            continue
+        window = coalesce_window(alert.tracked_product.user.userprofile, job.channel)
+        if window:
+            _coalesce(job, _alert_item(alert, current_price), window, now)
+            coalesced += 1
+        else:
+            immediate.append(job)
+    return coalesced + len(enqueue_notifications(immediate))
+
+def _email_message(job, connection):
+    headers = {}
+    if job.idempotency_key:
+        # A stable Message-ID lets receiving servers drop a copy re-sent after a
+        # worker died between sending and recording the job as sent.
+        digest = hashlib.sha256(job.idempotency_key.encode()).hexdigest()[:32]
+        headers['Message-ID'] = f'<{digest}@{DNS_NAME}>'
+    message = EmailMultiAlternatives(
+        subject=job.subject,
+        body=job.body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[job.recipient],
+        connection=connection,
+        headers=headers,
+    )
+    if job.html_body:
+        message.attach_alternative(job.html_body, 'text/html')
+    return message
+
+def _close_quietly(connection):
+    # Closing a session the server already dropped can raise; the backend resets
+    # its socket either way, so the next open() starts a fresh session.
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+def _send_email_session(jobs):
+    # Sends jobs over one SMTP session (one connect, TLS handshake and login),
+    # reconnecting once if the server drops the connection mid-batch.
+    # Runs in a delivery thread: network I/O only, no database access.
+    connection = get_connection(fail_silently=False)
+    errors = []
+    try:
+        for job in jobs:
+            for attempt in (1, 2):
+                try:
+                    connection.open()
+                    connection.send_messages([_email_message(job, connection)])
+                    errors.append(None)
+                    break
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                    # Per-message rejections keep the session open.
+                    errors.append(str(e) or e.__class__.__name__)
+                    break
+                except OSError as e:
+                    # Dropped connection or socket error (smtplib errors are OSErrors too).
+                    _close_quietly(connection)
+                    if attempt == 2:
+                        errors.append(str(e) or e.__class__.__name__)
+                except Exception as e:
+                    errors.append(str(e) or e.__class__.__name__)
+                    break
+    finally:
+        _close_quietly(connection)
+    return errors
+
+def _send_email_batch(jobs):
+    # Splits the batch across up to NOTIFICATION_CHANNEL_CONCURRENCY['email'] SMTP
+    # sessions sent in parallel, then restores the original job order.
+    sessions = max(1, min(settings.NOTIFICATION_CHANNEL_CONCURRENCY['email'], len(jobs)))
+    slices = [jobs[i::sessions] for i in range(sessions)]
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        slice_errors = list(pool.map(_send_email_session, slices))
+    errors = [None] * len(jobs)
+    for i, chunk_errors in enumerate(slice_errors):
+        errors[i::sessions] = chunk_errors
+    return errors
+
+def _send_whatsapp_batch(jobs):
+    # The shared sender pools connections, rate-limits and backs off on 429s.
+    # Jobs whose previous attempt died mid-send are skipped (reported as sent)
+    # if Twilio already has the message.
+    sender = get_whatsapp_sender()
+    errors = [None] * len(jobs)
+    pending = []
+    for i, job in enumerate(jobs):
+        if job.in_doubt_since and sender.was_sent(job.recipient, job.body, job.in_doubt_since):
+            logger.info(f"WhatsApp notification {job.pk} was already sent before its worker stopped; not re-sending")
+            continue
+        pending.append(i)
+    results = sender.send_many([(jobs[i].recipient, jobs[i].body) for i in pending])
+    for i, result in zip(pending, results):
+        if not result.ok:
+            errors[i] = f"Twilio error {result.status}: {result.error}"
+    return errors
+
+# Each sender takes a batch of claimed jobs and returns one error (or None) per job.
+BATCH_SENDERS = {
+    'email': _send_email_batch,
+    'whatsapp': _send_whatsapp_batch,
+}
+
+def _claim_jobs(channel, limit):
+    # Claims due jobs (and jobs whose sender died mid-send) by moving them to
+    # 'sending' under a lease. skip_locked lets several workers claim in parallel.
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            NotificationJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status='pending', next_attempt_at__lte=now) | Q(status='sending', locked_until__lt=now),
+                channel=channel,
+            )
+            .order_by('next_attempt_at', 'id')[:limit]
+        )
+        for job in jobs:
+            # Still 'sending' means the last worker died after claiming it, maybe
+            # after the message went out.
+            job.in_doubt_since = job.send_started_at if job.status == 'sending' else None
+            job.status = 'sending'
+            job.locked_until = now + CLAIM_LEASE
+            job.send_started_at = now
+            job.attempts += 1
+        NotificationJob.objects.bulk_update(jobs, ['status', 'locked_until', 'send_started_at', 'attempts'])
+    return jobs
+
+def _record_failure(job, error):
+    now = timezone.now()
+    if job.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+        job.status = 'failed'
+        logger.error(f"Giving up on {job.channel} notification {job.pk} after {job.attempts} attempts: {error}")
+    else:
+        job.status = 'pending'
+        job.next_attempt_at = now + timedelta(
+            seconds=settings.NOTIFICATION_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+        )
+        logger.warning(f"{job.channel} notification {job.pk} failed (attempt {job.attempts}), retrying: {error}")
+    job.locked_until = None
+    job.last_error = error
+    job.save(update_fields=['status', 'next_attempt_at', 'locked_until', 'last_error'])
+
+def deliver_notifications(channel, batch_size=DELIVERY_BATCH_SIZE):
+    """
+    Deliver due jobs for one channel, a claimed batch at a time, until none
+    are left. Each channel's batch sender bounds its own concurrency.
+    Returns (sent, failed) counts, where failed includes jobs left for retry.
+    """
+    sender = BATCH_SENDERS[channel]
+    sent = failed = 0
+    while True:
+        jobs = _claim_jobs(channel, batch_size)
+        if not jobs:
+            break
+        sent_ids = []
+        for job, error in zip(jobs, sender(jobs)):
+            if error is None:
+                sent_ids.append(job.pk)
+            else:
+                _record_failure(job, error)
+                failed += 1
+        NotificationJob.objects.filter(pk__in=sent_ids).update(
+            status='sent', sent_at=timezone.now(), locked_until=None, last_error='',
+        )
+        sent += len(sent_ids)
+    if sent or failed:
+        logger.info(f"Delivered {sent} {channel} notifications, {failed} failed")
+    return sent, failed
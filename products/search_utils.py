@@ -0,0 +1,128 @@
+"""
+Full-text product search for Deal Radar.
+Products are indexed over name, category, site_name and description, with
+the name weighted highest:
+- PostgreSQL: a tsvector column (search_vector) with a GIN index, ranked
+  with ts_rank_cd.
+- SQLite (development and tests): an FTS5 table keyed by product id,
+  ranked with bm25.
+Both are created by migration 0031 and kept current by the Product signals
+below, which reindex one row when a searchable field is saved. Every query
+term is matched as a word prefix, so "sam gal" finds "Samsung Galaxy".
+Other databases fall back to icontains filtering, newest first.
+"""
+
+import re
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Product
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_SEARCH_TERMS = 8
+MAX_SEARCH_RESULTS = 500
+
+PRODUCT_TABLE = Product._meta.db_table
+FTS_TABLE = f'{PRODUCT_TABLE}_fts'
+
+# Weighted document for the PostgreSQL index: name A, category/site B, description C.
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(category, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(site_name, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'C')"
+)
+# bm25 column weights for the FTS5 table, in SEARCH_FIELDS order.
+FTS_WEIGHTS = '10.0, 5.0, 5.0, 1.0'
+
+def search_terms(query):
+    """Lowercased word terms of a search query, at most MAX_SEARCH_TERMS."""
+    return re.findall(r'\w+', query.lower())[:MAX_SEARCH_TERMS]
+
+def _postgres_search(terms, category, limit):
+    sql = (
+        f"SELECT id FROM {PRODUCT_TABLE}, to_tsquery('english', %s) query "
+        f"WHERE search_vector @@ query"
+    )
+    params = [' & '.join(f'{term}:*' for term in terms)]
+    if category:
+        sql += ' AND category = %s'
+        params.append(category)
+    sql += ' ORDER BY ts_rank_cd(search_vector, query) DESC, id DESC LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+def _sqlite_search(terms, category, limit):
+    sql = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+    params = [' AND '.join(f'"{term}"*' for term in terms)]
+    if category:
+        sql += f' AND rowid IN (SELECT id FROM {PRODUCT_TABLE} WHERE category = %s)'
+        params.append(category)
+    sql += f' ORDER BY bm25({FTS_TABLE}, {FTS_WEIGHTS}), rowid DESC LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+def search_product_ids(query, category=None, limit=MAX_SEARCH_RESULTS):
+    """Ids of the products matching query, most relevant first, at most limit."""
+    terms = search_terms(query)
+    if not terms:
+        return []
+    if connection.vendor == 'postgresql':
+        return _postgres_search(terms, category, limit)
+    if connection.vendor == 'sqlite':
+        return _sqlite_search(terms, category, limit)
+    condition = Q()
+    for term in terms:
+        condition &= (
+            Q(name__icontains=term) | Q(category__icontains=term) |
+            Q(site_name__icontains=term) | Q(description__icontains=term)
+        )
+    products = Product.objects.filter(condition)
+    if category:
+        products = products.filter(category=category)
+    return list(products.order_by('-created_at', '-id').values_list('id', flat=True)[:limit])
+
+def index_product(product_id):
+    """Reindex one product from its stored row."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'UPDATE {PRODUCT_TABLE} SET search_vector = {PG_SEARCH_VECTOR} WHERE id = %s', [product_id])
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product_id])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, category, site_name, description) "
+                f"SELECT id, name, category, site_name, coalesce(description, '') FROM {PRODUCT_TABLE} WHERE id = %s",
+                [product_id],
+            )
+
+def rebuild_search_index():
+    """Reindex every product, e.g. after bulk writes that bypassed the signals."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'UPDATE {PRODUCT_TABLE} SET search_vector = {PG_SEARCH_VECTOR}')
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, category, site_name, description) "
+                f"SELECT id, name, category, site_name, coalesce(description, '') FROM {PRODUCT_TABLE}"
+            )
+    logger.info(f"Rebuilt the product search index ({connection.vendor}).")
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, created, **kwargs):
+    # Price updates leave the text untouched and skip the reindex.
+    if created or not hasattr(instance, '_loaded_fields') or instance.changed_fields(Product.SEARCH_FIELDS):
+        index_product(instance.pk)
+
+@receiver(post_delete, sender=Product)
+def unindex_product_on_delete(sender, instance, **kwargs):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [instance.pk])
@@ -0,0 +1,152 @@
+"""
+Compact price series storage for Deal Radar.
+Packs cold price history into compressed per-product blocks and decodes
+history (blocks plus recent raw rows) straight into NumPy arrays.
+
+Block format (version 1):
+    header  '<BIqq'  version, point count, first timestamp, first price
+    body    zlib(int32 timestamp deltas + int32 price deltas)
+Timestamps are epoch seconds and prices are integer pence.
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+import struct
+import zlib
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Product, PriceHistory, PriceSeriesBlock
+import logging
+
+logger = logging.getLogger(__name__)
+
+BLOCK_FORMAT_VERSION = 1
+BLOCK_HEADER = struct.Struct('<BIqq')
+BLOCK_MAX_POINTS = 4096
+
+def encode_block(timestamps, prices):
+    """Pack epoch-second timestamps and integer-pence prices into a block blob."""
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    prices = np.asarray(prices, dtype=np.int64)
+    header = BLOCK_HEADER.pack(BLOCK_FORMAT_VERSION, timestamps.size, int(timestamps[0]), int(prices[0]))
+    body = np.diff(timestamps).astype('<i4').tobytes() + np.diff(prices).astype('<i4').tobytes()
+    return header + zlib.compress(body)
+
+def decode_block(data):
+    """Unpack a block blob into (timestamps, prices) int64 NumPy arrays."""
+    data = bytes(data)
+    version, count, first_ts, first_price = BLOCK_HEADER.unpack_from(data)
+    if version != BLOCK_FORMAT_VERSION:
+        raise ValueError(f"Unsupported price series block version {version}")
+    deltas = np.frombuffer(zlib.decompress(data[BLOCK_HEADER.size:]), dtype='<i4').astype(np.int64)
+    timestamps = np.empty(count, dtype=np.int64)
+    prices = np.empty(count, dtype=np.int64)
+    timestamps[0], prices[0] = first_ts, first_price
+    np.cumsum(deltas[:count - 1], out=timestamps[1:])
+    np.cumsum(deltas[count - 1:], out=prices[1:])
+    timestamps[1:] += first_ts
+    prices[1:] += first_price
+    return timestamps, prices
+
+def to_pence(price):
+    return int(round(price * 100))
+
+def to_epoch(timestamp):
+    return int(timestamp.timestamp())
+
+def from_epoch(seconds):
+    return datetime.fromtimestamp(int(seconds), tz=dt_timezone.utc)
+
+def load_price_arrays_bulk(product_ids, start=None, end=None):
+    """
+    Load history for several products as {product_id: (timestamps, prices)}.
+    Reads compressed blocks and raw PriceHistory rows in one query each.
+    Timestamps are int64 epoch seconds, prices int64 pence, sorted by time.
+    """
+    blocks = PriceSeriesBlock.objects.filter(product_id__in=product_ids)
+    raw = PriceHistory.objects.filter(product_id__in=product_ids)
+    if start is not None:
+        blocks = blocks.filter(end_time__gte=start)
+        raw = raw.filter(timestamp__gte=start)
+    if end is not None:
+        blocks = blocks.filter(start_time__lte=end)
+        raw = raw.filter(timestamp__lte=end)
+
+    parts = {product_id: ([], []) for product_id in product_ids}
+    for product_id, data in blocks.order_by('product_id', 'start_time').values_list('product_id', 'data'):
+        timestamps, prices = decode_block(data)
+        parts[product_id][0].append(timestamps)
+        parts[product_id][1].append(prices)
+    raw_rows = {}
+    for product_id, timestamp, price in raw.order_by('product_id', 'timestamp').values_list('product_id', 'timestamp', 'price'):
+        raw_rows.setdefault(product_id, []).append((to_epoch(timestamp), to_pence(price)))
+    for product_id, rows in raw_rows.items():
+        parts[product_id][0].append(np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows)))
+        parts[product_id][1].append(np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows)))
+
+    lo = to_epoch(start) if start is not None else None
+    hi = to_epoch(end) if end is not None else None
+    arrays = {}
+    for product_id, (ts_parts, price_parts) in parts.items():
+        if not ts_parts:
+            arrays[product_id] = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+            continue
+        timestamps = np.concatenate(ts_parts)
+        prices = np.concatenate(price_parts)
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, prices = timestamps[order], prices[order]
+        mask = np.ones(timestamps.size, dtype=bool)
+        if lo is not None:
+            mask &= timestamps >= lo
+        if hi is not None:
+            mask &= timestamps <= hi
+        arrays[product_id] = (timestamps[mask], prices[mask])
+    return arrays
+
+def load_price_arrays(product_id, start=None, end=None):
+    """Load (timestamps, prices) arrays for one product; see load_price_arrays_bulk."""
+    return load_price_arrays_bulk([product_id], start, end)[product_id]
+
+def compact_price_history(products_per_batch=200):
+    """
+    Move raw PriceHistory rows older than PRICE_HISTORY_COMPACT_AFTER_DAYS into
+    compressed PriceSeriesBlock rows, then delete the raw rows.
+    Rollups are brought up to date first so no rows are compacted unseen.
+    Returns the number of rows compacted.
+    """
+    from .history_utils import rollup_price_history
+
+    rollup_price_history()
+    cutoff = timezone.now() - timedelta(days=settings.PRICE_HISTORY_COMPACT_AFTER_DAYS)
+    product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    compacted = 0
+    for i in range(0, len(product_ids), products_per_batch):
+        chunk = product_ids[i:i + products_per_batch]
+        rows = list(
+            PriceHistory.objects.filter(product_id__in=chunk, timestamp__lt=cutoff)
+            .order_by('product_id', 'timestamp')
+            .values_list('pk', 'product_id', 'timestamp', 'price')
+        )
+        if not rows:
+            continue
+        by_product = {}
+        for pk, product_id, timestamp, price in rows:
+            by_product.setdefault(product_id, []).append((pk, timestamp, price))
+        blocks = []
+        for product_id, points in by_product.items():
+            for j in range(0, len(points), BLOCK_MAX_POINTS):
+                block = points[j:j + BLOCK_MAX_POINTS]
+                blocks.append(PriceSeriesBlock(
+                    product_id=product_id,
+                    start_time=block[0][1],
+                    end_time=block[-1][1],
+                    point_count=len(block),
+                    data=encode_block([to_epoch(p[1]) for p in block], [to_pence(p[2]) for p in block]),
+                ))
+        with transaction.atomic():
+            PriceSeriesBlock.objects.bulk_create(blocks)
+            PriceHistory.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        compacted += len(rows)
+    logger.info(f"Compacted {compacted} price history rows into series blocks")
+    return compacted
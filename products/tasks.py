@@ -20,12 +20,19 @@ from urllib.parse import urlparse
 import time
 import random
 from celery import shared_task
-from django.utils import timezone
-from django.conf import settings
+from celery.signals import worker_process_init
 import logging
 
-from .models import Product, PriceHistory, TrackedProduct, PriceAlert
-from users.models import UserProfile
+from .models import Product, TrackedProduct, PriceAlert
+from .history_utils import update_product_price, rollup_price_history, purge_price_history
+from .series_utils import compact_price_history
+from .analytics_utils import refresh_price_stats, refresh_top_deals
+from .event_utils import process_price_change_events as process_events, purge_processed_events
+from .alert_index import alert_index
+from .alert_utils import evaluate_price_alerts
+from .digest_utils import send_daily_summaries as queue_daily_summaries, send_weekly_summaries as queue_weekly_summaries
+from .notification_utils import CHANNELS, delivery_queue, deliver_notifications as deliver_channel_notifications
+from .dashboard_utils import bump_product_generations
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -273,28 +280,11 @@ def scrape_product_price(self, tracked_product_id):
         result = scraper.scrape_price(product.url)
         
         if result and result.get('success'):
-            old_price = product.current_price
             new_price = result['price']
             
-            # Update product with new price
-            product.current_price = new_price
-            product.last_checked = timezone.now()
-            product.save()
-            
-            # Create price history record
-            PriceHistory.objects.create(
-                product=product,
-                price=new_price,
-                timestamp=timezone.now(),
-                source=result.get('source', 'Unknown')
-            )       
-            
-            
-            # Check for price drop alerts using PriceAlert logic
-            alerts = PriceAlert.objects.filter(tracked_product=tracked_product, is_enabled=True, is_triggered=False)
-            for alert in alerts:
-                if alert.check_price_drop():
-                    alert.trigger_alert(product.current_price)
+            # Update product with new price; history is only written on change or heartbeat.
+            # A change emits a price change event, which queues alert evaluation on commit.
+            old_price = update_product_price(product, new_price, source=result.get('source', 'Unknown'))
             
             return f"Success: £{old_price} → £{new_price} ({result['source']})"
         
@@ -313,6 +303,16 @@ def scrape_product_price(self, tracked_product_id):
         raise self.retry(countdown=60 * (2 ** self.request.retries))
 
 
+@worker_process_init.connect
+def build_alert_index(**kwargs):
+    """Build the in-memory price alert index once per worker process."""
+    try:
+        alert_index.rebuild()
+    except Exception as e:
+        # Evaluation falls back to database queries until the index is built.
+        logger.error(f"Error building price alert index: {e}")
+
+
 @shared_task
 def scrape_all_products():
     """
@@ -320,15 +320,15 @@ def scrape_all_products():
     Premium users get more frequent checks.
     """
     # Get all active tracked products
-    tracked_products = TrackedProduct.objects.filter(is_active=True).select_related('user__profile', 'product')
+    tracked_products = TrackedProduct.objects.filter(is_active=True).select_related('user__userprofile', 'product')
     
     premium_count = 0
     free_count = 0
     
     for tracked_product in tracked_products:
         try:
-            profile = tracked_product.user.profile
-            is_premium = profile.is_premium if profile else False
+            profile = getattr(tracked_product.user, 'userprofile', None)
+            is_premium = profile.subscription_plan == 'premium' if profile else False
             
             # Calculate delay based on subscription tier
             if is_premium:
@@ -353,22 +353,102 @@ def scrape_all_products():
     return f"Scheduled: {premium_count} premium + {free_count} free = {tracked_products.count()} total"
 
 
+@shared_task
+def update_price_rollups():
+    """
+    Celery task: Fold new price history rows into hourly/daily rollups.
+    """
+    processed = rollup_price_history()
+    return f"Rolled up {processed} price history records"
+
+
+@shared_task
+def compact_old_price_history():
+    """
+    Celery task: Pack cold raw price history into compressed per-product blocks.
+    """
+    compacted = compact_price_history()
+    return f"Compacted {compacted} price history records"
+
+
+@shared_task
+def update_price_stats():
+    """
+    Celery task: Refresh materialized per-product price statistics,
+    then rebuild the top deals ranking from them. Percentage-drop and
+    all-time-low alerts are re-evaluated, since their thresholds move with
+    the stats even when prices do not.
+    """
+    refreshed = refresh_price_stats()
+    ranked = refresh_top_deals()
+    triggered = evaluate_price_alerts(rules=PriceAlert.RELATIVE_RULES)
+    return (
+        f"Refreshed price stats for {refreshed} products, {ranked} top deal rankings, "
+        f"{len(triggered)} relative alerts triggered"
+    )
+
+
 @shared_task
 def cleanup_old_price_history():
     """
-    Celery task: Delete price history records older than 90 days.
+    Celery task: Purge raw price history past its retention window.
+    Runs the rollup step first, then deletes in throttled primary-key batches
+    (see history_utils.purge_price_history) so it can resume if interrupted.
     """
-    from datetime import timedelta
-    
-    cutoff_date = timezone.now() - timedelta(days=90)
-    
-    # Delete price history older than 90 days
-    deleted_count = PriceHistory.objects.filter(timestamp__lt=cutoff_date).delete()[0]
+    deleted_count = purge_price_history()
     
     logger.info(f"Cleaned up {deleted_count} old price history records")
     return f"Deleted {deleted_count} old price history records"
 
 
+@shared_task
+def process_price_change_events(product_id=None):
+    """
+    Celery task: Evaluate price alerts for products with pending price change events.
+    Queued after each price change commits (with product_id), and run
+    periodically without a product_id as a sweep for any events left pending.
+    """
+    triggered = process_events(product_id=product_id)
+    if product_id is None:
+        purge_processed_events()
+    return f"Triggered {triggered} price alerts"
+
+
+@shared_task
+def deliver_notifications(channel=None):
+    """
+    Celery task: Deliver queued notifications for one channel (or all channels).
+    Queued per channel on its notifications_<channel> queue when jobs are created;
+    run periodically without a channel to pick up retries that have come due.
+    """
+    if channel is None:
+        for name in CHANNELS:
+            deliver_notifications.apply_async(args=[name], queue=delivery_queue(name))
+        return f"Queued delivery for {len(CHANNELS)} channels"
+    sent, failed = deliver_channel_notifications(channel)
+    return f"Delivered {sent} {channel} notifications, {failed} failed"
+
+
+@shared_task
+def send_daily_summaries():
+    """
+    Celery task: Queue daily summary emails for all opted-in users.
+    Resumes from today's checkpoint if a previous run was interrupted.
+    """
+    processed, queued = queue_daily_summaries()
+    return f"Queued {queued} daily summaries for {processed} users"
+
+
+@shared_task
+def send_weekly_summaries():
+    """
+    Celery task: Queue weekly summary emails for all opted-in users.
+    Resumes from this week's checkpoint if a previous run was interrupted.
+    """
+    processed, queued = queue_weekly_summaries()
+    return f"Queued {queued} weekly summaries for {processed} users"
+
+
 @shared_task
 def update_product_metadata(product_id):
     """
@@ -405,6 +485,8 @@ def update_product_metadata(product_id):
                     break
         
         product.save()
+        # The new name and image show on the dashboards of everyone tracking it.
+        bump_product_generations([product.pk])
         return f"Updated metadata for {product.name}"
         
     except Product.DoesNotExist:
@@ -0,0 +1,89 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from products.alert_index import AlertIndex
+from products.alert_utils import dispatch_alert_notifications, find_triggerable_alert_ids, mark_alerts_triggered
+from products.analytics_utils import refresh_price_stats
+from products.history_utils import update_product_price
+from products.models import NotificationJob, PriceAlert, PriceHistory, Product, ProductPriceStats, TrackedProduct
+
+
+class AllTimeLowAlertTests(TestCase):
+    """All-time-low alerts fire on a new low, not on a price that merely stays at the low."""
+
+    def setUp(self):
+        now = timezone.now()
+        self.product = Product.objects.create(
+            name='Kettle', url='https://example.com/kettle', site_name='example', category='kitchen',
+            current_price=Decimal('80.00'), history_changed_at=now - timedelta(days=3),
+        )
+        for days_ago, price in [(10, '100.00'), (3, '80.00'), (2, '80.00'), (1, '80.00')]:
+            PriceHistory.objects.create(
+                product=self.product, price=Decimal(price), timestamp=now - timedelta(days=days_ago),
+                is_heartbeat=days_ago < 3,
+            )
+        refresh_price_stats()
+        user = User.objects.create_user('shopper', password='pw')
+        tracked = TrackedProduct.objects.create(user=user, product=self.product)
+        self.alert = PriceAlert.objects.create(tracked_product=tracked, rule='all_time_low')
+
+    def crossed_in_index(self):
+        index = AlertIndex()
+        index.rebuild()
+        stats = ProductPriceStats.objects.select_related('product').get(product=self.product)
+        return index.crossed(
+            self.product.pk, self.product.current_price, stats.avg_30d, stats.low_before_current(),
+        )
+
+    def test_flat_price_does_not_trigger(self):
+        # The alert was created after the drop to 80; the price has not moved since.
+        self.assertEqual(ProductPriceStats.objects.get(product=self.product).all_time_low, Decimal('80.00'))
+        self.assertEqual(find_triggerable_alert_ids([self.product.pk]), [])
+        self.assertFalse(self.alert.check_price_drop())
+
+    def test_rise_does_not_trigger(self):
+        update_product_price(self.product, Decimal('90.00'))
+        refresh_price_stats()
+        self.assertEqual(find_triggerable_alert_ids([self.product.pk]), [])
+        self.assertEqual(self.crossed_in_index(), [])
+
+    def test_return_to_low_triggers(self):
+        # Stats refreshed while the price was up: back at 80 matches the low from before.
+        update_product_price(self.product, Decimal('90.00'))
+        refresh_price_stats()
+        update_product_price(self.product, Decimal('80.00'))
+        refresh_price_stats()
+        self.assertEqual(find_triggerable_alert_ids([self.product.pk]), [self.alert.pk])
+        self.assertEqual(self.crossed_in_index(), [self.alert.pk])
+
+    def test_new_low_triggers(self):
+        update_product_price(self.product, Decimal('79.00'))
+        self.assertEqual(find_triggerable_alert_ids([self.product.pk]), [self.alert.pk])
+        self.assertEqual(self.crossed_in_index(), [self.alert.pk])
+        self.assertTrue(self.alert.check_price_drop())
+
+
+class AlertNotificationTests(TestCase):
+    """Alert emails are rendered from the alerts' prefetched relations."""
+
+    def test_price_stats_are_not_queried_per_alert(self):
+        user = User.objects.create_user('shopper', email='shopper@example.com', password='pw')
+        alert_ids = []
+        for i in range(3):
+            product = Product.objects.create(
+                name=f'Kettle {i}', url=f'https://example.com/kettle/{i}', site_name='example',
+                category='kitchen', current_price=Decimal('80.00'),
+            )
+            PriceHistory.objects.create(product=product, price=Decimal('80.00'), timestamp=timezone.now())
+            tracked = TrackedProduct.objects.create(user=user, product=product)
+            alert_ids.append(PriceAlert.objects.create(tracked_product=tracked, target_price=Decimal('90.00')).pk)
+        refresh_price_stats()
+        mark_alerts_triggered(alert_ids)
+        with CaptureQueriesContext(connection) as queries:
+            dispatch_alert_notifications(alert_ids)
+        self.assertTrue(NotificationJob.objects.filter(channel='email').exists())
+        self.assertFalse([q for q in queries if 'FROM "products_productpricestats"' in q['sql']])
@@ -0,0 +1,66 @@
+import threading
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase
+from products.autocomplete_index import AutocompleteIndex
+from products.models import Product
+
+
+def lock_is_free(index):
+    """Whether another thread could take the lock suggest() needs right now."""
+    free = []
+
+    def probe():
+        free.append(index._lock.acquire(blocking=False))
+        if free[0]:
+            index._lock.release()
+
+    thread = threading.Thread(target=probe)
+    thread.start()
+    thread.join()
+    return free[0]
+
+
+class AutocompleteIndexTests(TestCase):
+    """The index is built on first use, reading the database outside its lock."""
+
+    def setUp(self):
+        Product.objects.create(
+            name='Samsung Galaxy S24', url='https://example.com/s24', site_name='example',
+            category='electronics', current_price=Decimal('700.00'),
+        )
+
+    def test_build_reads_products_outside_the_lock(self):
+        index = AutocompleteIndex()
+        fill = AutocompleteIndex._fill
+        seen = []
+
+        def checking_fill(fresh, sites, products, limit):
+            seen.append(lock_is_free(index))
+            fill(fresh, sites, products, limit)
+
+        self.assertFalse(index.is_built)
+        with mock.patch.object(AutocompleteIndex, '_fill', checking_fill):
+            index.sync()
+        self.assertEqual(seen, [True])
+        self.assertEqual(index.suggest('sams gal')[0][0], 'Samsung Galaxy S24')
+
+    def test_sync_reads_changes_outside_the_lock(self):
+        index = AutocompleteIndex()
+        index.sync()
+        Product.objects.create(
+            name='Pixel 9', url='https://example.com/pixel', site_name='example',
+            category='electronics', current_price=Decimal('600.00'),
+        )
+        index._checked_at = 0.0
+        filter_ = Product.objects.filter
+        seen = []
+
+        def checking_filter(*args, **kwargs):
+            seen.append(lock_is_free(index))
+            return filter_(*args, **kwargs)
+
+        with mock.patch.object(Product.objects, 'filter', checking_filter):
+            self.assertEqual(index.sync(), 1)
+        self.assertEqual(seen, [True])
+        self.assertEqual(index.suggest('pixel')[0][0], 'Pixel 9')
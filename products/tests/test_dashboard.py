@@ -0,0 +1,77 @@
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from products.alert_utils import evaluate_price_alerts
+from products.models import PriceAlert, Product, TrackedProduct
+from products.tasks import update_product_metadata
+
+
+class DashboardQueryCountTests(TestCase):
+    """The dashboard's query count doesn't grow with the number of tracked products."""
+
+    def tracking_user(self, username, count):
+        user = User.objects.create_user(username, password='pw')
+        for i in range(count):
+            product = Product.objects.create(
+                name=f'{username} product {i}', url=f'https://example.com/{username}/{i}', site_name='example',
+                category='electronics', current_price=Decimal('50.00'),
+            )
+            tracked = TrackedProduct.objects.create(user=user, product=product)
+            PriceAlert.objects.create(tracked_product=tracked, target_price=Decimal('60.00'), is_triggered=True)
+            PriceAlert.objects.create(tracked_product=tracked, rule='percent_drop', drop_percent=Decimal('10'))
+        self.client.force_login(user)
+        # Measure a cold dashboard, not the cached payload.
+        cache.clear()
+        return user
+
+    def test_same_queries_for_3_and_30_tracked_products(self):
+        self.tracking_user('few', 3)
+        with CaptureQueriesContext(connection) as few_queries:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_tracked'], 3)
+
+        self.tracking_user('many', 30)
+        with self.assertNumQueries(len(few_queries)):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_tracked'], 30)
+        self.assertEqual(response.context['triggered_alerts'], 30)
+
+
+class DashboardCacheTests(TestCase):
+    """Cached dashboards are rebuilt after anything they show changes."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('shopper', password='pw')
+        self.product = Product.objects.create(
+            name='Kettle', url='https://example.com/kettle', site_name='example', category='kitchen',
+            current_price=Decimal('50.00'),
+        )
+        tracked = TrackedProduct.objects.create(user=self.user, product=self.product)
+        self.alert = PriceAlert.objects.create(tracked_product=tracked, target_price=Decimal('40.00'))
+        self.client.force_login(self.user)
+        cache.clear()
+        self.client.get(reverse('dashboard'))
+
+    def dashboard(self):
+        return self.client.get(reverse('dashboard')).context
+
+    def test_batch_alert_trigger_refreshes_dashboard(self):
+        Product.objects.filter(pk=self.product.pk).update(current_price=Decimal('35.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            evaluate_price_alerts()
+        self.assertEqual(self.dashboard()['triggered_alerts'], 1)
+
+    def test_metadata_update_refreshes_dashboard(self):
+        page = SimpleNamespace(content=b'<html><h1>Brushed steel kettle 1.7L</h1></html>')
+        with mock.patch('products.tasks.PriceScraper._safe_request', return_value=page):
+            with self.captureOnCommitCallbacks(execute=True):
+                update_product_metadata(self.product.pk)
+        self.assertEqual(self.dashboard()['tracked_products'][0].product.name, 'Brushed steel kettle 1.7L')
@@ -0,0 +1,36 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.test import TestCase
+from django.utils import timezone
+from products.history_utils import update_product_price
+from products.models import PriceHistory, PriceSeriesBlock, Product
+from products.series_utils import compact_price_history
+
+
+class CompactedHistoryTests(TestCase):
+    """Price changes are judged against compacted history once no raw rows are left."""
+
+    def setUp(self):
+        self.changed_at = timezone.now() - timedelta(days=20)
+        self.product = Product.objects.create(
+            name='Kettle', url='https://example.com/kettle', site_name='example', category='kitchen',
+            current_price=Decimal('80.00'), history_changed_at=self.changed_at,
+        )
+        PriceHistory.objects.create(product=self.product, price=Decimal('80.00'), timestamp=self.changed_at)
+        compact_price_history()
+        self.assertFalse(PriceHistory.objects.filter(product=self.product).exists())
+        self.assertTrue(PriceSeriesBlock.objects.filter(product=self.product).exists())
+
+    def test_unchanged_price_is_a_heartbeat(self):
+        update_product_price(self.product, Decimal('80.00'))
+        row = PriceHistory.objects.get(product=self.product)
+        self.assertTrue(row.is_heartbeat)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.history_changed_at, self.changed_at)
+
+    def test_changed_price_is_a_change(self):
+        update_product_price(self.product, Decimal('75.00'))
+        row = PriceHistory.objects.get(product=self.product)
+        self.assertFalse(row.is_heartbeat)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.history_changed_at, row.timestamp)
@@ -0,0 +1,69 @@
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from products.models import PriceAlert, Product, TrackedProduct
+
+
+class PriceBacktestJsonTests(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Kettle', url='https://example.com/kettle', site_name='example', category='kitchen',
+            current_price=Decimal('80.00'),
+        )
+
+    def test_non_finite_threshold_is_rejected(self):
+        url = reverse('price_backtest_json', args=[self.product.pk])
+        for value in ('NaN', 'sNaN', 'Infinity', '-Infinity'):
+            with self.subTest(value=value):
+                response = self.client.get(url, {'threshold': value})
+                self.assertEqual(response.status_code, 400)
+
+
+class AddProductTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('shopper', password='pw')
+        self.client.force_login(self.user)
+        self.product = Product.objects.create(
+            name='Kettle', url='https://example.com/kettle', site_name='example', category='kitchen',
+            current_price=Decimal('80.00'),
+        )
+
+    def test_non_finite_target_price_is_a_form_error(self):
+        for value in ('NaN', 'Infinity'):
+            with self.subTest(value=value):
+                response = self.client.post(reverse('add_product'), {
+                    'existing_product': self.product.pk, 'target_price': value, 'category': 'kitchen',
+                })
+                self.assertRedirects(response, reverse('add_product'))
+        self.assertFalse(TrackedProduct.objects.filter(user=self.user).exists())
+
+    def test_valid_target_price_tracks_product(self):
+        response = self.client.post(reverse('add_product'), {
+            'existing_product': self.product.pk, 'target_price': '70.00', 'category': 'kitchen',
+        })
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.assertEqual(TrackedProduct.objects.get(user=self.user).target_price, Decimal('70.00'))
+
+
+class CreatePriceAlertTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('shopper', password='pw')
+        self.client.force_login(self.user)
+        product = Product.objects.create(
+            name='Kettle', url='https://example.com/kettle', site_name='example', category='kitchen',
+            current_price=Decimal('80.00'),
+        )
+        self.tracked = TrackedProduct.objects.create(user=self.user, product=product)
+
+    def test_non_finite_drop_percent_is_a_form_error(self):
+        for value in ('NaN', 'sNaN', 'Infinity'):
+            with self.subTest(value=value):
+                response = self.client.post(reverse('create_price_alert', args=[self.tracked.pk]), {
+                    'rule': 'percent_drop', 'drop_percent': value,
+                })
+                self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.assertFalse(PriceAlert.objects.filter(tracked_product=self.tracked).exists())
@@ -11,6 +11,19 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('product/<int:pk>/', views.product_detail, name='product_detail'),
 
+    # Next page of the home/category listings for infinite scroll
+    path('api/products/', views.products_page_json, name='products_page_json'),
+
+    # As-you-type search suggestions
+    path('api/autocomplete/', views.autocomplete_json, name='autocomplete_json'),
+
+    # Price history JSON for charts (single product and dashboard batch)
+    path('product/<int:pk>/history/', views.price_history_json, name='price_history_json'),
+    path('api/price-history/', views.price_history_batch_json, name='price_history_batch_json'),
+
+    # Alert threshold backtest against recent price history
+    path('product/<int:pk>/backtest/', views.price_backtest_json, name='price_backtest_json'),
+
     # User dashboard and signup
     path('dashboard/', views.dashboard, name='dashboard'),
     path('signup/', views.signup, name='signup'),
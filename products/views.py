@@ -4,78 +4,191 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, logout
 from .forms import CustomUserCreationForm
 from django.contrib import messages
-from django.db.models import Q
+from django.db.models import Count, F, Q, Sum
 from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest
-from .models import Product, TrackedProduct, UserProfile, PriceAlert
+from .models import Product, TrackedProduct, UserProfile, PriceAlert, ProductPriceStats
 import re
-from django.utils.html import format_html
+from django.utils.html import format_html, conditional_escape
+from functools import lru_cache
 import csv
 import io
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.safestring import mark_safe
 from django.urls import reverse
+from django.template.loader import render_to_string
+from urllib.parse import urlencode, urlparse
 import logging
 import json
 from django.core.serializers.json import DjangoJSONEncoder
 from django.conf import settings
+from django.views.decorators.cache import cache_control
+from django.utils.dateparse import parse_datetime
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
 import stripe
 
 from .email_utils import send_welcome_email  # Import the email utility
 from .scraper import scrape_product_data
+from .analytics_utils import get_top_deals
+from .history_utils import (
+    update_product_price, get_price_series_bulk, build_series_payload,
+    DEFAULT_CHART_POINTS, MAX_CHART_POINTS, MAX_BATCH_PRODUCTS,
+)
+from .backtest_utils import backtest_thresholds, describe_backtest, BACKTEST_WINDOW
+from .listing_utils import paginate_products, paginate_ranked, product_total
+from .search_utils import search_product_ids, search_terms, MAX_SEARCH_RESULTS
+from .autocomplete_index import get_autocomplete_index, KIND_PRODUCT
+from .dashboard_utils import cached_user_payload, bump_user_generations, bump_product_generations
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
 logger = logging.getLogger(__name__)
 
+SEARCH_HIGHLIGHT = '<mark style="background-color: #ffeb3b; padding: 2px 4px; border-radius: 3px;">{}</mark>'
+
+@lru_cache(maxsize=256)
+def _search_term_pattern(search_query):
+    # Compiled once per query and reused for every product on the page;
+    # longer terms first so they win over their own prefixes.
+    terms = sorted(set(search_terms(search_query)), key=len, reverse=True)
+    if not terms:
+        return None
+    return re.compile('(' + '|'.join(re.escape(term) for term in terms) + ')', re.IGNORECASE)
+
 def highlight_search_terms(text, search_query):
-    """Highlight search terms in text for UI display."""
+    """Highlight search terms in text for UI display (text is HTML-escaped)."""
     if not search_query or not text:
         return text
-    pattern = re.compile(f'({re.escape(search_query)})', re.IGNORECASE)
-    highlighted = pattern.sub(r'<mark style="background-color: #ffeb3b; padding: 2px 4px; border-radius: 3px;">\1</mark>', str(text))
-    return format_html(highlighted)
+    pattern = _search_term_pattern(search_query)
+    if pattern is None:
+        return text
+    # split() with a capturing group puts the matches at the odd indexes.
+    parts = pattern.split(str(text))
+    return mark_safe(''.join(
+        format_html(SEARCH_HIGHLIGHT, part) if i % 2 else conditional_escape(part)
+        for i, part in enumerate(parts)
+    ))
+
+def _listing_next_url(cursor, search_query, category):
+    params = {'cursor': cursor}
+    if search_query:
+        params['search'] = search_query
+    if category:
+        params['category'] = category
+    return f"{reverse('products_page_json')}?{urlencode(params)}"
 
-def home(request):
+def _product_listing_page(request, category=None):
     """
-    Homepage view: shows all products, supports search, and highlights tracked products for logged-in users.
+    One page of the product listing for the request's cursor and search
+    params: newest first, or by relevance when searching. Returns
+    (context, next_url); raises ValueError for a bad cursor.
     """
     search_query = request.GET.get('search', '').strip()
-    
+    cursor = request.GET.get('cursor') or None
+    products = Product.objects.select_related('price_stats')
+    search_count = None
     if search_query:
-        products = Product.objects.filter(
-            Q(name__icontains=search_query) |
-            Q(category__icontains=search_query) |
-            Q(site_name__icontains=search_query) |
-            Q(description__icontains=search_query)
-        ).order_by('-created_at')
-        logger.info(f"User searched for '{search_query}' - {products.count()} results found.")
+        ranked_ids = search_product_ids(search_query, category=category)
+        search_count = len(ranked_ids)
+        page, next_cursor = paginate_ranked(products, ranked_ids, cursor)
+        for product in page:
+            product.highlighted_name = highlight_search_terms(product.name, search_query)
     else:
-        products = Product.objects.all().order_by('-created_at')
-    
-    # Get user's tracked products if logged in
+        if category:
+            products = products.filter(category=category)
+        page, next_cursor = paginate_products(products, cursor)
+
+    # Only the tracked state of the products on this page is needed.
     user_tracked_products = []
-    if request.user.is_authenticated:
-        user_tracked_products = TrackedProduct.objects.filter(
-            user=request.user, is_active=True
-        ).values_list('product_id', flat=True)
-    
+    if request.user.is_authenticated and page:
+        user_tracked_products = list(TrackedProduct.objects.filter(
+            user=request.user, is_active=True, product_id__in=[p.pk for p in page]
+        ).values_list('product_id', flat=True))
+
+    next_url = _listing_next_url(next_cursor, search_query, category) if next_cursor else None
     context = {
-        'products': products,
-        'total_products': Product.objects.count(),
+        'products': page,
         'search_query': search_query,
-        'search_count': products.count(),
-        'highlight_search_terms': highlight_search_terms,
-        'user_tracked_products': list(user_tracked_products),
+        'search_count': search_count,
+        'search_capped': search_count == MAX_SEARCH_RESULTS,
+        'next_cursor': next_cursor,
+        'next_url': next_url,
+        'user_tracked_products': user_tracked_products,
     }
-    
+    return context, next_url
+
+def home(request):
+    """
+    Homepage view: shows the newest products one keyset page at a time (further
+    pages load on scroll), supports search, and highlights tracked products for logged-in users.
+    """
+    try:
+        context, _ = _product_listing_page(request)
+    except ValueError:
+        return redirect('home')
+    search_query = context['search_query']
+    if search_query:
+        logger.info(f"User searched for '{search_query}' - {context['search_count']} results found.")
+    context.update({
+        'top_deals': get_top_deals(limit=8) if not search_query else [],
+        'total_products': product_total(),
+        'highlight_search_terms': highlight_search_terms,
+    })
     return render(request, 'products/home.html', context)
 
+def products_page_json(request):
+    """
+    Next page of the home or category listing for infinite scroll. Query
+    params: cursor, search and category. Returns the rendered product cards
+    and the URL of the page after it (null on the last page).
+    """
+    category = request.GET.get('category') or None
+    try:
+        context, next_url = _product_listing_page(request, category=category)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    template = 'products/_category_product_cards.html' if category else 'products/_product_cards.html'
+    return JsonResponse({
+        'html': render_to_string(template, context, request=request),
+        'next_url': next_url,
+        'has_more': next_url is not None,
+    })
+
+DEFAULT_AUTOCOMPLETE_SUGGESTIONS = 8
+MAX_AUTOCOMPLETE_SUGGESTIONS = 20
+
+@cache_control(public=True, max_age=60)
+def autocomplete_json(request):
+    """
+    As-you-type search suggestions from the in-memory autocomplete index.
+    Query params: q (partial query) and limit. Product suggestions link to
+    the product, retailer suggestions to a search for that retailer.
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_AUTOCOMPLETE_SUGGESTIONS))
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number.'}, status=400)
+    limit = max(1, min(limit, MAX_AUTOCOMPLETE_SUGGESTIONS))
+    suggestions = get_autocomplete_index().suggest(query, limit) if query else []
+    return JsonResponse({'suggestions': [
+        {
+            'text': text,
+            'kind': 'product' if kind == KIND_PRODUCT else 'site',
+            'url': (
+                reverse('product_detail', args=[product_id]) if kind == KIND_PRODUCT
+                else f"{reverse('home')}?{urlencode({'search': text})}"
+            ),
+        }
+        for text, kind, product_id in suggestions
+    ]})
+
 def product_detail(request, pk):
     """
     Product detail page: shows product info and tracking status for the user.
     """
-    product = get_object_or_404(Product, pk=pk)
+    product = get_object_or_404(Product.objects.select_related('price_stats'), pk=pk)
     
     is_tracked = False
     tracked_product = None
@@ -99,45 +212,145 @@ def product_detail(request, pk):
     
     return render(request, 'products/product_detail.html', context)
 
-@login_required
-def dashboard(request):
+def _parse_history_params(request):
+    # Reads start/end (ISO 8601, default last 90 days) and points from the query string.
+    end = parse_datetime(request.GET.get('end', '')) or timezone.now()
+    start = parse_datetime(request.GET.get('start', '')) or end - timedelta(days=90)
+    if timezone.is_naive(start):
+        start = timezone.make_aware(start)
+    if timezone.is_naive(end):
+        end = timezone.make_aware(end)
+    if start >= end:
+        raise ValueError('start must be before end.')
+    max_points = int(request.GET.get('points', DEFAULT_CHART_POINTS))
+    if max_points < 3:
+        raise ValueError('points must be at least 3.')
+    return start, end, min(max_points, MAX_CHART_POINTS)
+
+@cache_control(public=True, max_age=300)
+def price_history_json(request, pk):
+    """
+    JSON price series for one product, downsampled server-side for charts.
+    Query params: start, end (ISO 8601) and points (max points returned).
+    """
+    product = get_object_or_404(Product.objects.only('id'), pk=pk)
+    try:
+        start, end, max_points = _parse_history_params(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    granularity, series = get_price_series_bulk([product.pk], start, end)
+    return JsonResponse(build_series_payload(product.pk, granularity, series[product.pk], max_points))
+
+@cache_control(public=True, max_age=300)
+def price_history_batch_json(request):
     """
-    User dashboard: shows tracked products, alert stats, and recent triggered alerts.
+    JSON price series for several products at once (e.g. the dashboard).
+    Query params: ids (comma separated product IDs), start, end and points.
     """
-    user = request.user
-    
-    tracked_products = TrackedProduct.objects.filter(user=user, is_active=True).select_related('product')
-    total_tracked = tracked_products.count()
-    active_alerts = PriceAlert.objects.filter(
-        tracked_product__user=user, 
-        is_enabled=True
-    ).count()
-    triggered_alerts = PriceAlert.objects.filter(
-        tracked_product__user=user, 
-        is_triggered=True
-    ).count()
-    total_savings = 0
-    triggered_alert_list = PriceAlert.objects.filter(
-        tracked_product__user=user, 
+    try:
+        product_ids = [int(pk) for pk in request.GET.get('ids', '').split(',') if pk.strip()]
+        start, end, max_points = _parse_history_params(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if not product_ids or len(product_ids) > MAX_BATCH_PRODUCTS:
+        return JsonResponse({'error': f'Provide between 1 and {MAX_BATCH_PRODUCTS} product ids.'}, status=400)
+    granularity, series = get_price_series_bulk(product_ids, start, end)
+    return JsonResponse({
+        'series': [
+            build_series_payload(product_id, granularity, points, max_points)
+            for product_id, points in series.items()
+        ]
+    })
+
+MAX_BACKTEST_THRESHOLDS = 20
+
+@cache_control(public=True, max_age=300)
+def price_backtest_json(request, pk):
+    """
+    Backtest alert thresholds against a product's recent price history.
+    Query params: threshold (repeatable price). For each threshold returns how
+    many times the price dropped to or below it, when it first did and how
+    long it stayed there.
+    """
+    product = get_object_or_404(Product.objects.only('id', 'history_changed_at'), pk=pk)
+    try:
+        thresholds = [Decimal(value) for value in request.GET.getlist('threshold')]
+        if not all(t.is_finite() for t in thresholds):
+            # NaN and Infinity parse, but aren't prices.
+            raise InvalidOperation
+    except InvalidOperation:
+        return JsonResponse({'error': 'threshold must be a price.'}, status=400)
+    if not thresholds or len(thresholds) > MAX_BACKTEST_THRESHOLDS or any(t <= 0 for t in thresholds):
+        return JsonResponse({'error': f'Provide between 1 and {MAX_BACKTEST_THRESHOLDS} positive thresholds.'}, status=400)
+    return JsonResponse({
+        'product_id': product.pk,
+        'window_days': BACKTEST_WINDOW.days,
+        'results': [
+            {
+                'threshold': str(result.threshold),
+                'hits': result.hits,
+                'first_hit_after_seconds': int(result.first_hit_after.total_seconds()) if result.first_hit_after else None,
+                'time_below_seconds': int(result.time_below.total_seconds()),
+                'share_below': round(result.share_below, 4),
+            }
+            for result in backtest_thresholds(product, thresholds)
+        ],
+    })
+
+def _backtest_message(request, product, threshold):
+    # Tells the user how often a new alert's threshold was reached recently.
+    # Purely informational, so a failure never blocks setting the alert.
+    if threshold is None:
+        return
+    try:
+        result = backtest_thresholds(product, [threshold])[0]
+    except Exception as e:
+        logger.warning(f"Backtest failed for product {product.pk} at £{threshold}: {e}")
+        return
+    messages.info(request, describe_backtest(result))
+
+def _dashboard_data(user):
+    # Alerts for every row are loaded in one prefetch query.
+    tracked_products = list(
+        TrackedProduct.objects.filter(user=user, is_active=True)
+        .select_related('product')
+        .prefetch_related('pricealert_set')
+    )
+    # Counts and savings in one conditional aggregate over the user's tracked
+    # products joined to their alerts; savings are what triggered target
+    # alerts are below their target at the current price.
+    triggered = Q(pricealert__is_triggered=True)
+    stats = TrackedProduct.objects.filter(user=user).aggregate(
+        total_tracked=Count('pk', filter=Q(is_active=True), distinct=True),
+        active_alerts=Count('pricealert', filter=Q(pricealert__is_enabled=True)),
+        triggered_alerts=Count('pricealert', filter=triggered),
+        total_savings=Sum(
+            F('pricealert__target_price') - F('product__current_price'),
+            filter=triggered & Q(pricealert__target_price__gt=F('product__current_price')),
+        ),
+    )
+    recent_alerts = list(PriceAlert.objects.filter(
+        tracked_product__user=user,
         is_triggered=True
-    ).select_related('tracked_product__product')
-    for alert in triggered_alert_list:
-        current_price = alert.tracked_product.product.current_price
-        target_price = alert.target_price
-        if current_price and target_price and current_price < target_price:
-            savings = target_price - current_price
-            total_savings += savings
-    recent_alerts = triggered_alert_list.order_by('-triggered_at')[:5]
-    context = {
-        'total_tracked': total_tracked,
-        'total_alerts': active_alerts,
-        'triggered_alerts': triggered_alerts,
-        'total_savings': total_savings,
+    ).select_related('tracked_product__product').order_by('-triggered_at')[:5])
+    return {
+        'total_tracked': stats['total_tracked'],
+        'total_alerts': stats['active_alerts'],
+        'triggered_alerts': stats['triggered_alerts'],
+        'total_savings': stats['total_savings'] or 0,
         'tracked_products': tracked_products,
         'recent_alerts': recent_alerts,
-        'user': user,
     }
-    logger.debug(f"Dashboard loaded for user {user.username}: {total_tracked} tracked, {active_alerts} active alerts.")
+
+@login_required
+def dashboard(request):
+    """
+    User dashboard: shows tracked products, alert stats, and recent triggered alerts.
+    """
+    user = request.user
+    # Cached per user until their tracking, alerts or tracked prices change.
+    context = {**cached_user_payload(user.pk, 'dashboard', lambda: _dashboard_data(user)), 'user': user}
+    logger.debug(f"Dashboard loaded for user {user.username}: {context['total_tracked']} tracked, {context['total_alerts']} active alerts.")
     return render(request, 'products/dashboard.html', context)
 
 @login_required 
@@ -161,12 +374,14 @@ def add_to_tracking(request, pk):
         defaults={'is_active': True}
     )
     if created:
+        bump_user_generations([request.user.pk])
         messages.success(request, f'Added "{product.name}" to your tracking list!')
         logger.info(f'User {request.user.username} started tracking product "{product.name}".')
     else:
         if not tracked_product.is_active:
             tracked_product.is_active = True
             tracked_product.save()
+            bump_user_generations([request.user.pk])
             messages.success(request, f'Re-activated tracking for "{product.name}"!')
             logger.info(f'User {request.user.username} re-activated tracking for "{product.name}".')
         else:
@@ -188,6 +403,7 @@ def remove_from_tracking(request, pk):
         )
         tracked_product.is_active = False
         tracked_product.save()
+        bump_user_generations([request.user.pk])
         messages.success(request, f'Removed "{product.name}" from your tracking list.')
         logger.info(f'User {request.user.username} removed product "{product.name}" from tracking.')
     except TrackedProduct.DoesNotExist:
@@ -205,7 +421,7 @@ def signup(request):
             user = form.save()
             UserProfile.objects.get_or_create(user=user)
             login(request, user)
-            send_welcome_email(user)
+            send_welcome_email(user)  # Queued; delivered by the email workers
             logger.info(f"New user signed up: {user.username} ({user.email})")
             messages.success(request, 'Welcome to Deal Radar! Check your email for getting started tips.')
             return redirect('dashboard')
@@ -216,9 +432,38 @@ def signup(request):
 @login_required
 def create_price_alert(request, pk):
     """
-    Create a price alert for a tracked product at a user-specified target price.
+    Create a price alert for a tracked product: at a user-specified target
+    price, a percentage below the 30-day average, or at an all-time low.
     """
     tracked_product = get_object_or_404(TrackedProduct, pk=pk, user=request.user)
+    if request.method == 'POST' and request.POST.get('rule') in PriceAlert.RELATIVE_RULES:
+        rule = request.POST['rule']
+        drop_percent = None
+        if rule == 'percent_drop':
+            try:
+                drop_percent = Decimal(request.POST.get('drop_percent', ''))
+            except InvalidOperation:
+                drop_percent = None
+            if drop_percent is None or not drop_percent.is_finite() or not 0 < drop_percent < 100:
+                messages.error(request, 'Please enter a percentage between 1 and 99.')
+                logger.warning(f"User {request.user.username} entered invalid drop percentage: {request.POST.get('drop_percent')}")
+                return redirect('dashboard')
+        alert, created = PriceAlert.objects.get_or_create(
+            tracked_product=tracked_product,
+            rule=rule,
+            drop_percent=drop_percent,
+            defaults={'is_enabled': True, 'is_triggered': False}
+        )
+        if created:
+            bump_user_generations([request.user.pk])
+            messages.success(request, f'Price alert set: {alert.condition}! You\'ll be notified when the price drops.')
+            logger.info(f"User {request.user.username} set new {rule} alert for {tracked_product.product.name}: {alert.condition}")
+            stats = ProductPriceStats.objects.filter(product_id=tracked_product.product_id).first()
+            threshold = alert.threshold(stats)
+            _backtest_message(request, tracked_product.product, threshold.quantize(Decimal('0.01')) if threshold else None)
+        else:
+            messages.info(request, f'Price alert "{alert.condition}" already exists.')
+        return redirect('dashboard')
     if request.method == 'POST':
         target_price = request.POST.get('target_price')
         if target_price:
@@ -234,8 +479,10 @@ def create_price_alert(request, pk):
                     defaults={'is_enabled': True, 'is_triggered': False}
                 )
                 if created:
+                    bump_user_generations([request.user.pk])
                     messages.success(request, f'Price alert set for £{target_price}! You\'ll be notified when the price drops.')
                     logger.info(f"User {request.user.username} set new price alert for {tracked_product.product.name} at £{target_price}")
+                    _backtest_message(request, tracked_product.product, alert.target_price)
                 else:
                     messages.info(request, f'Price alert for £{target_price} already exists.')
                     logger.info(f"User {request.user.username} tried to set duplicate price alert for {tracked_product.product.name} at £{target_price}")
@@ -255,6 +502,7 @@ def toggle_price_alert(request, pk):
     alert = get_object_or_404(PriceAlert, pk=pk, tracked_product__user=request.user)
     alert.is_enabled = not alert.is_enabled
     alert.save()
+    bump_user_generations([request.user.pk])
     status = "enabled" if alert.is_enabled else "disabled"
     messages.success(request, f'Price alert for "{alert.tracked_product.product.name}" {status}.')
     logger.info(f"User {request.user.username} {status} price alert for {alert.tracked_product.product.name}.")
@@ -268,6 +516,7 @@ def delete_price_alert(request, pk):
     alert = get_object_or_404(PriceAlert, pk=pk, tracked_product__user=request.user)
     product_name = alert.tracked_product.product.name
     alert.delete()
+    bump_user_generations([request.user.pk])
     messages.success(request, f'Price alert for "{product_name}" deleted.')
     logger.info(f"User {request.user.username} deleted price alert for {product_name}.")
     return redirect('dashboard')
@@ -281,6 +530,7 @@ def reset_price_alert(request, pk):
     alert.is_triggered = False
     alert.triggered_at = None
     alert.save()
+    bump_user_generations([request.user.pk])
     messages.success(request, f'Price alert for "{alert.tracked_product.product.name}" reset and reactivated.')
     logger.info(f"User {request.user.username} reset price alert for {alert.tracked_product.product.name}.")
     return redirect('dashboard')
@@ -291,8 +541,10 @@ def profile(request):
     User profile page: shows subscription, notification, and account info.
     """
     user = request.user
-    # Always fetch the latest UserProfile from the database
-    profile = UserProfile.objects.get(user=user)
+    # Cached per user; every UserProfile save (settings, Stripe webhooks, admin)
+    # bumps the user's generation, so a changed plan shows immediately.
+    profile = cached_user_payload(user.pk, 'profile', lambda: UserProfile.objects.get(user=user))
+    user.userprofile = profile
     context = {
         'user': user,
         'profile': profile,
@@ -312,7 +564,9 @@ def user_settings(request):
     if request.method == 'POST':
         if 'update_email' in request.POST:
             profile.email_notifications = request.POST.get('email_notifications') == 'on'
-            profile.notification_frequency = request.POST.get('notification_frequency', 'instant')
+            profile.notification_frequency = request.POST.get('notification_frequency', 'immediate')
+            coalesce_minutes = request.POST.get('alert_coalesce_minutes', '')
+            profile.alert_coalesce_minutes = int(coalesce_minutes) if coalesce_minutes.isdigit() else None
             profile.save()
             messages.success(request, 'Email settings updated successfully!')
             logger.info(f"User {user.username} updated email settings.")
@@ -320,6 +574,7 @@ def user_settings(request):
         elif 'clear_data' in request.POST:
             TrackedProduct.objects.filter(user=user).delete()
             PriceAlert.objects.filter(tracked_product__user=user).delete()
+            bump_user_generations([user.pk])
             messages.success(request, 'All data cleared successfully!')
             logger.info(f"User {user.username} cleared all tracked products and alerts.")
             return redirect('settings')
@@ -397,16 +652,21 @@ def delete_account(request):
 
 def category_products(request, slug):
     """
-    Show all products in a given category.
+    Show the products in a given category, newest first, one keyset page at a time.
     """
     category_dict = dict(Product.CATEGORY_CHOICES)
     category_name = category_dict.get(slug, slug)
-    products = Product.objects.filter(category=slug)
+    try:
+        context, next_url = _product_listing_page(request, category=slug)
+    except ValueError:
+        return redirect('category_products', slug=slug)
     logger.info(f"Category page viewed: {category_name} ({slug})")
-    return render(request, 'products/category_products.html', {
+    context.update({
         'category': {'slug': slug, 'name': category_name},
-        'products': products,
+        'total_products': product_total(slug),
+        'top_deals': get_top_deals(category=slug, limit=6),
     })
+    return render(request, 'products/category_products.html', context)
 
 @login_required
 def add_product(request):
@@ -427,13 +687,22 @@ def add_product(request):
     if request.method == 'POST':
         existing_product_id = request.POST.get('existing_product')
         product_url = request.POST.get('product_url')
-        target_price = request.POST.get('target_price')
+        target_price = request.POST.get('target_price') or None
         category = request.POST.get('category')
 
         if not existing_product_id and not product_url:
             messages.error(request, "Please provide a product URL or select an existing product.")
             return redirect('add_product')
 
+        if target_price is not None:
+            try:
+                target_price = Decimal(target_price)
+                if not target_price.is_finite():
+                    raise InvalidOperation
+            except InvalidOperation:
+                messages.error(request, "Please enter a valid target price.")
+                return redirect('add_product')
+
         if existing_product_id:
             # User selected an existing product
             try:
@@ -453,16 +722,20 @@ def add_product(request):
                         'image_url': scraped.get('image_url'),
                         'description': scraped.get('description', ''),
                         'category': category,
-                        'site_name': site_name,
+                        'site_name': urlparse(product_url).netloc,
                     }
                 )
                 if not created:
                     product.name = scraped.get('name', product.name)
                     product.price = scraped.get('price', product.price)
-                    product.current_price = scraped.get('current_price', product.current_price)
                     product.image_url = scraped.get('image_url', product.image_url)
                     product.description = scraped.get('description', product.description)
                     product.save()
+                    # Refreshed details show on the dashboards of everyone tracking it.
+                    bump_product_generations([product.pk])
+                    if scraped.get('current_price') is not None:
+                        # Records history and a price change event like any other scrape.
+                        update_product_price(product, scraped['current_price'], source='scrape')
             except Exception as e:
                 messages.error(request, f"Could not scrape product info: {e}")
                 return redirect('add_product')
@@ -477,7 +750,10 @@ def add_product(request):
             target_price=target_price,
             is_active=True
         )
+        bump_user_generations([request.user.pk])
         messages.success(request, "Product added to your tracking list!")
+        if target_price is not None and target_price > 0:
+            _backtest_message(request, product, target_price)
         return redirect('dashboard')
 
     categories = Product.CATEGORY_CHOICES
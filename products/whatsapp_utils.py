@@ -1,25 +1,159 @@
 # Utility for sending WhatsApp alerts using Twilio API
 
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 from django.conf import settings
+from requests.adapters import HTTPAdapter
+from twilio.base.exceptions import TwilioRestException
+from twilio.http.http_client import TwilioHttpClient
 from twilio.rest import Client
 import logging
 
 logger = logging.getLogger(__name__)
 
-def send_whatsapp_alert(to_number, message):
+TWILIO_API_HOST = 'https://api.twilio.com'
+# Retries of a single message after a 429 before it is reported as throttled.
+MAX_THROTTLE_RETRIES = 3
+DEFAULT_RETRY_AFTER_SECONDS = 1.0
+
+# Outcome of one message: ok is True when Twilio accepted it; status is the
+# Twilio message status on success or the HTTP status on failure.
+SendResult = namedtuple('SendResult', ['to', 'ok', 'sid', 'status', 'error', 'attempts'])
+
+class PooledHttpClient(TwilioHttpClient):
+    """
+    Twilio HTTP client with a connection pool sized for concurrent sends.
+    base_url optionally redirects API calls (e.g. to a local stand-in server).
+    The Retry-After header of the last response is kept per thread.
+    """
+
+    def __init__(self, pool_size, base_url=None, timeout=None):
+        super().__init__(pool_connections=True, timeout=timeout)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self._local = threading.local()
+
+    def request(self, method, url, *args, **kwargs):
+        if self.base_url and url.startswith(TWILIO_API_HOST):
+            url = self.base_url + url[len(TWILIO_API_HOST):]
+        response = super().request(method, url, *args, **kwargs)
+        self._local.retry_after = response.headers.get('Retry-After') if response.headers else None
+        return response
+
+    @property
+    def last_retry_after(self):
+        return getattr(self._local, 'retry_after', None)
+
+class RateLimiter:
+    """Thread-safe token bucket; pause() holds every sender back after a 429."""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.tokens = self.rate
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+class WhatsAppSender:
     """
-    Send a WhatsApp message to the given number using Twilio.
-    Args:
-        to_number (str): Recipient's WhatsApp number (e.g., '+447123456789')
-        message (str): Message body to send
+    Sends WhatsApp messages through one Twilio client and connection pool,
+    up to `concurrency` at a time and at most `rate` messages per second.
+    A 429 pauses all sends for Retry-After seconds before the message is
+    retried; other errors are reported in the message's SendResult.
     """
-    try:
-        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-        client.messages.create(
-            body=message,
-            from_=settings.TWILIO_WHATSAPP_NUMBER,
-            to=f'whatsapp:{to_number}'
+
+    def __init__(self, rate=None, concurrency=None, base_url=None, timeout=None):
+        self.rate = rate or settings.WHATSAPP_MAX_MESSAGES_PER_SECOND
+        self.concurrency = concurrency or settings.NOTIFICATION_CHANNEL_CONCURRENCY['whatsapp']
+        self.http_client = PooledHttpClient(
+            self.concurrency,
+            base_url=base_url if base_url is not None else settings.TWILIO_API_BASE_URL,
+            timeout=timeout or settings.WHATSAPP_REQUEST_TIMEOUT_SECONDS,
         )
-        logger.info(f"WhatsApp alert sent to {to_number}")
-    except Exception as e:
-        logger.error(f"Error sending WhatsApp alert to {to_number}: {e}")
\ No newline at end of file
+        self.client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, http_client=self.http_client)
+        self.limiter = RateLimiter(self.rate)
+
+    def send(self, to_number, message):
+        """Send one message and return its SendResult; never raises for API errors."""
+        attempts = 0
+        while True:
+            attempts += 1
+            self.limiter.acquire()
+            try:
+                sent = self.client.messages.create(
+                    body=message,
+                    from_=settings.TWILIO_WHATSAPP_NUMBER,
+                    to=f'whatsapp:{to_number}'
+                )
+                return SendResult(to_number, True, sent.sid, sent.status, None, attempts)
+            except TwilioRestException as e:
+                if e.status == 429 and attempts <= MAX_THROTTLE_RETRIES:
+                    retry_after = self.http_client.last_retry_after
+                    self.limiter.pause(float(retry_after) if retry_after else DEFAULT_RETRY_AFTER_SECONDS * attempts)
+                    continue
+                return SendResult(to_number, False, None, e.status, e.msg or str(e), attempts)
+            except Exception as e:
+                return SendResult(to_number, False, None, None, str(e) or e.__class__.__name__, attempts)
+
+    def was_sent(self, to_number, message, since):
+        """
+        Whether Twilio already has this message to to_number from an attempt
+        since `since`. Used before re-sending a job whose worker died mid-send;
+        if the lookup fails the answer is False and the message is re-sent.
+        """
+        try:
+            self.limiter.acquire()
+            recent = self.client.messages.list(
+                to=f'whatsapp:{to_number}',
+                from_=settings.TWILIO_WHATSAPP_NUMBER,
+                date_sent_after=since,
+                limit=50,
+            )
+        except Exception as e:
+            logger.warning(f"Could not check earlier WhatsApp sends to {to_number}: {e}")
+            return False
+        return any(sent.body == message for sent in recent)
+
+    def send_many(self, messages):
+        """Send (to_number, message) pairs concurrently; results are in input order."""
+        messages = list(messages)
+        if len(messages) <= 1:
+            return [self.send(to, body) for to, body in messages]
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(messages))) as pool:
+            return list(pool.map(lambda pair: self.send(*pair), messages))
+
+_sender = None
+_sender_lock = threading.Lock()
+
+def get_whatsapp_sender():
+    """The per-process WhatsAppSender, created on first use (after any worker fork)."""
+    global _sender
+    if _sender is None:
+        with _sender_lock:
+            if _sender is None:
+                _sender = WhatsAppSender()
+    return _sender
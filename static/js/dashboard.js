@@ -136,11 +136,17 @@ function handleAlertForms() {
     alertForms.forEach(form => {
         form.addEventListener('submit', function(e) {
             const input = this.querySelector('input[name="target_price"]');
-            if (!input.value || parseFloat(input.value) <= 0) {
+            if (input && (!input.value || parseFloat(input.value) <= 0)) {
                 e.preventDefault();
                 alert('Please enter a valid price');
                 return false;
             }
+            const percent = this.querySelector('input[name="drop_percent"]');
+            if (percent && (!percent.value || parseFloat(percent.value) <= 0 || parseFloat(percent.value) >= 100)) {
+                e.preventDefault();
+                alert('Please enter a percentage between 1 and 99');
+                return false;
+            }
         });
     });
 }
@@ -3,18 +3,75 @@ document.addEventListener('DOMContentLoaded', function() {
     console.log('Deal Radar Home Page Loaded');
     
     // Enhanced product card hover effects for visual feedback
-    const productCards = document.querySelectorAll('.product');
-    productCards.forEach(card => {
-        card.addEventListener('mouseenter', function() {
-            this.style.transform = 'translateY(-8px)';
-            this.style.boxShadow = '0 8px 25px rgba(0,0,0,0.15)';
+    function addCardHoverEffects(cards) {
+        cards.forEach(card => {
+            card.addEventListener('mouseenter', function() {
+                this.style.transform = 'translateY(-8px)';
+                this.style.boxShadow = '0 8px 25px rgba(0,0,0,0.15)';
+            });
+            
+            card.addEventListener('mouseleave', function() {
+                this.style.transform = 'translateY(-5px)';
+                this.style.boxShadow = '0 4px 15px rgba(0,0,0,0.1)';
+            });
         });
-        
-        card.addEventListener('mouseleave', function() {
-            this.style.transform = 'translateY(-5px)';
-            this.style.boxShadow = '0 4px 15px rgba(0,0,0,0.1)';
+    }
+    addCardHoverEffects(document.querySelectorAll('.product'));
+
+    // Infinite scroll: when the "Load more" link comes into view, fetch the
+    // next keyset page as JSON and append its cards. The link still works as
+    // a plain next-page link without JavaScript.
+    const productList = document.getElementById('product-list');
+    const loadMore = document.getElementById('load-more');
+    if (productList && loadMore && 'IntersectionObserver' in window) {
+        let loading = false;
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadNextPage();
+            }
+        }, { rootMargin: '400px' });
+
+        function loadNextPage() {
+            const url = loadMore.dataset.nextUrl;
+            if (loading || !url) {
+                return;
+            }
+            loading = true;
+            fetch(url, { headers: { 'Accept': 'application/json' } })
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error('Failed to load products: ' + response.status);
+                    }
+                    return response.json();
+                })
+                .then(data => {
+                    const template = document.createElement('template');
+                    template.innerHTML = data.html;
+                    addCardHoverEffects(template.content.querySelectorAll('.product'));
+                    productList.appendChild(template.content);
+                    if (data.has_more) {
+                        loadMore.dataset.nextUrl = data.next_url;
+                    } else {
+                        observer.disconnect();
+                        loadMore.parentElement.remove();
+                    }
+                })
+                .catch(error => {
+                    // Leave the link in place so the user can still page manually.
+                    console.error(error);
+                    observer.disconnect();
+                })
+                .finally(() => {
+                    loading = false;
+                });
+        }
+
+        loadMore.addEventListener('click', function(event) {
+            event.preventDefault();
+            loadNextPage();
         });
-    });
+        observer.observe(loadMore);
+    }
 
     // Search input focus/blur enhancements for better UX
     const searchInput = document.querySelector('.search-input');
@@ -30,6 +87,93 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // As-you-type suggestions from the autocomplete endpoint. Requests are
+    // debounced and only the latest response is shown; arrow keys move
+    // through the list and Enter opens the highlighted suggestion.
+    const suggestionList = document.getElementById('search-suggestions');
+    if (searchInput && suggestionList && searchInput.dataset.autocompleteUrl) {
+        let debounceTimer = null;
+        let latestRequest = 0;
+        let activeIndex = -1;
+
+        function hideSuggestions() {
+            suggestionList.hidden = true;
+            suggestionList.innerHTML = '';
+            searchInput.setAttribute('aria-expanded', 'false');
+            activeIndex = -1;
+        }
+
+        function showSuggestions(suggestions) {
+            suggestionList.innerHTML = '';
+            suggestions.forEach((suggestion, i) => {
+                const item = document.createElement('li');
+                item.setAttribute('role', 'option');
+                item.dataset.url = suggestion.url;
+                item.textContent = suggestion.text;
+                const kind = document.createElement('span');
+                kind.className = 'suggestion-kind';
+                kind.textContent = suggestion.kind === 'site' ? 'Retailer' : 'Product';
+                item.appendChild(kind);
+                item.addEventListener('mousedown', function(event) {
+                    // mousedown fires before the input's blur hides the list.
+                    event.preventDefault();
+                    window.location.href = this.dataset.url;
+                });
+                suggestionList.appendChild(item);
+            });
+            suggestionList.hidden = suggestions.length === 0;
+            searchInput.setAttribute('aria-expanded', suggestions.length ? 'true' : 'false');
+            activeIndex = -1;
+        }
+
+        function setActive(index) {
+            const items = suggestionList.querySelectorAll('li');
+            items.forEach(item => item.classList.remove('active'));
+            if (items.length) {
+                activeIndex = (index + items.length) % items.length;
+                items[activeIndex].classList.add('active');
+            }
+        }
+
+        searchInput.addEventListener('input', function() {
+            clearTimeout(debounceTimer);
+            const query = this.value.trim();
+            if (!query) {
+                hideSuggestions();
+                return;
+            }
+            debounceTimer = setTimeout(() => {
+                const request = ++latestRequest;
+                const url = searchInput.dataset.autocompleteUrl + '?q=' + encodeURIComponent(query);
+                fetch(url, { headers: { 'Accept': 'application/json' } })
+                    .then(response => response.ok ? response.json() : { suggestions: [] })
+                    .then(data => {
+                        if (request === latestRequest) {
+                            showSuggestions(data.suggestions);
+                        }
+                    })
+                    .catch(error => console.error(error));
+            }, 150);
+        });
+
+        searchInput.addEventListener('keydown', function(event) {
+            if (suggestionList.hidden) {
+                return;
+            }
+            if (event.key === 'ArrowDown' || event.key === 'ArrowUp') {
+                event.preventDefault();
+                setActive(activeIndex + (event.key === 'ArrowDown' ? 1 : -1));
+            } else if (event.key === 'Enter' && activeIndex >= 0) {
+                event.preventDefault();
+                window.location.href = suggestionList.querySelectorAll('li')[activeIndex].dataset.url;
+            } else if (event.key === 'Escape') {
+                hideSuggestions();
+            }
+        });
+
+        searchInput.addEventListener('blur', hideSuggestions);
+    }
+
     // Button hover effects for all buttons on home page
     const buttons = document.querySelectorAll('.btn');
     buttons.forEach(btn => {